@@ -0,0 +1,99 @@
+"""Decode benchmark of the feed message bodies: json.loads against the streaming
+decoder, timing and peak memory (tracemalloc) of turning a body into
+classification blocks:
+
+    python -m benchmarks.decode
+    python -m benchmarks.decode --bytes 262144 --repeat 20 --json
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from itertools import islice
+
+from src.prime_numbers_processing import stream_decoder
+from src.prime_numbers_processing.prime_numbers_manager import DEADLINE_BLOCK_SIZE
+
+DISTRIBUTIONS = {
+    "small": lambda rng: rng.randrange(2, 10_000),
+    "u32": lambda rng: rng.getrandbits(32),
+    "u64": lambda rng: rng.getrandbits(64),
+}
+
+
+def build_body(size, distribution, seed=0):
+    """Generates a Numbers body of about size bytes"""
+    rng = random.Random(seed)
+    generate = DISTRIBUTIONS[distribution]
+    numbers = []
+    length = len('{"Numbers": []}')
+    while length < size:
+        numbers.append(generate(rng))
+        length += len(str(numbers[-1])) + 2
+    return json.dumps({"Numbers": numbers[:-1]})
+
+
+def consume_loads(body):
+    numbers = json.loads(body)["Numbers"]
+    for start in range(0, len(numbers), DEADLINE_BLOCK_SIZE):
+        numbers[start : start + DEADLINE_BLOCK_SIZE]
+
+
+def consume_stream(body):
+    iterator = iter(stream_decoder.decode(body, min_bytes=0)["Numbers"])
+    for _ in iter(lambda: list(islice(iterator, DEADLINE_BLOCK_SIZE)), []):
+        pass
+
+
+DECODERS = {"json.loads": consume_loads, "stream": consume_stream}
+
+
+def measure(decoder, body, repeat):
+    """Best wall time and peak traced memory of decoding the body into blocks"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decoder(body)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        decoder(body)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": round(best * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def run(size=256 * 1024 - 1024, repeat=10, seed=0):
+    """Benchmarks every decoder on a body per distribution
+    :returns: dict of "decoder/distribution" to ms and peak_kb
+    """
+    results = {}
+    for distribution in DISTRIBUTIONS:
+        body = build_body(size, distribution, seed)
+        for name, decoder in DECODERS.items():
+            results[f"{name}/{distribution}"] = measure(decoder, body, repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bytes", type=int, default=256 * 1024 - 1024)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    results = run(args.bytes, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for key, result in results.items():
+        print(f"{key:>18}: {result['ms']:>8.3f} ms {result['peak_kb']:>10.1f} KB peak")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+"""Classification benchmark of the primality engines across input classes.
+
+Every available primality engine checks the same inputs with its is_prime, the
+"<engine>/<class>" results. The "manager/<engine>/<class>" results run the same
+inputs through PrimeNumberManager.classify, with the cache and the prime bitmap
+disabled so every run classifies the numbers again: the block loop, the batch
+classifier and, if CLASSIFY_PROCESSES is set, the process pool are timed with
+the engine. Results are saved as a JSON baseline that later runs are compared
+against, benchmarks/baseline.json is the committed one:
+
+    python -m benchmarks.engines run --output benchmarks/baseline.json
+    python -m benchmarks.engines compare benchmarks/baseline.json --tolerance 0.15
+    python -m benchmarks.engines compare benchmarks/baseline.json current.json
+
+compare exits with status 1 when any engine/class pair got slower than the
+baseline by more than the tolerance. --replay adds a "replay" class with the
+numbers of recorded traffic (same formats as benchmarks.throughput).
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmarks.throughput import load_replay
+from src.prime_numbers_processing.primality import available_engines, get_engine
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.utils.metrics import Metrics
+
+CARMICHAEL_NUMBERS = [
+    561, 1105, 1729, 2465, 2821, 6601, 8911, 10585, 15841, 29341, 41041, 46657,
+    52633, 62745, 63973, 75361, 101101, 115921, 126217, 162401, 172081, 188461,
+    252601, 278545, 294409, 314821, 334153, 340561, 399001, 410041, 449065,
+    488881, 512461, 9999109081, 1436697831295441, 60977817398996785,
+]  # fmt: skip
+
+# Composites passing strong probable prime tests for several small bases,
+# the worst case of Miller-Rabin implementations that stop at a fixed base set
+STRONG_PSEUDOPRIMES = [
+    2047, 1373653, 25326001, 3215031751, 2152302898747, 3474749660383,
+    341550071728321, 3825123056546413051, 318665857834031151167461,
+    3317044064679887385961981,
+]  # fmt: skip
+
+
+def _random_class(bits_low, bits_high):
+    def generate(count, rng):
+        return [rng.getrandbits(rng.randint(bits_low, bits_high)) for _ in range(count)]
+
+    return generate
+
+
+def _cycle(numbers):
+    def generate(count, rng):
+        return [numbers[i % len(numbers)] for i in range(count)]
+
+    return generate
+
+
+INPUT_CLASSES = {
+    "small": lambda count, rng: [rng.randrange(2, 10_000) for _ in range(count)],
+    "u32": _random_class(17, 32),
+    "u64": _random_class(33, 64),
+    "bigint": _random_class(65, 128),
+    "carmichael": _cycle(CARMICHAEL_NUMBERS),
+    "pseudoprime": _cycle(STRONG_PSEUDOPRIMES),
+    "mixed": _random_class(2, 64),
+}
+
+
+def build_inputs(count, seed=0, replay=None):
+    """Generates the numbers of every input class
+    :param count: numbers per class
+    :param seed: random seed, so runs can be compared
+    :param replay: optional replay file whose numbers make up the replay class
+    :returns: dict of class name to list of numbers
+    """
+    inputs = {}
+    for name, generate in INPUT_CLASSES.items():
+        inputs[name] = generate(count, random.Random(f"{seed}-{name}"))
+    if replay:
+        bodies, _ = load_replay(replay)
+        numbers = [
+            number
+            for body in bodies
+            for number in json.loads(body).get("Numbers") or []
+            if isinstance(number, int) and not isinstance(number, bool)
+        ]
+        if numbers:
+            inputs["replay"] = _cycle(numbers)(count, None)
+    return inputs
+
+
+def time_classification(engine_name, numbers, repeat):
+    """Best wall time of checking the numbers with the is_prime of the given engine"""
+    is_prime = get_engine(engine_name).is_prime
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for number in numbers:
+            is_prime(number)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_manager_classification(engine_name, numbers, repeat):
+    """Best wall time of PrimeNumberManager.classify with the given engine, the
+    cache and the bitmap would answer repeats without reaching the engine
+    """
+    engine = get_engine(engine_name)
+    best = None
+    for _ in range(repeat):
+        manager = PrimeNumberManager(engine=engine, metrics=Metrics())
+        manager.cache = None
+        manager.bitmap = None
+        started = time.perf_counter()
+        manager.classify(numbers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _result(seconds, numbers):
+    return {
+        "seconds": round(seconds, 6),
+        "ns_per_number": round(seconds * 1e9 / len(numbers), 1),
+    }
+
+
+def run(count=2000, repeat=5, seed=0, replay=None, engines=None):
+    """Times every engine on every input class
+    :param count: numbers per class
+    :param repeat: timed repeats, the fastest one is kept
+    :param seed: random seed of the generated classes
+    :param replay: optional replay file for the replay class
+    :param engines: engine names, defaults to every available engine
+    :returns: dict with the run metadata and the results keyed by engine/class,
+        and manager/engine/class for the PrimeNumberManager runs
+    """
+    inputs = build_inputs(count, seed, replay)
+    results = {}
+    for engine_name in engines or available_engines():
+        for class_name, numbers in inputs.items():
+            seconds = time_classification(engine_name, numbers, repeat)
+            results[f"{engine_name}/{class_name}"] = _result(seconds, numbers)
+        for class_name, numbers in inputs.items():
+            seconds = time_manager_classification(engine_name, numbers, repeat)
+            results[f"manager/{engine_name}/{class_name}"] = _result(seconds, numbers)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "count": count,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=0.1):
+    """Finds the engine/class pairs slower than the baseline
+    :param baseline: report of a previous run
+    :param current: report of the run being checked
+    :param tolerance: allowed slowdown, 0.1 means 10%
+    :returns: List of (key, baseline ns, current ns, ratio) tuples of the regressions
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if not reference or not reference["ns_per_number"]:
+            continue
+        ratio = result["ns_per_number"] / reference["ns_per_number"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                (key, reference["ns_per_number"], result["ns_per_number"], ratio)
+            )
+    return regressions
+
+
+def _load(path):
+    with open(path) as report:
+        return json.load(report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "compare"):
+        command = commands.add_parser(name)
+        command.add_argument(
+            "--count", type=int, default=2000, help="numbers per class"
+        )
+        command.add_argument("--repeat", type=int, default=5)
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--replay", help="JSONL file with recorded traffic")
+        command.add_argument("--engine", action="append", help="engine to benchmark")
+    commands.choices["run"].add_argument("--output", help="file the report is saved to")
+    compare_command = commands.choices["compare"]
+    compare_command.add_argument("baseline", help="report to compare against")
+    compare_command.add_argument(
+        "current", nargs="?", help="report, run now if omitted"
+    )
+    compare_command.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare" and args.current:
+        report = _load(args.current)
+    else:
+        report = run(args.count, args.repeat, args.seed, args.replay, args.engine)
+
+    if args.command == "run":
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(report, output, indent=2)
+            print(f"Baseline saved to {args.output}")
+        for key, result in report["results"].items():
+            print(f"{key:>32}: {result['ns_per_number']:>12.1f} ns/number")
+        return 0
+
+    regressions = compare(_load(args.baseline), report, args.tolerance)
+    for key, reference, current, ratio in regressions:
+        print(
+            f"REGRESSION {key}: {reference:.1f} -> {current:.1f} ns/number ({ratio:.2f}x)"
+        )
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""End-to-end throughput benchmark of handler.prime_number_processing.
+
+Events are replayed through the real handler, with a FakeSQS client standing in
+for SQS so the whole flow runs offline:
+
+    python -m benchmarks.throughput --synthetic 2000 --numbers 100
+    python -m benchmarks.throughput --replay recorded.jsonl --latency-ms 5 --json
+
+Replay files hold one JSON document per line: a full SQS event (with Records),
+a single Lambda record (with body) or a message body (with Numbers).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+import uuid
+
+from src.utils.aws_utils import AWSUtils
+from src.utils.fake_sqs import FakeSQS
+
+DISTRIBUTIONS = {
+    "small": lambda rng: rng.randrange(2, 10_000),
+    "u32": lambda rng: rng.getrandbits(32),
+    "u64": lambda rng: rng.getrandbits(64),
+    "mixed": lambda rng: rng.getrandbits(rng.choice((8, 16, 32, 64))),
+}
+
+
+def _message_error(body):
+    """Tells why a body isn't a feed message, None if it is one"""
+    if not isinstance(body, str):
+        return "the body isn't a string"
+    try:
+        message = json.loads(body)
+    except json.JSONDecodeError as e:
+        return f"not a JSON message ({e})"
+    if not isinstance(message, dict) or not (
+        "Numbers" in message or "Range" in message
+    ):
+        return "the message has neither Numbers nor Range"
+    return None
+
+
+def load_replay(path):
+    """Reads the message bodies of a replay file, every line that doesn't hold
+    feed messages is reported and skipped
+    :param path: path of a JSONL replay file
+    :returns: tuple with the list of bodies and the amount of skipped lines
+    """
+    bodies = []
+    skipped = 0
+    with open(path) as replay:
+        for number, line in enumerate(replay, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                document = json.loads(line)
+            except json.JSONDecodeError:
+                document = None
+            if isinstance(document, dict) and "Records" in document:
+                candidates = [record.get("body") for record in document["Records"]]
+            elif isinstance(document, dict) and "body" in document:
+                candidates = [document["body"]]
+            else:
+                candidates = [line]
+            errors = [error for error in map(_message_error, candidates) if error]
+            if not errors:
+                bodies.extend(candidates)
+                continue
+            skipped += 1
+            print(f"Skipping line {number} of {path}: {errors[0]}")
+    return bodies, skipped
+
+
+def synthetic_bodies(count, numbers_per_message, distribution="mixed", seed=0):
+    """Generates message bodies with random numbers
+    :param count: amount of messages
+    :param numbers_per_message: length of each Numbers list
+    :param distribution: one of DISTRIBUTIONS
+    :param seed: random seed, so runs can be compared
+    :returns: List with the JSON bodies
+    """
+    rng = random.Random(seed)
+    generate = DISTRIBUTIONS[distribution]
+    return [
+        json.dumps({"Numbers": [generate(rng) for _ in range(numbers_per_message)]})
+        for _ in range(count)
+    ]
+
+
+def build_events(bodies, batch_size):
+    """Groups bodies into SQS events of batch_size records"""
+    events = []
+    for start in range(0, len(bodies), batch_size):
+        events.append(
+            {
+                "Records": [
+                    {
+                        "messageId": str(uuid.uuid4()),
+                        "receiptHandle": str(uuid.uuid4()),
+                        "body": body,
+                        "attributes": {},
+                        "messageAttributes": {},
+                        "eventSource": "aws:sqs",
+                    }
+                    for body in bodies[start : start + batch_size]
+                ]
+            }
+        )
+    return events
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(bodies, batch_size=10, latency=0.0, context=None):
+    """Runs the bodies through the handler against a FakeSQS
+    :param bodies: message bodies to be processed
+    :param batch_size: records per invocation
+    :param latency: seconds of latency injected in every SQS call
+    :param context: Lambda context passed to the handler
+    :returns: dict with the benchmark report
+    """
+    import handler
+
+    fake_sqs = FakeSQS(latency=latency)
+    target_url = fake_sqs.create_queue(QueueName="prime-number-target-sqs")["QueueUrl"]
+    previous_target = os.environ.get("SQS_PRIMES_TARGET")
+    os.environ["SQS_PRIMES_TARGET"] = target_url
+    AWSUtils.set_sqs_client(fake_sqs)
+
+    latencies = []
+    failed = 0
+    try:
+        events = build_events(bodies, batch_size)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for event in events:
+                invocation_started = time.perf_counter()
+                response = handler.prime_number_processing(event, context)
+                latencies.append(time.perf_counter() - invocation_started)
+                failed += len((response or {}).get("batchItemFailures", []))
+        elapsed = time.perf_counter() - started
+    finally:
+        AWSUtils.clear_sqs_clients()
+        if previous_target is None:
+            os.environ.pop("SQS_PRIMES_TARGET", None)
+        else:
+            os.environ["SQS_PRIMES_TARGET"] = previous_target
+
+    return {
+        "records": len(bodies),
+        "invocations": len(latencies),
+        "failed_records": failed,
+        "seconds": round(elapsed, 4),
+        "records_per_second": round(len(bodies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else 0.0,
+        "sqs_calls": dict(fake_sqs.calls),
+        "published_messages": fake_sqs.queues[target_url].sent,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", help="JSONL file with events, records or bodies")
+    parser.add_argument("--synthetic", type=int, default=0, help="synthetic messages")
+    parser.add_argument("--numbers", type=int, default=100, help="numbers per message")
+    parser.add_argument(
+        "--distribution", choices=sorted(DISTRIBUTIONS), default="mixed"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    bodies = []
+    if args.replay:
+        replayed, skipped = load_replay(args.replay)
+        bodies.extend(replayed)
+        if skipped:
+            print(f"Skipped {skipped} lines of {args.replay} that aren't messages")
+    if args.synthetic:
+        bodies.extend(
+            synthetic_bodies(args.synthetic, args.numbers, args.distribution, args.seed)
+        )
+    if not bodies:
+        parser.error("nothing to run, use --replay and/or --synthetic")
+
+    report = run(bodies, args.batch_size, args.latency_ms / 1000)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>20}: {value}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,181 @@
 import json
+import os
+from functools import partial
 
+from src.prime_numbers_processing import fanout, pipeline, stream_decoder
 from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.prime_numbers_processing.sieve import parse_range
+from src.utils import deadline as invocation_deadline
+from src.utils import idempotency, output_buffer
+from src.utils.aws_utils import AWSUtils
+from src.utils.metrics import get_metrics, log_payload
+
+
+def complete_record(progress, output, result):
+    """Marks a record as processed, once its buffered results were sent if any"""
+    if progress is None:
+        return
+    if output is None:
+        progress.complete(result)
+    else:
+        output.close(partial(progress.complete, result))
+
+
+def continue_record(remainder):
+    """Sends the unprocessed part of a record back to the SQS_FEED_QUEUE queue
+    :param remainder: body of the continuation message, with the Numbers or Range left
+    """
+    body = json.dumps(remainder)
+    if not AWSUtils.send_sqs_message(os.environ["SQS_FEED_QUEUE"], body, {}):
+        raise RuntimeError("Continuation message couldn't be enqueued")
+    print(
+        f"Message Id: {remainder['ContinuationOf']} hit the deadline, "
+        "the rest was enqueued as a continuation message."
+    )
+
+
+def fan_out_record(record, shards, progress=None):
+    """Sends the shards of an oversized record to the SQS_FEED_QUEUE queue
+    :param record: SQS record delivered to the Lambda
+    :param shards: shard bodies built by fanout.split_message
+    :param progress: MessageProgress of the record, the shards an earlier
+        delivery enqueued are marked as published and not sent again
+    """
+    pending = shards
+    if progress is not None:
+        pending = [
+            shard for shard in shards if not progress.is_published(shard["ShardIndex"])
+        ]
+    with get_metrics().timer("fanout", len(pending)):
+        result = AWSUtils.send_batch_sqs_messages(
+            os.environ["SQS_FEED_QUEUE"],
+            [json.dumps(shard) for shard in pending],
+            [{} for _ in pending],
+            ids=[str(shard["ShardIndex"]) for shard in pending],
+        )
+    if progress is not None:
+        for shard_index in result.successful:
+            progress.mark_published(int(shard_index))
+    if not result:
+        raise RuntimeError(f"Shards {result.failed_ids} couldn't be enqueued")
+    print(f"Message Id: {record['messageId']} was split into {len(shards)} shards.")
+
+
+def prepare_record(record, output=None, deadline=None):
+    """Decodes and classifies a single SQS record, raising on any failure
+    :param record: SQS record delivered to the Lambda
+    :param output: OutputBuffer collecting the results, they're sent one by one if None
+    :param deadline: Deadline of the invocation, work left once it expires is
+        re-enqueued as a continuation message
+    :returns: PrimeNumberManager holding the primes to be published, or None
+    """
+    progress = idempotency.track(record)
+    if progress is not None and progress.completed:
+        print(f"Message Id: {record['messageId']} was already processed, skipping it.")
+        return None
+    if deadline is not None and deadline.expired():
+        # Not started before the deadline, a later invocation processes it whole
+        remainder = json.loads(record["body"])
+        remainder["ContinuationOf"] = record["messageId"]
+        continue_record(remainder)
+        complete_record(progress, None, {"Continued": True})
+        return None
+
+    if output is not None:
+        output = output.for_source(record["messageId"])
+    with get_metrics().timer("decode"):
+        # Large Numbers arrays are decoded while being classified, unless the
+        # whole list is needed to plan a fan-out
+        event_data = stream_decoder.decode(record["body"], not fanout.enabled())
+    if event_data.get("Range") is not None:
+        start, end = parse_range(event_data["Range"])
+        # Range primes are streamed and published while sieving
+        pnm = PrimeNumberManager(progress=progress, output=output, deadline=deadline)
+        found = pnm.get_primes_in_range(start, end)
+        if pnm.remainder is not None:
+            pnm.remainder["ContinuationOf"] = record["messageId"]
+            continue_record(pnm.remainder)
+        complete_record(progress, output, {"NumberOfPrimes": found})
+        return None
+
+    numbers = event_data.get("Numbers", "")
+    if not numbers:
+        print(
+            f"Message Id: {record['messageId']} didn't present any numbers to be processed."
+        )
+        return None
+
+    shards = fanout.split_message(event_data, record["messageId"])
+    if shards is not None:
+        fan_out_record(record, shards, progress)
+        complete_record(progress, None, {"Shards": len(shards)})
+        return None
+
+    shard = fanout.shard_of(event_data)
+    pnm = PrimeNumberManager(progress=progress, output=output, deadline=deadline)
+    pnm.get_prime_numbers(numbers, publish=False)
+    if pnm.remainder is not None:
+        pnm.remainder["ContinuationOf"] = record["messageId"]
+    if shard is not None:
+        # Consumers reassemble the job from the tagged results, so the shard
+        # part is published even without primes
+        end = shard["ShardOffset"] + pnm.classified
+        pnm.attributes = fanout.result_attributes(shard, end, pnm.remainder is None)
+        if pnm.remainder is not None:
+            pnm.remainder.update(fanout.next_part(shard, end))
+    if pnm.prime_numbers or shard is not None:
+        return pnm
+    if pnm.remainder is not None:
+        continue_record(pnm.remainder)
+    complete_record(progress, output, {"NumberOfPrimes": 0})
+    return None
+
+
+def publish_record(pnm):
+    """Publishes the primes of a prepared record, and its continuation if the
+    deadline cut it short, raising on any failure. The record is only completed
+    once both were sent
+    """
+    if not pnm.publish():
+        raise RuntimeError("Prime numbers couldn't be sent")
+    if pnm.remainder is not None:
+        continue_record(pnm.remainder)
+    complete_record(
+        pnm.progress, pnm.output, {"NumberOfPrimes": len(pnm.prime_numbers)}
+    )
 
 
 def prime_number_processing(event, context):
-    print(event)
+    log_payload(event)
     print("Event received...\nProcessing prime numbers")
+    batch_item_failures = []
+    records = event.get("Records", [])
+    output = output_buffer.create_buffer()
+    deadline = invocation_deadline.from_context(context)
     try:
-        for record in event["Records"]:
-            event_data = json.loads(record["body"])
-            numbers = event_data.get("Numbers", "")
-            if numbers:
-                pnm = PrimeNumberManager()
-                prime_numbers = pnm.get_prime_numbers(numbers)
-                print(f"Prime numbers found: {','.join(map(str, prime_numbers))}")
-            else:
-                print(
-                    f"Message Id: {record['messageId']} didn't present any numbers to be processed."
-                )
-
-    except Exception as e:
-        print(f"General Error: {e}")
+        prepare = prepare_record
+        if output is not None or deadline is not None:
+            prepare = partial(prepare_record, output=output, deadline=deadline)
+        errors = pipeline.process_records(records, prepare, publish_record)
+        for record, e in errors:
+            message_id = record.get("messageId")
+            print(f"General Error: Message Id: {message_id} failed with {e}")
+            batch_item_failures.append({"itemIdentifier": message_id})
+
+        if output is not None:
+            # Nothing may stay buffered once the invocation returns
+            failed_sources = output.flush()
+            reported = {failure["itemIdentifier"] for failure in batch_item_failures}
+            for record in records:
+                message_id = record.get("messageId")
+                if message_id in failed_sources and message_id not in reported:
+                    print(
+                        f"General Error: Message Id: {message_id} failed to publish "
+                        "its buffered results"
+                    )
+                    batch_item_failures.append({"itemIdentifier": message_id})
+                    reported.add(message_id)
+    finally:
+        get_metrics().flush()
+
+    return {"batchItemFailures": batch_item_failures}
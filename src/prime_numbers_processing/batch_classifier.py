@@ -0,0 +1,131 @@
+import os
+
+# numpy is optional and only imported the first time a batch is classified
+np = None
+
+BATCH_THRESHOLD_ENV = "BATCH_CLASSIFY_THRESHOLD"
+DEFAULT_BATCH_THRESHOLD = 1024
+
+# Trial division primes used by the divisibility masks, every survivor below
+# the square of the last one is prime.
+SIEVE_PRIMES = (
+    2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71,
+    73, 79, 83, 89, 97, 101, 103, 107, 109, 113, 127, 131, 137, 139, 149, 151,
+)  # fmt: skip
+
+# Bases 2, 7 and 61 are deterministic below 4,759,123,141. Squares of values
+# below 2^32 fit in uint64, so that's the range handled without the scalar path.
+VECTOR_MR_BASES = (2, 7, 61)
+VECTOR_MR_LIMIT = 1 << 32
+
+
+def batch_threshold():
+    """Minimum amount of numbers for the batch classifier to be used
+    :returns: threshold read from BATCH_CLASSIFY_THRESHOLD
+    """
+    return int(os.environ.get(BATCH_THRESHOLD_ENV, DEFAULT_BATCH_THRESHOLD))
+
+
+def _load_numpy():
+    """Imports numpy on first use
+    :returns: True if numpy is available
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+def _to_uint64(numbers):
+    """Converts a homogeneous list of python ints into an uint64 array
+    :param numbers: numbers to be converted
+    :returns: tuple with the array and a mask of the valid (non-negative) entries,
+        or None if the list can't be represented as uint64
+    """
+    if set(map(type, numbers)) != {int}:
+        return None
+    try:
+        array = np.array(numbers, dtype=np.int64)
+    except OverflowError:
+        try:
+            array = np.array(numbers, dtype=np.uint64)
+        except OverflowError:
+            return None
+        return array, np.ones(len(array), dtype=bool)
+    valid = array >= 0
+    return np.where(valid, array, 0).astype(np.uint64), valid
+
+
+def _pow_mod(base, exponent, modulus):
+    """Vectorized modular exponentiation for moduli below 2^32"""
+    result = np.ones_like(modulus)
+    base = base % modulus
+    exponent = exponent.copy()
+    while exponent.any():
+        odd = (exponent & np.uint64(1)).astype(bool)
+        result = np.where(odd, result * base % modulus, result)
+        base = base * base % modulus
+        exponent >>= np.uint64(1)
+    return result
+
+
+def _miller_rabin(numbers):
+    """Vectorized deterministic Miller-Rabin for odd numbers below 2^32
+    :param numbers: uint64 array of odd numbers greater than the bases
+    :returns: boolean array, True where the number is prime
+    """
+    one = np.uint64(1)
+    minus_one = numbers - one
+    d = minus_one.copy()
+    s = np.zeros_like(numbers)
+    even = (d & one) == 0
+    while even.any():
+        d = np.where(even, d >> one, d)
+        s += even
+        even = (d & one) == 0
+
+    prime = np.ones(len(numbers), dtype=bool)
+    for base in VECTOR_MR_BASES:
+        x = _pow_mod(np.full_like(numbers, base), d, numbers)
+        passed = (x == one) | (x == minus_one)
+        for step in range(1, int(s.max(initial=0))):
+            pending = ~passed & (step < s)
+            if not pending.any():
+                break
+            x = np.where(pending, x * x % numbers, x)
+            passed |= pending & (x == minus_one)
+        prime &= passed
+    return prime
+
+
+def classify(numbers, is_prime):
+    """Classifies a homogeneous list of integers with vectorized NumPy operations
+    :param numbers: list of numbers to be classified
+    :param is_prime: scalar check used for survivors too large for the vector path
+    :returns: List of booleans in input order, or None if the batch path can't be used
+    """
+    if not numbers or not _load_numpy():
+        return None
+    converted = _to_uint64(numbers)
+    if converted is None:
+        return None
+    array, candidate = converted
+
+    candidate &= array >= 2
+    for prime in SIEVE_PRIMES:
+        p = np.uint64(prime)
+        candidate &= (array % p != 0) | (array == p)
+
+    verdicts = candidate.copy()
+    undecided = candidate & (array >= np.uint64(SIEVE_PRIMES[-1] ** 2))
+    vector = undecided & (array < np.uint64(VECTOR_MR_LIMIT))
+    if vector.any():
+        verdicts[vector] = _miller_rabin(array[vector])
+
+    for index in np.flatnonzero(undecided & ~vector).tolist():
+        verdicts[index] = is_prime(numbers[index])
+    return verdicts.tolist()
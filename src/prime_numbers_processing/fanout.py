@@ -0,0 +1,223 @@
+"""Fan-out of oversized Numbers messages into shards processed by concurrent
+invocations, and the aggregation of their results.
+
+A message whose estimated cost exceeds FANOUT_MAX_COST is split into
+contiguous shards of similar cost, sent back to the feed queue as
+{"Numbers": [...], "JobId": ..., "ShardIndex": i, "ShardCount": n}. A deadline
+continuation of a shard adds the ShardOffset of its first number in the shard.
+The results of a shard carry the JobId, ShardIndex and ShardCount attributes,
+ShardSlice with the "start:end" indexes of the shard numbers they cover, and
+ShardLast marking the part that finished it. JobAggregator reassembles the
+primes of a job, in input order, from the result messages. Results are keyed
+by their slice, so duplicates are dropped even when redeliveries cut a shard at
+other places.
+"""
+
+import math
+import os
+
+from src.prime_numbers_processing import result_codec
+from src.prime_numbers_processing.parallel import estimate_cost
+
+FANOUT_MAX_COST_ENV = "FANOUT_MAX_COST"
+FANOUT_MAX_SHARDS_ENV = "FANOUT_MAX_SHARDS"
+# Matches the reservedConcurrency of the function
+DEFAULT_FANOUT_MAX_SHARDS = 10
+
+SHARD_FIELDS = ("JobId", "ShardIndex", "ShardCount", "ShardOffset")
+
+
+def enabled():
+    """Whether oversized messages are fanned out, i.e. FANOUT_MAX_COST is set"""
+    return int(os.environ.get(FANOUT_MAX_COST_ENV, 0)) > 0
+
+
+def plan_shards(numbers, max_cost, max_shards):
+    """Splits the numbers into contiguous shards of similar cost
+    :param numbers: List of numbers of the message
+    :param max_cost: estimated cost a single invocation should handle
+    :param max_shards: upper bound of the amount of shards
+    :returns: List of number lists, or None if the message isn't worth splitting
+    """
+    small = estimate_cost(0)
+    costs = [estimate_cost(n) if type(n) is int else small for n in numbers]
+    total = sum(costs)
+    count = min(max_shards, len(numbers), math.ceil(total / max_cost))
+    if count < 2:
+        return None
+    shards = []
+    start = 0
+    accumulated = 0
+    for index, cost in enumerate(costs):
+        accumulated += cost
+        # Cut once the running cost reaches the next multiple of total / count
+        if accumulated * count >= total * (len(shards) + 1) and index + 1 < len(costs):
+            shards.append(numbers[start : index + 1])
+            start = index + 1
+            if len(shards) == count - 1:
+                break
+    shards.append(numbers[start:])
+    return shards
+
+
+def split_message(event_data, job_id):
+    """Builds the shard bodies of an oversized Numbers message
+    :param event_data: decoded body of the feed message
+    :param job_id: id shared by the shards, the feed message id
+    :returns: List of shard bodies, or None if fan-out is off, the message is
+        a shard already or it's small enough
+    """
+    max_cost = int(os.environ.get(FANOUT_MAX_COST_ENV, 0))
+    if max_cost <= 0 or "JobId" in event_data:
+        return None
+    numbers = event_data.get("Numbers")
+    if not isinstance(numbers, list):
+        return None
+    max_shards = int(os.environ.get(FANOUT_MAX_SHARDS_ENV, DEFAULT_FANOUT_MAX_SHARDS))
+    shards = plan_shards(numbers, max_cost, max_shards)
+    if shards is None:
+        return None
+    return [
+        {
+            "Numbers": shard,
+            "JobId": job_id,
+            "ShardIndex": index,
+            "ShardCount": len(shards),
+        }
+        for index, shard in enumerate(shards)
+    ]
+
+
+def shard_of(event_data):
+    """Returns the shard fields of a feed message, or None if it isn't a shard"""
+    if "JobId" not in event_data:
+        return None
+    return {
+        "JobId": str(event_data["JobId"]),
+        "ShardIndex": int(event_data["ShardIndex"]),
+        "ShardCount": int(event_data["ShardCount"]),
+        "ShardOffset": int(event_data.get("ShardOffset", 0)),
+    }
+
+
+def next_part(shard, end):
+    """Shard fields of the continuation of a shard
+    :param end: index in the shard of the first number left
+    """
+    return {**shard, "ShardOffset": end}
+
+
+def result_attributes(shard, end, last):
+    """Message attributes tagging the results of a shard part. With the codec
+    and chunk ones they stay within the 10 attributes SQS allows
+    :param shard: shard fields of the feed message
+    :param end: index in the shard after the last number the part classified
+    :param last: whether the part finished the shard, i.e. wasn't continued
+    """
+    return {
+        "JobId": {"DataType": "String", "StringValue": shard["JobId"]},
+        "ShardIndex": {"DataType": "Number", "StringValue": f"{shard['ShardIndex']}"},
+        "ShardCount": {"DataType": "Number", "StringValue": f"{shard['ShardCount']}"},
+        "ShardSlice": {
+            "DataType": "String",
+            "StringValue": f"{shard['ShardOffset']}:{end}",
+        },
+        "ShardLast": {"DataType": "String", "StringValue": f"{last}".lower()},
+    }
+
+
+def _attribute(attributes, name, default=None):
+    attribute = attributes.get(name)
+    if attribute is None:
+        return default
+    return attribute.get("StringValue", attribute.get("stringValue"))
+
+
+class JobAggregator:
+    """Collects the result messages of fanned out jobs. Every chunk is keyed by
+    its shard, the slice of the shard it covers and its chunk index, so
+    duplicated deliveries are ignored
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        # Late duplicates of a job that was already returned are dropped
+        self.completed = set()
+
+    def add(self, message):
+        """Adds a result message, works with both the receive_message and the
+        Lambda event record shapes
+        :param message: SQS message received from SQS_PRIMES_TARGET
+        :returns: List with the primes of the whole job once its last result
+            arrived, else None. Messages of non sharded inputs return None too
+        """
+        attributes = (
+            message.get("MessageAttributes", message.get("messageAttributes")) or {}
+        )
+        job_id = _attribute(attributes, "JobId")
+        if job_id is None or job_id in self.completed:
+            return None
+        job = self.jobs.setdefault(
+            job_id,
+            {
+                "count": int(_attribute(attributes, "ShardCount")),
+                "slices": {},
+                "ends": {},
+            },
+        )
+        shard = int(_attribute(attributes, "ShardIndex"))
+        start, end = (
+            int(bound) for bound in _attribute(attributes, "ShardSlice").split(":")
+        )
+        chunk = int(_attribute(attributes, "ChunkIndex", 0))
+        chunk_count = int(_attribute(attributes, "ChunkCount", 1))
+        chunks = job["slices"].setdefault((shard, start, end), [None] * chunk_count)
+        chunks[chunk] = result_codec.decode_message(message)
+        if _attribute(attributes, "ShardLast") == "true":
+            job["ends"][shard] = end
+        if not self.is_complete(job_id):
+            return None
+        return self.pop(job_id)
+
+    def _path(self, job, shard):
+        """Finds complete slices covering the shard from its start to its end
+        :returns: List of slice keys in order, or None if some are missing
+        """
+        following = {}
+        for key, chunks in job["slices"].items():
+            if key[0] == shard and None not in chunks:
+                following.setdefault(key[1], []).append(key)
+        end = job["ends"][shard]
+        # Redeliveries may cut the shard at other places, any chain of slices
+        # from the start to the end of the shard covers every number once
+        pending = [(0, [])]
+        seen = set()
+        while pending:
+            start, path = pending.pop()
+            if start == end:
+                return path
+            if start in seen:
+                continue
+            seen.add(start)
+            for key in following.get(start, []):
+                pending.append((key[2], path + [key]))
+        return None
+
+    def is_complete(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or len(job["ends"]) < job["count"]:
+            return False
+        return all(self._path(job, shard) is not None for shard in job["ends"])
+
+    def pop(self, job_id):
+        """Removes a complete job
+        :returns: List with the primes of the job in input order
+        """
+        job = self.jobs.pop(job_id)
+        self.completed.add(job_id)
+        primes = []
+        for shard in sorted(job["ends"]):
+            for key in self._path(job, shard):
+                for chunk in job["slices"][key]:
+                    primes.extend(chunk)
+        return primes
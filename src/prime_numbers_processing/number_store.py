@@ -0,0 +1,68 @@
+from array import array
+
+
+class NumberStore:
+    """Append-only integer sequence backed by an unsigned 64-bit array, so each
+    entry takes 8 bytes instead of a boxed int plus a list slot. It's promoted to
+    a plain list the first time a value doesn't fit (negative or above 2^64).
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, numbers=()):
+        self._items = array("Q")
+        self.extend(numbers)
+
+    def append(self, number):
+        try:
+            self._items.append(number)
+        except (OverflowError, TypeError):
+            self._promote()
+            self._items.append(number)
+
+    def extend(self, numbers):
+        if not isinstance(numbers, (list, tuple, array, NumberStore)):
+            numbers = list(numbers)
+        before = len(self._items)
+        try:
+            self._items.extend(numbers)
+        except (OverflowError, TypeError):
+            # array.extend stops at the first bad value, keeping what came before
+            consumed = len(self._items) - before
+            self._promote()
+            self._items.extend(numbers[consumed:])
+
+    def _promote(self):
+        if isinstance(self._items, array):
+            self._items = self._items.tolist()
+
+    @property
+    def is_compact(self):
+        return isinstance(self._items, array)
+
+    def tolist(self):
+        return list(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __eq__(self, other):
+        if isinstance(other, NumberStore):
+            other = other._items
+        try:
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in zip(self._items, other)
+            )
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"NumberStore({self.tolist()!r})"
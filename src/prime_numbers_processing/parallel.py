@@ -0,0 +1,222 @@
+"""Opt-in multi-core classification for expensive (big integer) inputs.
+
+The workers are plain processes talking over pipes, created once per container
+and reused by warm invocations. multiprocessing.Pool and ProcessPoolExecutor
+need /dev/shm semaphores, which Lambda doesn't provide. They are started by a
+forkserver: the pool may be created from a pipeline thread, and forking a
+multithreaded process can copy locks held by the other threads.
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+
+from src.prime_numbers_processing.primality import get_engine
+
+CLASSIFY_PROCESSES_ENV = "CLASSIFY_PROCESSES"
+PARALLEL_MIN_COST_ENV = "PARALLEL_MIN_COST"
+PARALLEL_TIMEOUT_ENV = "PARALLEL_TIMEOUT"
+# Roughly twenty 1024-bit numbers, below it the pipe round trips eat the gain.
+# Only numbers above 64 bits count, the serial path handles the others in
+# about a microsecond each
+DEFAULT_PARALLEL_MIN_COST = 20 * 1024**2
+# Seconds the workers get to answer when there's no invocation deadline
+DEFAULT_PARALLEL_TIMEOUT = 60
+# Third-party modules of the primality engines, the builtin one uses sympy above 2^64
+ENGINE_MODULES = ("gmpy2", "sympy")
+
+
+def estimate_cost(number):
+    """Relative cost of testing a number, the modular exponentiations of
+    Miller-Rabin grow about quadratically with the bit length
+    """
+    return max(number.bit_length(), 64) ** 2
+
+
+SMALL_COST = estimate_cost(0)
+
+
+def worker_count():
+    """Amount of worker processes asked by CLASSIFY_PROCESSES, 0 when unset"""
+    return int(os.environ.get(CLASSIFY_PROCESSES_ENV, 0))
+
+
+def enabled():
+    """Whether CLASSIFY_PROCESSES asks for a pool of at least two workers"""
+    return worker_count() >= 2
+
+
+def min_cost():
+    """Estimated cost of big integers from which the pool pays off"""
+    return int(os.environ.get(PARALLEL_MIN_COST_ENV, DEFAULT_PARALLEL_MIN_COST))
+
+
+def big_cost(costs):
+    """Estimated cost of the numbers above 64 bits, the ones worth a worker"""
+    return sum(cost for cost in costs if cost > SMALL_COST)
+
+
+def worth_it(numbers):
+    """Whether a list of ints is costly enough for the pool, PARALLEL_MIN_COST"""
+    return big_cost(map(estimate_cost, numbers)) >= min_cost()
+
+
+def split_by_cost(costs, parts):
+    """Spreads items over parts so each part gets a similar total cost
+    (longest processing time first)
+    :param costs: cost of every item
+    :param parts: amount of parts
+    :returns: List of index lists, one per non empty part
+    """
+    loads = [(0, part) for part in range(parts)]
+    assignment = [[] for _ in range(parts)]
+    for index in sorted(range(len(costs)), key=costs.__getitem__, reverse=True):
+        load, part = heapq.heappop(loads)
+        assignment[part].append(index)
+        heapq.heappush(loads, (load + costs[index], part))
+    return [indexes for indexes in assignment if indexes]
+
+
+def _worker_main(connection):
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        engine_name, numbers = job
+        try:
+            is_prime = get_engine(engine_name).is_prime
+            connection.send((True, [is_prime(number) for number in numbers]))
+        except Exception as e:
+            connection.send((False, e))
+    connection.close()
+
+
+class ClassifierPool:
+    """Fixed set of worker processes, each one serving a single pipe
+    :param workers: amount of processes
+    """
+
+    def __init__(self, workers):
+        import multiprocessing
+
+        context = multiprocessing.get_context("forkserver")
+        # Imported once by the server instead of by every worker, with the
+        # engine backends the parent already loaded
+        backends = [name for name in ENGINE_MODULES if name in sys.modules]
+        context.set_forkserver_preload([__name__, *backends])
+        self.workers = workers
+        self._connections = []
+        self._processes = []
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker_main, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def classify(self, numbers, engine_name, parts, timeout):
+        """Classifies the numbers split into the given parts
+        :param numbers: numbers to be classified
+        :param engine_name: primality engine used by the workers
+        :param parts: List of index lists, at most one per worker
+        :param timeout: seconds the workers get to answer, else TimeoutError is
+            raised and the pool must be closed
+        :returns: List of verdicts in input order
+        """
+        verdicts = [None] * len(numbers)
+        ends_at = time.monotonic() + timeout
+        with self._lock:
+            for connection, indexes in zip(self._connections, parts):
+                connection.send((engine_name, [numbers[i] for i in indexes]))
+            outcomes = []
+            for connection, _ in zip(self._connections, parts):
+                if not connection.poll(max(ends_at - time.monotonic(), 0)):
+                    raise TimeoutError(f"No verdicts after {timeout:.1f}s")
+                outcomes.append(connection.recv())
+        for indexes, (ok, result) in zip(parts, outcomes):
+            if not ok:
+                raise result
+            for index, verdict in zip(indexes, result):
+                verdicts[index] = verdict
+        return verdicts
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                # Still busy with the job of a timed out call
+                process.terminate()
+                process.join(timeout=1)
+
+
+_pool = None
+
+
+def get_pool(workers):
+    """Returns the container-wide pool, recreated only if the size changes"""
+    global _pool
+    if _pool is None or _pool.workers != workers:
+        if _pool is not None:
+            _pool.close()
+        _pool = ClassifierPool(workers)
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = None
+
+
+def classify(numbers, engine, deadline=None):
+    """Classifies the numbers on the process pool when it pays off
+    :param numbers: List of numbers to be classified
+    :param engine: primality engine, the workers use the one of the same name
+    :param deadline: Deadline of the invocation, the workers must answer before
+        it expires, else within PARALLEL_TIMEOUT seconds
+    :returns: List of verdicts in input order, or None if CLASSIFY_PROCESSES is
+        off, the input isn't all ints, its estimated cost is too low or the
+        pool is unusable
+    :raises TimeoutError: if the workers didn't answer in time, the pool is
+        shut down and the numbers are left unclassified
+    """
+    workers = worker_count()
+    if workers < 2 or len(numbers) < 2:
+        return None
+    if any(type(number) is not int for number in numbers):
+        # The serial path raises the validation errors
+        return None
+    if not worth_it(numbers):
+        return None
+    if deadline is not None:
+        # The margin is kept to publish the partial results
+        timeout = max(deadline.remaining_ms() - deadline.margin_ms, 0) / 1000
+    else:
+        timeout = float(os.environ.get(PARALLEL_TIMEOUT_ENV, DEFAULT_PARALLEL_TIMEOUT))
+    costs = [estimate_cost(number) for number in numbers]
+    parts = split_by_cost(costs, min(workers, len(numbers)))
+    try:
+        return get_pool(workers).classify(numbers, engine.name, parts, timeout)
+    except TimeoutError:
+        # The workers are still busy with the job
+        shutdown_pool()
+        raise
+    except (EOFError, OSError) as e:
+        print(f"Classification pool unusable ({e}), classifying on a single core")
+        shutdown_pool()
+        return None
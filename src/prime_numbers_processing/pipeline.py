@@ -0,0 +1,95 @@
+import os
+
+PIPELINE_MAX_IN_FLIGHT_ENV = "PIPELINE_MAX_IN_FLIGHT"
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Created once per container so the send threads are reused by warm invocations
+_executor = None
+_executor_workers = 0
+
+
+def max_in_flight():
+    """Maximum amount of concurrent sends, 0 disables the pipeline
+    :returns: limit read from PIPELINE_MAX_IN_FLIGHT
+    """
+    return int(os.environ.get(PIPELINE_MAX_IN_FLIGHT_ENV, DEFAULT_MAX_IN_FLIGHT))
+
+
+def get_executor(workers):
+    """Returns the send thread pool, growing it if more workers are needed"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers < workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="sqs-send"
+        )
+        _executor_workers = workers
+    return _executor
+
+
+async def _run(records, prepare, publish, limit):
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor(limit)
+    in_flight = asyncio.Semaphore(limit)
+    errors = {}
+    sends = []
+
+    async def send(index, job):
+        try:
+            await loop.run_in_executor(executor, publish, job)
+        except Exception as e:
+            errors[index] = e
+        finally:
+            in_flight.release()
+
+    for index, record in enumerate(records):
+        try:
+            job = prepare(record)
+        except Exception as e:
+            errors[index] = e
+            continue
+        if job is None:
+            continue
+        # Backpressure, wait for a slot before classifying further records
+        await in_flight.acquire()
+        sends.append(asyncio.create_task(send(index, job)))
+        # Let the task hand the send over to the executor right away
+        await asyncio.sleep(0)
+
+    # Drain every pending send before returning
+    await asyncio.gather(*sends)
+    return [(records[index], errors[index]) for index in sorted(errors)]
+
+
+def process_records(records, prepare, publish, limit=None):
+    """Runs records through prepare and publish, overlapping the publishing of
+    earlier records with the preparation (decode/classify) of the next ones
+    :param records: records to be processed
+    :param prepare: CPU bound step, returns the job to be published or None
+    :param publish: I/O bound step, run on a thread pool with the job
+    :param limit: maximum concurrent publishes, defaults to PIPELINE_MAX_IN_FLIGHT
+    :returns: List of (record, exception) tuples of the failed records, in input order
+    """
+    records = list(records)
+    if limit is None:
+        limit = max_in_flight()
+    if limit > 0 and len(records) > 1:
+        # asyncio is imported on first use, it's a sizeable part of the cold start
+        import asyncio
+
+        return asyncio.run(_run(records, prepare, publish, limit))
+
+    errors = []
+    for record in records:
+        try:
+            job = prepare(record)
+            if job is not None:
+                publish(job)
+        except Exception as e:
+            errors.append((record, e))
+    return errors
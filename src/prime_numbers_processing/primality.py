@@ -0,0 +1,195 @@
+import operator
+import os
+
+PRIMALITY_ENGINE_ENV = "PRIMALITY_ENGINE"
+DEFAULT_ENGINE = "builtin"
+
+# Smallest known deterministic Miller-Rabin base sets per range (the same
+# ones SymPy uses, see https://miller-rabin.appspot.com), ending with
+# Sinclair's 7 bases for every 64-bit integer. Larger values are handed over
+# to SymPy.
+UINT64_LIMIT = 1 << 64
+
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53)
+MILLER_RABIN_BASE_SETS = (
+    (341531, (9345883071009581737,)),
+    (4759123141, (2, 7, 61)),
+    (350269456337, (4230279247111683200, 14694767155120705706, 16641139526367750375)),
+    (55245642489451, (2, 141889084524735, 1199124725622454117, 11096072698276303650)),
+    (
+        7999252175582851,
+        (2, 4130806001517, 149795463772692060, 186635894390467037, 3967304179347715805),
+    ),
+    (
+        585226005592931977,
+        (
+            2,
+            123635709730000,
+            9233062284813009,
+            43835965440333360,
+            761179012939631437,
+            1263739024124850375,
+        ),
+    ),
+    (UINT64_LIMIT, (2, 325, 9375, 28178, 450775, 9780504, 1795265022)),
+)
+
+
+def miller_rabin_bases(number):
+    """Returns the smallest deterministic base set for a number below 2^64"""
+    for limit, bases in MILLER_RABIN_BASE_SETS:
+        if number < limit:
+            return bases
+    raise ValueError(f"No deterministic Miller-Rabin bases for {number}")
+
+
+def as_int(number):
+    """Validates the given value the same way sympy.isprime does
+    :param number: value to be checked
+    :returns: the value as a python int, else raises a ValueError
+    """
+    try:
+        if isinstance(number, bool):
+            raise TypeError
+        return operator.index(number)
+    except TypeError:
+        raise ValueError(f"{number} is not an integer") from None
+
+
+def miller_rabin(number, bases):
+    """Runs Miller-Rabin for the given bases, expects an odd number > 2
+    :param number: odd number to be tested
+    :param bases: witnesses to be used
+    :returns: False if any base proves the number composite, else True
+    """
+    d = number - 1
+    s = 0
+    while not d & 1:
+        d >>= 1
+        s += 1
+
+    for base in bases:
+        base %= number
+        if base == 0:
+            # Bases larger than the number are reduced, the sets are verified
+            # with a zero base counting as passed
+            continue
+        x = pow(base, d, number)
+        if x == 1 or x == number - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % number
+            if x == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+class PrimalityEngine:
+    """Base class of the primality backends"""
+
+    name = None
+
+    def is_prime(self, number) -> bool:
+        raise NotImplementedError
+
+
+class SympyEngine(PrimalityEngine):
+    """Delegates every check to sympy.isprime"""
+
+    name = "sympy"
+
+    def __init__(self):
+        import sympy
+
+        self._isprime = sympy.isprime
+
+    def is_prime(self, number) -> bool:
+        return self._isprime(number)
+
+
+class BuiltinEngine(PrimalityEngine):
+    """Trial division by small primes plus deterministic Miller-Rabin,
+    falling back to SymPy above 2^64
+    """
+
+    name = "builtin"
+
+    def __init__(self):
+        self._fallback = None
+
+    def is_prime(self, number) -> bool:
+        number = as_int(number)
+        if number < 2:
+            return False
+        for prime in SMALL_PRIMES:
+            if number % prime == 0:
+                return number == prime
+        if number < SMALL_PRIMES[-1] ** 2:
+            return True
+        if number >= UINT64_LIMIT:
+            if self._fallback is None:
+                self._fallback = SympyEngine()
+            return self._fallback.is_prime(number)
+        return miller_rabin(number, miller_rabin_bases(number))
+
+
+class Gmpy2Engine(PrimalityEngine):
+    """Uses GMP through gmpy2, only available when gmpy2 is installed"""
+
+    name = "gmpy2"
+
+    def __init__(self):
+        import gmpy2
+
+        self._is_prime = gmpy2.is_prime
+
+    def is_prime(self, number) -> bool:
+        return bool(self._is_prime(as_int(number)))
+
+
+ENGINES = {
+    BuiltinEngine.name: BuiltinEngine,
+    Gmpy2Engine.name: Gmpy2Engine,
+    SympyEngine.name: SympyEngine,
+}
+
+_engines = {}
+
+
+def get_engine(name=None) -> PrimalityEngine:
+    """Returns the primality engine, created once per process
+    :param name: engine name, defaults to the PRIMALITY_ENGINE environment variable
+    :returns: PrimalityEngine instance, the builtin one if the requested is unavailable
+    """
+    name = (name or os.environ.get(PRIMALITY_ENGINE_ENV) or DEFAULT_ENGINE).lower()
+    engine = _engines.get(name)
+    if engine is not None:
+        return engine
+
+    if name not in ENGINES:
+        raise ValueError(
+            f"Unknown primality engine: {name}. Available: {', '.join(ENGINES)}"
+        )
+    try:
+        engine = ENGINES[name]()
+    except ImportError as e:
+        print(f"Primality engine {name} unavailable ({e}), using {DEFAULT_ENGINE}")
+        engine = get_engine(DEFAULT_ENGINE)
+    _engines[name] = engine
+    return engine
+
+
+def available_engines():
+    """Lists the engines whose dependencies can be imported
+    :returns: List with the names of the usable engines
+    """
+    names = []
+    for name, engine_class in ENGINES.items():
+        try:
+            engine_class()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
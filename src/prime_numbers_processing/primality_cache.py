@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+
+from src.prime_numbers_processing.primality import as_int
+
+CACHE_ENABLED_ENV = "PRIMALITY_CACHE_ENABLED"
+CACHE_SIZE_ENV = "PRIMALITY_CACHE_SIZE"
+CACHE_SEED_ENV = "PRIMALITY_CACHE_SEED"
+DEFAULT_CACHE_SIZE = 65536
+
+
+class PrimalityCache:
+    """Size-bounded LRU cache of primality verdicts"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._verdicts)
+
+    def get(self, number):
+        """Looks up a verdict, marking it as recently used
+        :param number: integer to be looked up
+        :returns: the cached verdict, or None if the number isn't cached
+        """
+        with self._lock:
+            verdict = self._verdicts.get(number)
+            if verdict is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._verdicts.move_to_end(number)
+            return verdict
+
+    def put(self, number, verdict):
+        """Stores a verdict, evicting the least recently used one if full
+        :param number: integer that was classified
+        :param verdict: True if the number is prime
+        """
+        with self._lock:
+            self._verdicts[number] = verdict
+            self._verdicts.move_to_end(number)
+            if len(self._verdicts) > self.maxsize:
+                self._verdicts.popitem(last=False)
+
+    def wrap(self, is_prime):
+        """Wraps a primality check so its verdicts go through the cache
+        :param is_prime: primality check to be memoized
+        :returns: function with the same signature as is_prime
+        """
+
+        def cached_is_prime(number):
+            # Validate first so True/2.0 never hit the entries of 1/2
+            number = as_int(number)
+            verdict = self.get(number)
+            if verdict is None:
+                verdict = bool(is_prime(number))
+                self.put(number, verdict)
+            return verdict
+
+        return cached_is_prime
+
+    def load_seed(self, path, is_prime):
+        """Pre-warms the cache from a file with one integer per line
+        :param path: path of the seed file
+        :param is_prime: primality check used to compute the seeded verdicts
+        :returns: amount of numbers loaded
+        """
+        loaded = 0
+        with open(path) as seed:
+            for line in seed:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                number = int(line)
+                self.put(number, bool(is_prime(number)))
+                loaded += 1
+        return loaded
+
+    def stats(self):
+        return {
+            "size": len(self._verdicts),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._verdicts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_enabled():
+    return os.environ.get(CACHE_ENABLED_ENV, "true").lower() not in ("0", "false")
+
+
+def get_cache(is_prime=None):
+    """Returns the process-wide cache, shared across warm invocations
+    :param is_prime: primality check used to pre-warm the cache from PRIMALITY_CACHE_SEED
+    :returns: PrimalityCache, or None when disabled through PRIMALITY_CACHE_ENABLED
+    """
+    global _cache
+    if not cache_enabled():
+        return None
+    if _cache is not None:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None:
+            cache = PrimalityCache(
+                int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE))
+            )
+            seed_path = os.environ.get(CACHE_SEED_ENV)
+            if seed_path and is_prime is not None:
+                loaded = cache.load_seed(seed_path, is_prime)
+                print(f"Primality cache pre-warmed with {loaded} numbers")
+            _cache = cache
+    return _cache
+
+
+def reset_cache():
+    """Drops the process-wide cache"""
+    global _cache
+    with _cache_lock:
+        _cache = None
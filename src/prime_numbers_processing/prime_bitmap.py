@@ -0,0 +1,200 @@
+"""Precomputed odd-only prime bitmap, opened with mmap for O(1) lookups.
+
+Bit i of the payload tells whether 2 * i + 1 is prime, so 10^9 takes about
+60MB. Lookups only fault in the page they read, the file is never loaded as a
+whole. Build one with:
+
+    python -m src.prime_numbers_processing.prime_bitmap build --bound 1000000000 --output primes.bitmap
+    python -m src.prime_numbers_processing.prime_bitmap verify primes.bitmap
+
+and point PRIME_BITMAP_PATH at it (e.g. a file shipped in a Lambda layer).
+Hashing the whole payload takes a while for large bounds, so opening the file
+only checks its header and size. Run verify when packaging the file; set
+PRIME_BITMAP_VERIFY to also hash it on every cold start.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+from src.prime_numbers_processing.sieve import base_primes, sieve_segment
+
+PRIME_BITMAP_PATH_ENV = "PRIME_BITMAP_PATH"
+PRIME_BITMAP_VERIFY_ENV = "PRIME_BITMAP_VERIFY"
+
+MAGIC = b"PRIMEBMP"
+VERSION = 1
+# magic, version, bound, payload bytes, sha256 of the payload, padded to 64 bytes
+HEADER = struct.Struct("<8sIQQ32s4x")
+# Odd numbers sieved per segment while building, a multiple of 8 so segments
+# start on a byte boundary
+BUILD_SEGMENT_SIZE = 1 << 22
+_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def _pack_bits(flags):
+    """Packs a bytearray of 0/1 flags into bytes, flag i being bit i % 8 of byte i // 8"""
+    if not flags:
+        return b""
+    # int() parses binary strings in linear time, which beats a Python level loop
+    digits = flags.translate(_TO_DIGITS)[::-1]
+    return int(digits, 2).to_bytes((len(flags) + 7) // 8, "little")
+
+
+def build(path, bound, segment_size=BUILD_SEGMENT_SIZE):
+    """Writes the bitmap of the odd primes up to bound
+    :param path: file to be written
+    :param bound: largest number covered by the bitmap
+    :param segment_size: odd numbers sieved at once, a multiple of 8
+    :returns: size of the file in bytes
+    """
+    if segment_size % 8:
+        raise ValueError(f"Segment size must be a multiple of 8, got {segment_size}")
+    primes = base_primes(math.isqrt(bound))
+    digest = hashlib.sha256()
+    payload_size = 0
+    with open(path, "wb") as bitmap:
+        bitmap.write(bytes(HEADER.size))
+        low = 1
+        while low <= bound:
+            high = min(low + 2 * segment_size, bound + 1)
+            packed = _pack_bits(sieve_segment(low, high, primes))
+            digest.update(packed)
+            bitmap.write(packed)
+            payload_size += len(packed)
+            low += 2 * segment_size
+        bitmap.seek(0)
+        bitmap.write(HEADER.pack(MAGIC, VERSION, bound, payload_size, digest.digest()))
+    return HEADER.size + payload_size
+
+
+class PrimeBitmap:
+    """Read-only view of a bitmap file
+    :param path: file written by build()
+    :param verify: also checks the payload checksum, which reads the whole file
+    """
+
+    def __init__(self, path, verify=False):
+        with open(path, "rb") as bitmap:
+            self._map = mmap.mmap(bitmap.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check(verify)
+        except ValueError:
+            self._map.close()
+            raise
+
+    def _check(self, verify):
+        if len(self._map) < HEADER.size:
+            raise ValueError("Prime bitmap is truncated")
+        magic, version, bound, size, checksum = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a prime bitmap file, or an unsupported version")
+        if size != ((bound + 1) // 2 + 7) // 8:
+            raise ValueError(f"Payload size {size} doesn't match the bound {bound}")
+        if len(self._map) != HEADER.size + size:
+            raise ValueError("Prime bitmap is truncated")
+        if verify:
+            digest = hashlib.sha256()
+            for offset in range(HEADER.size, len(self._map), 1 << 24):
+                digest.update(self._map[offset : offset + (1 << 24)])
+            if digest.digest() != checksum:
+                raise ValueError("Prime bitmap checksum mismatch")
+        self.bound = bound
+
+    def lookup(self, number):
+        """Verdict of a plain int up to the bound
+        :returns: True or False, or None if the bitmap doesn't cover the number
+        """
+        if type(number) is not int or not 0 <= number <= self.bound:
+            return None
+        if number & 1 == 0:
+            return number == 2
+        index = number >> 1
+        return bool(self._map[HEADER.size + (index >> 3)] >> (index & 7) & 1)
+
+    def wrap(self, fallback):
+        """Returns a primality check answered by the bitmap up to its bound and
+        by fallback above it, or for anything that isn't a plain int
+        """
+        bound = self.bound
+        bits = self._map
+        offset = HEADER.size
+
+        def is_prime(number):
+            if type(number) is int and 0 <= number <= bound:
+                if number & 1 == 0:
+                    return number == 2
+                index = number >> 1
+                return bool(bits[offset + (index >> 3)] >> (index & 7) & 1)
+            return fallback(number)
+
+        return is_prime
+
+    def close(self):
+        self._map.close()
+
+
+_bitmap = None
+_bitmap_path = None
+
+
+def get_bitmap():
+    """Returns the process-wide bitmap, opened once per container
+    :returns: PrimeBitmap of PRIME_BITMAP_PATH, or None if unset or invalid
+    """
+    global _bitmap, _bitmap_path
+    path = os.environ.get(PRIME_BITMAP_PATH_ENV)
+    if not path:
+        return None
+    if path != _bitmap_path:
+        verify = os.environ.get(PRIME_BITMAP_VERIFY_ENV, "false").lower()
+        try:
+            _bitmap = PrimeBitmap(path, verify=verify in ("1", "true"))
+        except (OSError, ValueError) as e:
+            print(f"Prime bitmap {path} unusable ({e}), using the primality engine")
+            _bitmap = None
+        _bitmap_path = path
+    return _bitmap
+
+
+def reset_bitmap():
+    """Closes the process-wide bitmap so PRIME_BITMAP_PATH is read again"""
+    global _bitmap, _bitmap_path
+    if _bitmap is not None:
+        _bitmap.close()
+    _bitmap = None
+    _bitmap_path = None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_command = commands.add_parser("build", help="generate a bitmap file")
+    build_command.add_argument("--bound", type=int, default=10**9)
+    build_command.add_argument("--output", required=True)
+    verify_command = commands.add_parser("verify", help="check a bitmap file")
+    verify_command.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        size = build(args.output, args.bound)
+        print(
+            f"Prime bitmap up to {args.bound} written to {args.output} ({size} bytes)"
+        )
+        args.path = args.output
+    try:
+        bitmap = PrimeBitmap(args.path, verify=True)
+    except ValueError as e:
+        print(f"{args.path} is invalid: {e}")
+        return 1
+    print(f"{args.path} is valid, it covers the numbers up to {bitmap.bound}")
+    bitmap.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,138 @@
 import os
+import time
+from functools import partial
+from itertools import compress, islice
 
-import sympy
+from src.prime_numbers_processing import (
+    batch_classifier,
+    parallel,
+    prime_bitmap,
+    result_codec,
+    sieve,
+)
+from src.prime_numbers_processing.number_store import NumberStore
+from src.prime_numbers_processing.primality import get_engine
+from src.prime_numbers_processing.primality_cache import get_cache
+from src.prime_numbers_processing.stream_decoder import NumbersStream
+from src.utils.aws_utils import AWSUtils
+from src.utils.metrics import get_metrics
 
-from utils.aws_utils import AWSUtils
+# Numbers classified at once, bounds the temporary verdict lists
+CLASSIFY_BLOCK_SIZE = 1 << 16
+# Smaller blocks when a deadline is set, it's checked between blocks
+DEADLINE_BLOCK_SIZE = 1 << 12
+# Estimated cost of a deadline block, the one of DEADLINE_BLOCK_SIZE 64-bit
+# numbers. Blocks of big integers hold fewer numbers, e.g. 16 of 1024 bits
+DEADLINE_BLOCK_COST = DEADLINE_BLOCK_SIZE * parallel.estimate_cost(0)
+
+RANGE_FLUSH_SIZE_ENV = "RANGE_FLUSH_SIZE"
+DEFAULT_RANGE_FLUSH_SIZE = 20000
+
+
+def _deadline_block_cost():
+    """Estimated cost of a deadline block. On the pool every worker gets about
+    the cost of a serial block, so the deadline is checked as often, and a
+    block of big integers always reaches PARALLEL_MIN_COST
+    """
+    if not parallel.enabled():
+        return DEADLINE_BLOCK_COST
+    return max(DEADLINE_BLOCK_COST * parallel.worker_count(), parallel.min_cost())
+
+
+def _deadline_blocks(numbers, max_cost=DEADLINE_BLOCK_COST):
+    """Cuts the numbers into blocks of at most DEADLINE_BLOCK_SIZE numbers and
+    max_cost estimated cost, a single number may exceed it
+    :param numbers: iterable of numbers
+    :param max_cost: estimated cost of a block, at least the one of
+        DEADLINE_BLOCK_SIZE 64-bit numbers
+    :returns: generator of number lists
+    """
+    estimate_cost = parallel.estimate_cost
+    small = estimate_cost(0)
+    iterator = iter(numbers)
+    for block in iter(lambda: list(islice(iterator, DEADLINE_BLOCK_SIZE)), []):
+        try:
+            largest = max(map(abs, block))
+        except TypeError:
+            largest = 0  # Invalid values are reported by the classification
+        if type(largest) is not int or largest.bit_length() <= 64:
+            # Within the cost of a block by definition, the usual case
+            yield block
+            continue
+        start = 0
+        cost = 0
+        for index, number in enumerate(block):
+            cost += estimate_cost(number) if type(number) is int else small
+            if cost >= max_cost:
+                yield block[start : index + 1]
+                start = index + 1
+                cost = 0
+        if start < len(block):
+            yield block[start:]
+
+
+def _within(block, bound):
+    """Whether the bitmap answers every number of the block, its lookups beat
+    the vectorized tests of the batch classifier
+    :param bound: bound of the bitmap, -1 without one
+    """
+    try:
+        return max(block) <= bound
+    except TypeError:
+        return False  # Invalid values are reported by the classification
 
 
 class PrimeNumberManager:
-    def __init__(self):
-        self.prime_numbers = []
-        self.non_prime_numbers = []
+    __slots__ = (
+        "engine",
+        "metrics",
+        "cache",
+        "bitmap",
+        "keep_non_primes",
+        "prime_numbers",
+        "non_prime_numbers",
+        "progress",
+        "published_count",
+        "output",
+        "deadline",
+        "remainder",
+        "classified",
+        "attributes",
+    )
+
+    def __init__(
+        self,
+        engine=None,
+        metrics=None,
+        keep_non_primes=False,
+        progress=None,
+        output=None,
+        deadline=None,
+        attributes=None,
+    ):
+        self.engine = engine or get_engine()
+        self.metrics = metrics or get_metrics()
+        self.cache = get_cache(self.engine.is_prime)
+        # Precomputed primes up to the bitmap bound, None unless PRIME_BITMAP_PATH is set
+        self.bitmap = prime_bitmap.get_bitmap()
+        self.keep_non_primes = keep_non_primes
+        self.prime_numbers = NumberStore()
+        # Only filled when keep_non_primes is set
+        self.non_prime_numbers = NumberStore()
+        # Idempotency state of the source message, already sent results are skipped
+        self.progress = progress
+        self.published_count = 0
+        # SourceOutput of an OutputBuffer, results are buffered instead of sent one by one
+        self.output = output
+        # Work stops once the Deadline expires, the unprocessed part is kept in
+        # remainder as the body of a continuation message
+        self.deadline = deadline
+        self.remainder = None
+        # Amount of numbers classified, the ones before the remainder
+        self.classified = 0
+        # Message attributes added to every result, e.g. the shard of a fanned out
+        # job. Tagged results are published even when no prime was found
+        self.attributes = attributes
 
     def __enter__(self):
         return self
@@ -18,29 +142,246 @@ class PrimeNumberManager:
             print(exc_type)
         return None
 
-    def get_prime_numbers(self, numbers: list):
+    def _iter_blocks(self, numbers, deadline):
+        """Classifies the numbers in bounded blocks
+        :param numbers: iterable of numbers to be classified
+        :param deadline: Deadline the blocks are sized for, or None
+        :returns: generator of (block, verdicts) list pairs, verdicts is None
+            if the deadline expired while the block was on the pool
+        """
+        is_prime = self.engine.is_prime
+        cached_is_prime = (
+            self.cache.wrap(is_prime) if self.cache is not None else is_prime
+        )
+        threshold = batch_classifier.batch_threshold()
+        bound = -1
+        if self.bitmap is not None:
+            cached_is_prime = self.bitmap.wrap(cached_is_prime)
+            bound = self.bitmap.bound
+        if deadline is not None:
+            # Sized by cost, so big integers don't run far past the deadline
+            blocks = _deadline_blocks(numbers, _deadline_block_cost())
+        elif isinstance(numbers, list) and len(numbers) <= CLASSIFY_BLOCK_SIZE:
+            blocks = iter((numbers,))
+        else:
+            iterator = iter(numbers)
+            blocks = iter(lambda: list(islice(iterator, CLASSIFY_BLOCK_SIZE)), [])
+
+        use_pool = parallel.enabled()
+        for block in blocks:
+            verdicts = None
+            if len(block) >= threshold and not _within(block, bound):
+                verdicts = batch_classifier.classify(block, is_prime)
+            if verdicts is None and use_pool:
+                try:
+                    verdicts = self._classify_on_pool(block, deadline)
+                except TimeoutError:
+                    # Out of time, retrying on a single core would run past it
+                    use_pool = False
+                    yield block, None
+                    continue
+            if verdicts is None:
+                verdicts = list(map(cached_is_prime, block))
+            yield block, verdicts
+
+    def _classify_on_pool(self, block, deadline):
+        """Answers what the bitmap and the cache know, and classifies the other
+        numbers of the block on the process pool
+        :param deadline: Deadline the workers must answer before, or None
+        :returns: List of verdicts, or None if the block isn't worth the pool
+        :raises TimeoutError: if the deadline expired before the workers answered
+        """
+        if any(type(number) is not int for number in block):
+            # The serial path raises the validation errors
+            return None
+        if not parallel.worth_it(block):
+            return None
+        verdicts = [None] * len(block)
+        pending = []
+        for index, number in enumerate(block):
+            verdict = None
+            if self.bitmap is not None:
+                verdict = self.bitmap.lookup(number)
+            if verdict is None and self.cache is not None:
+                verdict = self.cache.get(number)
+            if verdict is None:
+                pending.append(index)
+            else:
+                verdicts[index] = verdict
+        numbers = [block[index] for index in pending]
+        try:
+            pooled = parallel.classify(numbers, self.engine, deadline)
+        except TimeoutError:
+            if deadline is not None:
+                raise
+            pooled = None  # PARALLEL_TIMEOUT, there's no deadline to run past
+        if pooled is None:
+            pooled = list(map(self.engine.is_prime, numbers))
+        for index, number, verdict in zip(pending, numbers, pooled):
+            verdicts[index] = verdict = bool(verdict)
+            if self.cache is not None:
+                self.cache.put(number, verdict)
+        return verdicts
+
+    def iter_verdicts(self, numbers):
+        """Streams the verdict of each number without storing anything
+        :param numbers: iterable of numbers to be classified
+        :returns: generator of (number, is_prime) tuples in input order
+        """
+        for block, verdicts in self._iter_blocks(numbers, self.deadline):
+            if verdicts is None:
+                # Nowhere to hand the block back, it's classified anyway
+                verdicts = list(map(self.engine.is_prime, block))
+            yield from zip(block, verdicts)
+
+    def _unclassified(self, numbers, classified, pending=None):
+        """Returns the numbers left once the deadline expired, or None while
+        there's time left, nothing left or they can't be recovered (iterators)
+        :param pending: block already taken from the numbers but not classified
+        """
+        if pending is None and not self.deadline.expired():
+            return None
+        if isinstance(numbers, list):
+            return numbers[classified:] or None
+        if isinstance(numbers, NumbersStream):
+            return list(pending or ()) + numbers.rest() or None
+        return None
+
+    def classify(self, numbers: list):
+        """Splits the given numbers into prime_numbers and, if keep_non_primes is
+        set, non_prime_numbers. If the deadline expires first, the numbers left
+        are kept in remainder
+        :param numbers: List of numbers provided by the SQS event that triggered the Lambda
+        :returns: NumberStore with all prime numbers found
+        """
+        offset = None if self.progress is None else self.progress.offset
+        if offset is None:
+            return self._classify(numbers, self.deadline)
+
+        # An earlier delivery published results of its first offset numbers, they
+        # are classified whatever the deadline so the results are rebuilt the same
+        if isinstance(numbers, list):
+            self._classify(numbers[:offset], None)
+            rest = numbers[offset:]
+        else:
+            self._classify(list(islice(numbers, offset)), None)
+            rest = numbers.rest() if isinstance(numbers, NumbersStream) else []
+        if rest:
+            self.remainder = {"Numbers": rest}
+        return self.prime_numbers
+
+    def _classify(self, numbers, deadline):
+        started = time.perf_counter()
+        classified = 0
+        for block, verdicts in self._iter_blocks(numbers, deadline):
+            if verdicts is None:
+                # The block expired on the pool, it's left with the rest
+                rest = self._unclassified(numbers, classified, block)
+                if rest is not None:
+                    self.remainder = {"Numbers": rest}
+                    break
+                verdicts = list(map(self.engine.is_prime, block))
+            self.prime_numbers.extend(compress(block, verdicts))
+            if self.keep_non_primes:
+                self.non_prime_numbers.extend(
+                    compress(block, [not verdict for verdict in verdicts])
+                )
+            classified += len(block)
+            if deadline is not None:
+                rest = self._unclassified(numbers, classified)
+                if rest is not None:
+                    self.remainder = {"Numbers": rest}
+                    break
+
+        self.classified = classified
+        if self.progress is not None:
+            self.progress.set_offset(classified)
+        self.metrics.add("classify", (time.perf_counter() - started) * 1000, classified)
+        return self.prime_numbers
+
+    def publish(self, primes=None, extra_attributes=None):
+        """Enqueues the prime numbers found to the SQS_PRIMES_TARGET queue
+        :param primes: primes to be sent, defaults to prime_numbers
+        :param extra_attributes: message attributes added to every message
+        :returns: True if every message was sent, or buffered when output is set
+        """
+        messages = result_codec.encode_messages(
+            self.prime_numbers if primes is None else primes,
+            keep_empty=bool(self.attributes),
+        )
+        for _, attributes in messages:
+            attributes.update(self.attributes or {})
+            attributes.update(extra_attributes or {})
+        first_index = self.published_count
+        self.published_count += len(messages)
+        if self.output is not None:
+            for index, (body, attributes) in enumerate(messages, first_index):
+                if self.progress is not None and self.progress.is_published(index):
+                    continue
+                on_sent = None
+                if self.progress is not None:
+                    on_sent = partial(self.progress.mark_published, index)
+                self.output.add(body, attributes, on_sent)
+            return True
+
+        queue_url = os.environ["SQS_PRIMES_TARGET"]
+        responses = []
+        with self.metrics.timer("send", len(messages)):
+            for index, (body, attributes) in enumerate(messages, first_index):
+                if self.progress is not None and self.progress.is_published(index):
+                    # Sent by an earlier delivery of the same message
+                    continue
+                response = AWSUtils.send_sqs_message(queue_url, body, attributes)
+                if response and self.progress is not None:
+                    self.progress.mark_published(index)
+                responses.append(response)
+        if all(responses):
+            print("Prime numbers sent to the target SQS!")
+            return True
+        return False
+
+    def get_prime_numbers(self, numbers: list, publish=True):
         """Processes the given numbers and enqueues the primes found to an SQS
         :param numbers: List of numbers provided by the SQS event that triggered the Lambda
+        :param publish: if False the primes are only classified, publish() sends them later
         :returns: List with all prime numbers found
         """
-        for number in numbers:
-            if sympy.isprime(number):
-                self.prime_numbers.append(number)
-            else:
-                self.non_prime_numbers.append(number)
-
-        if self.prime_numbers:
-            queue_url = os.environ["SQS_PRIMES_TARGET"]
-            attributes = {
-                "NumberOfPrimes": {
-                    "DataType": "Number",
-                    "StringValue": f"{len(self.prime_numbers)}",
-                }
-            }
-            response = AWSUtils.send_sqs_message(
-                queue_url, str(self.prime_numbers), attributes
-            )
-            if response:
-                print("Prime numbers sent to the target SQS!")
+        self.classify(numbers)
+        if publish and self.prime_numbers:
+            self.publish()
 
         return self.prime_numbers
+
+    def get_primes_in_range(self, start, end):
+        """Streams the primes in [start, end] to the SQS_PRIMES_TARGET queue,
+        flushing every RANGE_FLUSH_SIZE primes so memory doesn't grow with the range.
+        The deadline is checked after every sieve segment, once it expires the
+        primes found are published and the range left is kept in remainder
+        :param start: lower bound of the Range message, inclusive
+        :param end: upper bound of the Range message, inclusive
+        :returns: Amount of prime numbers found
+        """
+        flush_size = int(os.environ.get(RANGE_FLUSH_SIZE_ENV, DEFAULT_RANGE_FLUSH_SIZE))
+        attributes = {
+            "RangeStart": {"DataType": "Number", "StringValue": f"{start}"},
+            "RangeEnd": {"DataType": "Number", "StringValue": f"{end}"},
+        }
+        found = 0
+        chunk = []
+        started = time.perf_counter()
+        for last, primes in sieve.sieve_segments(start, end):
+            chunk.extend(primes)
+            while len(chunk) >= flush_size:
+                self.publish(chunk[:flush_size], attributes)
+                found += flush_size
+                del chunk[:flush_size]
+            # Checked after every segment, a flush may take many of them
+            if last < end and self.deadline is not None and self.deadline.expired():
+                self.remainder = {"Range": [last + 1, end]}
+                break
+        if chunk:
+            self.publish(chunk, attributes)
+            found += len(chunk)
+
+        self.metrics.add("sieve", (time.perf_counter() - started) * 1000, found)
+        return found
@@ -0,0 +1,191 @@
+"""Encoders/decoders of the prime lists published to SQS_PRIMES_TARGET.
+
+Every published message carries a ResultCodec message attribute naming the
+codec its body was encoded with, consumers should use decode_message to read it.
+"""
+
+import base64
+import json
+import os
+
+RESULT_CODEC_ENV = "RESULT_CODEC"
+CODEC_ATTRIBUTE = "ResultCodec"
+
+# SQS message limit, a slice is kept for the message attributes
+MAX_MESSAGE_BYTES = 256 * 1024
+ATTRIBUTES_RESERVE = 1024
+MAX_BODY_BYTES = MAX_MESSAGE_BYTES - ATTRIBUTES_RESERVE
+
+
+def _varint_size(value):
+    size = 1
+    while value > 0x7F:
+        value >>= 7
+        size += 1
+    return size
+
+
+class JsonCodec:
+    """Plain JSON array, e.g. [2, 3, 5]"""
+
+    name = "json"
+
+    @staticmethod
+    def encode(primes):
+        return json.dumps(list(primes))
+
+    @staticmethod
+    def decode(body):
+        return json.loads(body)
+
+    @staticmethod
+    def split(primes, max_bytes=MAX_BODY_BYTES):
+        """Splits the primes into lists whose encoded body fits in max_bytes"""
+        chunks = []
+        chunk = []
+        size = 2  # brackets
+        for prime in primes:
+            item_size = len(str(prime)) + (2 if chunk else 0)  # ", " separator
+            if chunk and size + item_size > max_bytes:
+                chunks.append(chunk)
+                chunk = []
+                size = 2
+                item_size -= 2
+            chunk.append(prime)
+            size += item_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+class VarintCodec:
+    """Sorted primes as base64 wrapped LEB128 varints of the deltas between them"""
+
+    name = "varint"
+
+    @staticmethod
+    def encode(primes):
+        encoded = bytearray()
+        previous = 0
+        for prime in sorted(primes):
+            delta = prime - previous
+            previous = prime
+            while delta > 0x7F:
+                encoded.append((delta & 0x7F) | 0x80)
+                delta >>= 7
+            encoded.append(delta)
+        return base64.b64encode(bytes(encoded)).decode("ascii")
+
+    @staticmethod
+    def decode(body):
+        primes = []
+        previous = 0
+        delta = 0
+        shift = 0
+        for byte in base64.b64decode(body):
+            delta |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            previous += delta
+            primes.append(previous)
+            delta = 0
+            shift = 0
+        if shift:
+            raise ValueError("Truncated varint in result body")
+        return primes
+
+    @staticmethod
+    def split(primes, max_bytes=MAX_BODY_BYTES):
+        """Splits the sorted primes into lists whose encoded body fits in max_bytes"""
+        max_raw = max_bytes // 4 * 3  # base64 expands every 3 bytes into 4
+        chunks = []
+        chunk = []
+        size = 0
+        previous = 0
+        for prime in sorted(primes):
+            item_size = _varint_size(prime - previous)
+            if chunk and size + item_size > max_raw:
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+                item_size = _varint_size(prime)
+            chunk.append(prime)
+            size += item_size
+            previous = prime
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+CODECS = {JsonCodec.name: JsonCodec, VarintCodec.name: VarintCodec}
+DEFAULT_CODEC = JsonCodec.name
+
+
+def get_codec(name=None):
+    """Returns the result codec
+    :param name: codec name, defaults to the RESULT_CODEC environment variable
+    :returns: codec class exposing encode, decode and split
+    """
+    name = (name or os.environ.get(RESULT_CODEC_ENV) or DEFAULT_CODEC).lower()
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown result codec: {name}. Available: {', '.join(CODECS)}"
+        ) from None
+
+
+def encode_messages(primes, codec=None, max_bytes=MAX_BODY_BYTES, keep_empty=False):
+    """Encodes the primes into as many message bodies as the size limit requires
+    :param primes: prime numbers to be published
+    :param codec: codec name, defaults to the RESULT_CODEC environment variable
+    :param max_bytes: maximum size of each body
+    :param keep_empty: returns a single empty result instead of no message when
+        there are no primes
+    :returns: List of (body, attributes) tuples ready to be sent
+    """
+    codec = get_codec(codec)
+    chunks = codec.split(primes, max_bytes)
+    if not chunks and keep_empty:
+        # SQS rejects the empty varint body, "[]" is decoded by the json codec
+        codec = JsonCodec
+        chunks = [[]]
+    messages = []
+    for index, chunk in enumerate(chunks):
+        attributes = {
+            "NumberOfPrimes": {"DataType": "Number", "StringValue": f"{len(chunk)}"},
+            CODEC_ATTRIBUTE: {"DataType": "String", "StringValue": codec.name},
+        }
+        if len(chunks) > 1:
+            attributes["ChunkIndex"] = {"DataType": "Number", "StringValue": f"{index}"}
+            attributes["ChunkCount"] = {
+                "DataType": "Number",
+                "StringValue": f"{len(chunks)}",
+            }
+        messages.append((codec.encode(chunk), attributes))
+    return messages
+
+
+def decode(body, codec=None):
+    """Decodes a result body
+    :param body: message body
+    :param codec: name of the codec the body was encoded with
+    :returns: List with the prime numbers
+    """
+    return get_codec(codec or DEFAULT_CODEC).decode(body)
+
+
+def decode_message(message):
+    """Decodes a message received from SQS_PRIMES_TARGET, works with both the
+    receive_message and the Lambda event record shapes
+    :param message: SQS message
+    :returns: List with the prime numbers
+    """
+    body = message.get("Body", message.get("body"))
+    attributes = message.get("MessageAttributes", message.get("messageAttributes"))
+    attribute = (attributes or {}).get(CODEC_ATTRIBUTE) or {}
+    codec = attribute.get("StringValue", attribute.get("stringValue"))
+    # Messages without the attribute were published before the codecs existed,
+    # their python list repr is valid JSON
+    return decode(body, codec)
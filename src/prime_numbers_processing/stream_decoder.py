@@ -0,0 +1,141 @@
+"""Incremental decoding of large feed message bodies.
+
+json.loads builds the whole Numbers list before classification starts, which
+for a body close to 256 KB means tens of thousands of ints held at once. For
+bodies of STREAM_DECODE_MIN_BYTES or more, whose Numbers array comes first, the
+array is decoded in chunks cut at commas, each one handed to json.loads, so only
+a chunk of ints is alive at a time and the parsing still runs in C. Arrays
+holding strings or nested arrays, which a comma may not separate, are left to
+json.loads, their elements are invalid numbers anyway.
+
+The elements are the objects json.loads would have produced, so the validation
+errors of the classification are unchanged. Anything the chunked parse can't
+handle is decoded again with json.loads(body), which raises the exact error of
+a malformed body.
+"""
+
+import json
+import os
+import re
+from itertools import chain
+
+STREAM_DECODE_MIN_BYTES_ENV = "STREAM_DECODE_MIN_BYTES"
+DEFAULT_STREAM_DECODE_MIN_BYTES = 64 * 1024
+# Characters decoded per chunk, about 1500 64-bit numbers
+CHUNK_CHARS = 1 << 15
+# Closing brackets tried from the end of the body when looking for the one of
+# the Numbers array, the members after it rarely hold more than a Range pair
+MAX_END_CANDIDATES = 8
+
+_NUMBERS_PREFIX = re.compile(r'\s*\{\s*"Numbers"\s*:\s*\[\s*')
+
+
+class NumbersStream:
+    """Lazily decoded Numbers array. It is its own iterator: elements pulled by
+    one consumer are gone for the next one, and rest() returns what's left
+    :param body: message body
+    :param start: index of the first character after the opening bracket
+    :param end: index of the closing bracket
+    """
+
+    def __init__(self, body, start, end, chunk_chars=CHUNK_CHARS):
+        self.body = body
+        self.start = start
+        self.end = end
+        self.chunk_chars = chunk_chars
+        self._elements = chain.from_iterable(self._chunks())
+
+    def __bool__(self):
+        return self.start < self.end
+
+    def __iter__(self):
+        return self._elements
+
+    def __next__(self):
+        return next(self._elements)
+
+    def rest(self):
+        """Decodes the elements that weren't consumed yet
+        :returns: List with the remaining elements
+        """
+        return list(self._elements)
+
+    def _chunks(self):
+        body = self.body
+        position = self.start
+        decoded = 0
+        while position < self.end:
+            cut = body.find(",", position + self.chunk_chars, self.end)
+            if cut == -1:
+                cut = self.end
+            try:
+                chunk = json.loads(f"[{body[position:cut]}]")
+            except ValueError:
+                break
+            if not chunk:
+                break
+            decoded += len(chunk)
+            position = cut + 1
+            yield chunk
+        else:
+            return
+        # Malformed body, json.loads(body) raises its exact error
+        yield json.loads(body)["Numbers"][decoded:]
+
+
+def _flat(body, start, end):
+    """Whether body[start:end] holds no bracket nor string. Then a comma always
+    separates two elements, and a closing bracket before end means the array
+    was closed earlier, e.g. the candidate end belongs to a Range member after it
+    """
+    return all(body.find(c, start, end) == -1 for c in '[]"')
+
+
+def _split_members(body, start):
+    """Finds the end of the Numbers array and decodes the members after it
+    :param start: index of the first character after the opening bracket
+    :returns: tuple with the index of the closing bracket and the dict of the
+        other members, or None if no candidate fits
+    """
+    end = len(body)
+    for _ in range(MAX_END_CANDIDATES):
+        end = body.rfind("]", start, end)
+        if end == -1:
+            return None
+        if not _flat(body, start, end):
+            continue
+        tail = body[end + 1 :].strip()
+        if tail == "}":
+            return end, {}
+        if tail.startswith(","):
+            try:
+                members = json.loads("{" + tail[1:])
+            except ValueError:
+                continue
+            if isinstance(members, dict):
+                return end, members
+    return None
+
+
+def decode(body, stream=True, min_bytes=None):
+    """Decodes a feed message body
+    :param body: message body
+    :param stream: whether large bodies may be streamed
+    :param min_bytes: smallest body streamed, defaults to STREAM_DECODE_MIN_BYTES
+    :returns: dict of the message, its Numbers being a NumbersStream when the
+        body was streamed
+    """
+    if min_bytes is None:
+        min_bytes = int(
+            os.environ.get(STREAM_DECODE_MIN_BYTES_ENV, DEFAULT_STREAM_DECODE_MIN_BYTES)
+        )
+    if not stream or len(body) < min_bytes:
+        return json.loads(body)
+    match = _NUMBERS_PREFIX.match(body)
+    split = _split_members(body, match.end()) if match is not None else None
+    if split is None or "Numbers" in split[1]:
+        # Other layouts, duplicated keys and malformed bodies
+        return json.loads(body)
+    end, members = split
+    members["Numbers"] = NumbersStream(body, match.end(), end)
+    return members
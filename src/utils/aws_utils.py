@@ -1,60 +1,270 @@
+import os
+import threading
+import time
 import uuid
 
-import boto3
-from botocore.exceptions import ClientError
+from src.utils.send_guard import get_guard
+
+DEFAULT_REGION = "us-east-2"
+
+# SendMessageBatch limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+# SQS clients are cached per (region, endpoint) at module level so the HTTP
+# connection pool survives across calls and warm Lambda invocations.
+_sqs_clients = {}
+_sqs_clients_lock = threading.Lock()
+
+
+def _client_error():
+    """boto3 and botocore are imported on first use to keep cold starts short,
+    so ClientError is only resolved once an exception has to be matched
+    """
+    from botocore.exceptions import ClientError
+
+    return ClientError
+
+
+def sqs_message_size(body, attributes=None):
+    """Computes the size SQS accounts for a message
+    :param body: body of the message
+    :param attributes: message attributes of the message
+    :returns: size in bytes of the body plus the attribute names, types and values
+    """
+    size = len(body.encode("utf-8"))
+    for name, attribute in (attributes or {}).items():
+        size += len(name.encode("utf-8"))
+        size += len(attribute.get("DataType", "").encode("utf-8"))
+        if "StringValue" in attribute:
+            size += len(attribute["StringValue"].encode("utf-8"))
+        if "BinaryValue" in attribute:
+            size += len(attribute["BinaryValue"])
+    return size
+
+
+class BatchSendResult:
+    """Outcome of a batch send
+    successful holds the ids SQS accepted and failed the SQS failure entries
+    (Id, Code, Message and SenderFault) of the ones it didn't
+    """
+
+    def __init__(self):
+        self.successful = []
+        self.failed = []
+
+    @property
+    def failed_ids(self):
+        return [failure["Id"] for failure in self.failed]
+
+    def __bool__(self):
+        return not self.failed
 
 
 class AWSUtils:
     @staticmethod
-    def send_sqs_message(queue_url, body, attributes: dict, region="us-east-2"):
-        """Sends a single message to the provided SQS url
+    def sqs_client_config():
+        """Builds the botocore config used by the cached SQS clients
+        Pool size and timeouts can be tuned through the SQS_MAX_POOL_CONNECTIONS,
+        SQS_CONNECT_TIMEOUT and SQS_READ_TIMEOUT environment variables
+        :returns: botocore Config with keep-alive enabled and a single attempt per
+            call, the send guard does the retries
+        """
+        from botocore.config import Config
+
+        return Config(
+            max_pool_connections=int(os.environ.get("SQS_MAX_POOL_CONNECTIONS", 10)),
+            connect_timeout=float(os.environ.get("SQS_CONNECT_TIMEOUT", 2)),
+            read_timeout=float(os.environ.get("SQS_READ_TIMEOUT", 5)),
+            tcp_keepalive=True,
+            retries={"mode": "standard", "max_attempts": 1},
+        )
+
+    @staticmethod
+    def get_sqs_client(region=DEFAULT_REGION, endpoint_url=None):
+        """Returns the cached SQS client for the region/endpoint, creating it once
+        :param region: aws region of the client
+        :param endpoint_url: custom endpoint, defaults to SQS_ENDPOINT_URL if set
+        :returns: boto3 SQS client
+        """
+        key = (region, endpoint_url or os.environ.get("SQS_ENDPOINT_URL"))
+        client = _sqs_clients.get(key)
+        if client is not None:
+            return client
+
+        import boto3
+
+        with _sqs_clients_lock:
+            client = _sqs_clients.get(key)
+            if client is None:
+                kwargs = {"region_name": region, "config": AWSUtils.sqs_client_config()}
+                if key[1]:
+                    kwargs["endpoint_url"] = key[1]
+                client = boto3.client("sqs", **kwargs)
+                _sqs_clients[key] = client
+        return client
+
+    @staticmethod
+    def set_sqs_client(client, region=DEFAULT_REGION, endpoint_url=None):
+        """Injects a client into the cache, mainly meant to be used by tests
+        :param client: client object exposing the SQS API used by AWSUtils
+        :param region: aws region the client is registered for
+        :param endpoint_url: custom endpoint the client is registered for
+        """
+        key = (region, endpoint_url or os.environ.get("SQS_ENDPOINT_URL"))
+        with _sqs_clients_lock:
+            _sqs_clients[key] = client
+
+    @staticmethod
+    def clear_sqs_clients():
+        """Drops every cached SQS client"""
+        with _sqs_clients_lock:
+            _sqs_clients.clear()
+
+    @staticmethod
+    def send_sqs_message(queue_url, body, attributes: dict, region=DEFAULT_REGION):
+        """Sends a single message to the provided SQS url, rate limited and retried
+        on throttling and 5xx errors by the queue's send guard
         :param queue_url: aws address of the target SQS
         :param body: body of the message to be sent
         :param attributes: attributes of the given message
         :returns: True(200) if message was successfully sent, else raises an Exception
         """
         try:
-            queue_client = boto3.client("sqs", region_name=region)
+            queue_client = AWSUtils.get_sqs_client(region)
 
-            response = queue_client.send_message(
+            response = get_guard(queue_url).call(
+                queue_client.send_message,
                 QueueUrl=queue_url,
                 DelaySeconds=10,
                 MessageAttributes=attributes,
                 MessageBody=body,
             )
             return response["ResponseMetadata"]["HTTPStatusCode"]
-        except ClientError as e:
+        except _client_error() as e:
             print(f"ClientError while sending sqs message to {queue_url}: {e}")
             raise e
 
+    @staticmethod
+    def chunk_batch_entries(entries):
+        """Splits batch entries into chunks that respect the SQS request limits
+        :param entries: SendMessageBatch entries
+        :returns: List of chunks with at most 10 entries and 256 KB each
+        """
+        chunks = []
+        chunk = []
+        chunk_size = 0
+        for entry in entries:
+            entry_size = sqs_message_size(
+                entry["MessageBody"], entry.get("MessageAttributes")
+            )
+            if chunk and (
+                len(chunk) == MAX_BATCH_ENTRIES
+                or chunk_size + entry_size > MAX_BATCH_BYTES
+            ):
+                chunks.append(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(entry)
+            chunk_size += entry_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _send_batch_chunk(queue_client, queue_url, entries, max_retries, base_delay):
+        """Sends a chunk and retries the entries SQS failed on its side
+        :returns: BatchSendResult for the chunk
+        """
+        result = BatchSendResult()
+        for attempt in range(max_retries + 1):
+            response = get_guard(queue_url).call(
+                queue_client.send_message_batch,
+                tokens=len(entries),
+                QueueUrl=queue_url,
+                Entries=entries,
+            )
+            failed = {entry["Id"]: entry for entry in response.get("Failed", [])}
+            retry = []
+            for entry in entries:
+                failure = failed.get(entry["Id"])
+                if failure is None:
+                    result.successful.append(entry["Id"])
+                elif failure.get("SenderFault") or attempt == max_retries:
+                    result.failed.append(failure)
+                else:
+                    retry.append(entry)
+            if not retry:
+                break
+            entries = retry
+            time.sleep(base_delay * 2**attempt)
+        return result
+
     @staticmethod
     def send_batch_sqs_messages(
-        queue_url, bodies, attributes: dict, region="us-east-2"
+        queue_url, bodies, attributes: dict, region=DEFAULT_REGION, ids=None
     ):
-        """Sends a single message to the provided SQS url
+        """Sends messages to the provided SQS url, chunked by the SQS batch limits
+        and dispatched concurrently. Entries SQS fails on its side are retried
+        with exponential backoff.
         :param queue_url: aws address of the target SQS
         :param bodies: bodies of the messages to be sent
         :param attributes: attributes of the given messages
-        :returns: True(200) if message was successfully sent, else raises an Exception
+        :param ids: batch entry ids, random ones are generated if not provided
+        :returns: BatchSendResult with the successful and failed entry ids,
+            raises an Exception if a request is rejected
         """
         try:
-            queue_client = boto3.client("sqs", region_name=region)
+            queue_client = AWSUtils.get_sqs_client(region)
             messages = []
 
-            for body, attribute in zip(bodies, attributes):
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in bodies]
+            for entry_id, body, attribute in zip(ids, bodies, attributes):
                 messages.append(
                     {
-                        "Id": str(uuid.uuid4()),
+                        "Id": entry_id,
                         "MessageBody": body,
                         "MessageAttributes": attribute,
                     }
                 )
 
-            response = queue_client.send_message_batch(
-                QueueUrl=queue_url, Entries=messages
-            )
+            chunks = AWSUtils.chunk_batch_entries(messages)
+            max_retries = int(os.environ.get("SQS_BATCH_MAX_RETRIES", 3))
+            base_delay = float(os.environ.get("SQS_BATCH_RETRY_DELAY", 0.1))
+            workers = int(os.environ.get("SQS_BATCH_WORKERS", 4))
 
-            return response["ResponseMetadata"]["HTTPStatusCode"]
-        except ClientError as e:
+            result = BatchSendResult()
+            if not chunks:
+                return result
+            if len(chunks) == 1 or workers <= 1:
+                results = [
+                    AWSUtils._send_batch_chunk(
+                        queue_client, queue_url, chunk, max_retries, base_delay
+                    )
+                    for chunk in chunks
+                ]
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+
+                with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                    futures = [
+                        pool.submit(
+                            AWSUtils._send_batch_chunk,
+                            queue_client,
+                            queue_url,
+                            chunk,
+                            max_retries,
+                            base_delay,
+                        )
+                        for chunk in chunks
+                    ]
+                    results = [future.result() for future in futures]
+
+            for chunk_result in results:
+                result.successful.extend(chunk_result.successful)
+                result.failed.extend(chunk_result.failed)
+            return result
+        except _client_error() as e:
             print(f"ClientError while sending sqs message to {queue_url}: {e}")
             raise e
@@ -0,0 +1,33 @@
+import os
+
+DEADLINE_MARGIN_MS_ENV = "DEADLINE_MARGIN_MS"
+# Time kept to publish the partial results and enqueue the continuation
+DEFAULT_MARGIN_MS = 5000
+
+
+class Deadline:
+    """Tells when an invocation should stop starting new work
+    :param context: Lambda context, only get_remaining_time_in_millis is used
+    :param margin_ms: remaining time under which the deadline counts as reached
+    """
+
+    def __init__(self, context, margin_ms=DEFAULT_MARGIN_MS):
+        self.context = context
+        self.margin_ms = margin_ms
+
+    def remaining_ms(self):
+        return self.context.get_remaining_time_in_millis()
+
+    def expired(self):
+        return self.remaining_ms() <= self.margin_ms
+
+
+def from_context(context):
+    """Builds the deadline of an invocation
+    :param context: Lambda context, may be None outside of Lambda
+    :returns: Deadline, or None if the context can't tell the remaining time
+    """
+    if not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    margin_ms = int(os.environ.get(DEADLINE_MARGIN_MS_ENV, DEFAULT_MARGIN_MS))
+    return Deadline(context, margin_ms)
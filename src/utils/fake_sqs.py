@@ -0,0 +1,263 @@
+"""In-process stand-in for the boto3 SQS client, used by the tests and the
+benchmarks to exercise the whole flow offline.
+
+It can be injected with AWSUtils.set_sqs_client(FakeSQS()).
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+FAKE_ACCOUNT_URL = "https://sqs.us-east-2.amazonaws.com/000000000000"
+FAKE_ACCOUNT_ARN = "arn:aws:sqs:us-east-2:000000000000"
+
+
+def _ok(**fields):
+    fields["ResponseMetadata"] = {"HTTPStatusCode": 200}
+    return fields
+
+
+class FakeMessage:
+    def __init__(self, body, attributes, visible_at):
+        self.message_id = str(uuid.uuid4())
+        self.body = body
+        self.attributes = attributes or {}
+        self.md5 = hashlib.md5(body.encode("utf-8")).hexdigest()
+        self.visible_at = visible_at
+        self.receive_count = 0
+        self.receipt_handle = None
+
+
+class FakeQueue:
+    def __init__(self, name, attributes):
+        self.url = f"{FAKE_ACCOUNT_URL}/{name}"
+        self.arn = f"{FAKE_ACCOUNT_ARN}:{name}"
+        self.visibility_timeout = int(attributes.get("VisibilityTimeout", 30))
+        redrive_policy = json.loads(attributes.get("RedrivePolicy", "{}"))
+        dlq_arn = redrive_policy.get("deadLetterTargetArn")
+        self.dlq_url = (
+            f"{FAKE_ACCOUNT_URL}/{dlq_arn.rsplit(':', 1)[-1]}" if dlq_arn else None
+        )
+        self.max_receive_count = int(redrive_policy.get("maxReceiveCount", 0))
+        # Insertion ordered, keyed by message id
+        self.messages = {}
+        self.receipts = {}
+        self.sent = 0
+        self.deleted = 0
+
+
+class FakeSQS:
+    """Fake SQS client supporting send, batch send, receive, delete, visibility
+    timeouts, redrive to a DLQ, latency and fault injection
+    :param latency: seconds slept on every API call to simulate the network
+    :param clock: time source, can be replaced to control visibility timeouts
+    """
+
+    def __init__(self, latency=0.0, clock=time.monotonic):
+        self.latency = latency
+        self.clock = clock
+        self.queues = {}
+        self.calls = {}
+        self.faults = {}
+        self._lock = threading.Lock()
+        self._message_sent = threading.Condition(self._lock)
+
+    def create_queue(self, QueueName, Attributes=None):
+        """Creates a queue, VisibilityTimeout and RedrivePolicy attributes are honored"""
+        queue = FakeQueue(QueueName, Attributes or {})
+        with self._lock:
+            self.queues.setdefault(queue.url, queue)
+        return _ok(QueueUrl=queue.url)
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        with self._lock:
+            queue = self._queue(QueueUrl)
+            return _ok(
+                Attributes={
+                    "QueueArn": queue.arn,
+                    "ApproximateNumberOfMessages": str(len(queue.messages)),
+                }
+            )
+
+    def inject_fault(self, operation, code="ThrottlingException", status=400, times=1):
+        """Makes the next calls of an operation raise a ClientError
+        :param operation: client method name, e.g. send_message
+        :param code: error code of the response
+        :param status: HTTP status code of the response
+        :param times: amount of calls that fail
+        """
+        with self._lock:
+            self.faults.setdefault(operation, []).extend([(code, status)] * times)
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            faults = self.faults.get(operation)
+            fault = faults.pop(0) if faults else None
+        if self.latency:
+            time.sleep(self.latency)
+        if fault is not None:
+            from botocore.exceptions import ClientError
+
+            code, status = fault
+            error = {"Error": {"Code": code, "Message": "Injected fault"}}
+            error["ResponseMetadata"] = {"HTTPStatusCode": status}
+            raise ClientError(error, operation)
+
+    def _queue(self, url):
+        try:
+            return self.queues[url]
+        except KeyError:
+            raise ValueError(f"Queue {url} does not exist") from None
+
+    def _enqueue(self, url, body, attributes, delay):
+        queue = self._queue(url)
+        message = FakeMessage(body, attributes, self.clock() + delay)
+        queue.messages[message.message_id] = message
+        queue.sent += 1
+        self._message_sent.notify_all()
+        return message
+
+    def send_message(
+        self, QueueUrl, MessageBody, MessageAttributes=None, DelaySeconds=0
+    ):
+        self._call("send_message")
+        with self._lock:
+            message = self._enqueue(
+                QueueUrl, MessageBody, MessageAttributes, DelaySeconds
+            )
+        return _ok(MessageId=message.message_id, MD5OfMessageBody=message.md5)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._call("send_message_batch")
+        successful = []
+        with self._lock:
+            for entry in Entries:
+                message = self._enqueue(
+                    QueueUrl,
+                    entry["MessageBody"],
+                    entry.get("MessageAttributes"),
+                    entry.get("DelaySeconds", 0),
+                )
+                successful.append(
+                    {
+                        "Id": entry["Id"],
+                        "MessageId": message.message_id,
+                        "MD5OfMessageBody": message.md5,
+                    }
+                )
+        return _ok(Successful=successful, Failed=[])
+
+    def _receive_visible(self, queue, max_messages, visibility_timeout):
+        now = self.clock()
+        received = []
+        for message in list(queue.messages.values()):
+            if len(received) == max_messages:
+                break
+            if message.visible_at > now:
+                continue
+            if queue.dlq_url and message.receive_count >= queue.max_receive_count:
+                del queue.messages[message.message_id]
+                queue.receipts.pop(message.receipt_handle, None)
+                self._queue(queue.dlq_url).messages[message.message_id] = message
+                message.receive_count = 0
+                continue
+            queue.receipts.pop(message.receipt_handle, None)
+            message.receive_count += 1
+            message.visible_at = now + visibility_timeout
+            message.receipt_handle = str(uuid.uuid4())
+            queue.receipts[message.receipt_handle] = message
+            received.append(
+                {
+                    "MessageId": message.message_id,
+                    "ReceiptHandle": message.receipt_handle,
+                    "MD5OfBody": message.md5,
+                    "Body": message.body,
+                    "Attributes": {
+                        "ApproximateReceiveCount": str(message.receive_count)
+                    },
+                    "MessageAttributes": message.attributes,
+                }
+            )
+        return received
+
+    def receive_message(
+        self,
+        QueueUrl,
+        MaxNumberOfMessages=1,
+        WaitTimeSeconds=0,
+        VisibilityTimeout=None,
+        **kwargs,
+    ):
+        self._call("receive_message")
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._lock:
+            queue = self._queue(QueueUrl)
+            if VisibilityTimeout is None:
+                VisibilityTimeout = queue.visibility_timeout
+            while True:
+                received = self._receive_visible(
+                    queue, MaxNumberOfMessages, VisibilityTimeout
+                )
+                remaining = deadline - time.monotonic()
+                if received or remaining <= 0:
+                    break
+                self._message_sent.wait(min(remaining, 0.05))
+        response = _ok()
+        if received:
+            response["Messages"] = received
+        return response
+
+    def _pop(self, queue, receipt_handle):
+        message = queue.receipts.pop(receipt_handle, None)
+        if message is not None:
+            del queue.messages[message.message_id]
+            queue.deleted += 1
+        return message
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._call("delete_message")
+        with self._lock:
+            self._pop(self._queue(QueueUrl), ReceiptHandle)
+        return _ok()
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._call("delete_message_batch")
+        successful = []
+        failed = []
+        with self._lock:
+            queue = self._queue(QueueUrl)
+            for entry in Entries:
+                if self._pop(queue, entry["ReceiptHandle"]) is None:
+                    failed.append(
+                        {
+                            "Id": entry["Id"],
+                            "SenderFault": True,
+                            "Code": "ReceiptHandleIsInvalid",
+                        }
+                    )
+                    continue
+                successful.append({"Id": entry["Id"]})
+        return _ok(Successful=successful, Failed=failed)
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self._call("change_message_visibility")
+        with self._lock:
+            message = self._queue(QueueUrl).receipts.get(ReceiptHandle)
+            if message is None:
+                raise ValueError(f"Receipt handle {ReceiptHandle} is not valid")
+            message.visible_at = self.clock() + VisibilityTimeout
+        return _ok()
+
+    def messages(self, queue_url):
+        """Returns every message stored in the queue, visible or not
+        :param queue_url: url of the queue
+        :returns: List of dicts with the body and attributes of each message
+        """
+        with self._lock:
+            return [
+                {"Body": message.body, "MessageAttributes": message.attributes}
+                for message in self._queue(queue_url).messages.values()
+            ]
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+IDEMPOTENCY_BACKEND_ENV = "IDEMPOTENCY_BACKEND"
+IDEMPOTENCY_PATH_ENV = "IDEMPOTENCY_PATH"
+IDEMPOTENCY_TTL_ENV = "IDEMPOTENCY_TTL"
+IDEMPOTENCY_MAX_ENTRIES_ENV = "IDEMPOTENCY_MAX_ENTRIES"
+DEFAULT_BACKEND = "memory"
+DEFAULT_TTL = 900
+DEFAULT_MAX_ENTRIES = 10000
+# Seconds between two sweeps of the expired entries of the persistent stores
+PURGE_INTERVAL = 60
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def idempotency_key(record):
+    """Builds the key of an SQS record from its message id and body hash
+    :param record: SQS record delivered to the Lambda
+    :returns: key string
+    """
+    digest = hashlib.sha256(record["body"].encode("utf-8")).hexdigest()
+    return f"{record['messageId']}:{digest}"
+
+
+class MemoryIdempotencyStore:
+    """Keeps the entries in a dict, they survive across warm invocations. The
+    least recently used entries are evicted past IDEMPOTENCY_MAX_ENTRIES
+    """
+
+    name = "memory"
+
+    def __init__(self, path=None, max_entries=None):
+        if max_entries is None:
+            max_entries = int(
+                os.environ.get(IDEMPOTENCY_MAX_ENTRIES_ENV, DEFAULT_MAX_ENTRIES)
+            )
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            record, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(record)
+
+    def put(self, key, record, ttl):
+        with self._lock:
+            self._entries[key] = (dict(record), time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteIdempotencyStore:
+    """Keeps the entries in a SQLite database, e.g. under /tmp"""
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        import sqlite3
+
+        self._connection = sqlite3.connect(
+            path or "/tmp/idempotency.sqlite3", check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._purged_at = 0
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency "
+                "(key TEXT PRIMARY KEY, record TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idempotency_expires_at "
+                "ON idempotency (expires_at)"
+            )
+
+    def get(self, key):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT record FROM idempotency WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, record, ttl):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?)",
+                (key, json.dumps(record), now + ttl),
+            )
+            if now - self._purged_at >= PURGE_INTERVAL:
+                self._purged_at = now
+                self._connection.execute(
+                    "DELETE FROM idempotency WHERE expires_at <= ?", (now,)
+                )
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+
+
+class FileIdempotencyStore:
+    """Keeps one JSON file per entry in a directory"""
+
+    name = "file"
+
+    def __init__(self, path=None):
+        self.directory = path or "/tmp/idempotency"
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._purged_at = 0
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path) as entry_file:
+                    entry = json.load(entry_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            if entry["expires_at"] <= time.time():
+                os.remove(path)
+                return None
+        return entry["record"]
+
+    def put(self, key, record, ttl):
+        path = self._path(key)
+        temporary_path = f"{path}.tmp"
+        with self._lock:
+            with open(temporary_path, "w") as entry_file:
+                json.dump(
+                    {"record": record, "expires_at": time.time() + ttl}, entry_file
+                )
+            os.replace(temporary_path, path)
+            now = time.time()
+            if now - self._purged_at >= PURGE_INTERVAL:
+                self._purged_at = now
+                self._purge(now)
+
+    def _purge(self, now):
+        """Removes the expired entries, including the ones never read again"""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path) as entry_file:
+                        expired = json.load(entry_file)["expires_at"] <= now
+                    if expired:
+                        os.remove(entry.path)
+                except (OSError, ValueError, KeyError):
+                    continue
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+BACKENDS = {
+    MemoryIdempotencyStore.name: MemoryIdempotencyStore,
+    SQLiteIdempotencyStore.name: SQLiteIdempotencyStore,
+    FileIdempotencyStore.name: FileIdempotencyStore,
+}
+
+
+class MessageProgress:
+    """Idempotency state of a single message: whether it was completed, which
+    of its result messages were already published and how many of its numbers
+    they cover
+    """
+
+    def __init__(self, store, key, ttl=DEFAULT_TTL):
+        self.store = store
+        self.key = key
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._record = store.get(key) or {"status": IN_PROGRESS, "published": []}
+        self._published = set(self._record["published"])
+
+    @property
+    def completed(self):
+        return self._record["status"] == COMPLETED
+
+    @property
+    def result(self):
+        return self._record.get("result")
+
+    @property
+    def offset(self):
+        """Amount of numbers the published results cover, None until set"""
+        return self._record.get("offset")
+
+    def set_offset(self, offset):
+        """Records how many numbers were classified. It's saved with the first
+        published result, redeliveries classify exactly that many numbers so
+        the results keep their indexes whatever the deadline allows
+        """
+        with self._lock:
+            if self._record.get("offset") is None:
+                self._record["offset"] = offset
+
+    def is_published(self, index):
+        return index in self._published
+
+    def mark_published(self, index):
+        """Records that the result message with the given index was sent"""
+        with self._lock:
+            self._published.add(index)
+            self._record["published"] = sorted(self._published)
+            self.store.put(self.key, self._record, self.ttl)
+
+    def complete(self, result=None):
+        """Marks the message as done, redeliveries will skip it until the TTL expires
+        :param result: JSON serializable summary kept with the entry
+        """
+        with self._lock:
+            self._record = {"status": COMPLETED, "published": [], "result": result}
+            self.store.put(self.key, self._record, self.ttl)
+
+
+_store = None
+
+
+def get_store():
+    """Returns the process-wide idempotency store
+    :returns: store selected by IDEMPOTENCY_BACKEND, or None if it's set to none
+    """
+    global _store
+    backend = os.environ.get(IDEMPOTENCY_BACKEND_ENV, DEFAULT_BACKEND).lower()
+    if backend == "none":
+        return None
+    if _store is None or _store.name != backend:
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown idempotency backend: {backend}. "
+                f"Available: none, {', '.join(BACKENDS)}"
+            )
+        _store = BACKENDS[backend](os.environ.get(IDEMPOTENCY_PATH_ENV))
+    return _store
+
+
+def reset_store():
+    """Drops the process-wide store"""
+    global _store
+    _store = None
+
+
+def track(record):
+    """Loads the idempotency state of an SQS record
+    :param record: SQS record delivered to the Lambda
+    :returns: MessageProgress, or None when idempotency is disabled
+    """
+    store = get_store()
+    if store is None:
+        return None
+    ttl = int(os.environ.get(IDEMPOTENCY_TTL_ENV, DEFAULT_TTL))
+    return MessageProgress(store, idempotency_key(record), ttl)
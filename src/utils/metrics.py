@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_ENABLED_ENV = "METRICS_ENABLED"
+METRICS_NAMESPACE_ENV = "METRICS_NAMESPACE"
+PAYLOAD_LOG_SAMPLE_RATE_ENV = "PAYLOAD_LOG_SAMPLE_RATE"
+DEFAULT_NAMESPACE = "PrimeNumberProcessing"
+
+_NULL_TIMER = nullcontext()
+
+
+class Metrics:
+    """Accumulates duration and count per processing stage and emits them as
+    CloudWatch Embedded Metric Format log lines
+    """
+
+    enabled = True
+
+    def __init__(self, namespace=DEFAULT_NAMESPACE):
+        self.namespace = namespace
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, duration_ms, count=1):
+        """Records a stage execution
+        :param stage: name of the stage, e.g. decode, classify or send
+        :param duration_ms: time spent in the stage
+        :param count: amount of items the stage handled
+        """
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0.0, 0])
+            totals[0] += duration_ms
+            totals[1] += count
+
+    @contextmanager
+    def timer(self, stage, count=1):
+        """Times the wrapped block as an execution of the given stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - started) * 1000, count)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: tuple(totals) for stage, totals in self._stages.items()}
+
+    def to_emf(self, dimensions=None):
+        """Builds the EMF document of the accumulated stages
+        :param dimensions: dict of dimension name to value
+        :returns: dict ready to be serialized, or None if nothing was recorded
+        """
+        stages = self.snapshot()
+        if not stages:
+            return None
+        dimensions = dimensions or {}
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(dimensions)],
+                        "Metrics": [],
+                    }
+                ],
+            },
+            **dimensions,
+        }
+        definitions = document["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+        for stage, (duration_ms, count) in stages.items():
+            name = stage.capitalize()
+            definitions.append({"Name": f"{name}Time", "Unit": "Milliseconds"})
+            definitions.append({"Name": f"{name}Count", "Unit": "Count"})
+            document[f"{name}Time"] = round(duration_ms, 3)
+            document[f"{name}Count"] = count
+        return document
+
+    def flush(self):
+        """Prints the EMF line of the accumulated stages and resets them"""
+        dimensions = {}
+        function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+        if function_name:
+            dimensions["FunctionName"] = function_name
+        document = self.to_emf(dimensions)
+        with self._lock:
+            self._stages.clear()
+        if document is not None:
+            print(json.dumps(document))
+
+
+class NullMetrics:
+    """No-op metrics, used when METRICS_ENABLED is off"""
+
+    enabled = False
+
+    def add(self, stage, duration_ms, count=1):
+        pass
+
+    def timer(self, stage, count=1):
+        return _NULL_TIMER
+
+    def snapshot(self):
+        return {}
+
+    def flush(self):
+        pass
+
+
+_metrics = None
+
+
+def get_metrics():
+    """Returns the process-wide metrics recorder
+    :returns: Metrics, or NullMetrics when disabled through METRICS_ENABLED
+    """
+    global _metrics
+    if _metrics is None:
+        if os.environ.get(METRICS_ENABLED_ENV, "true").lower() in ("0", "false"):
+            _metrics = NullMetrics()
+        else:
+            _metrics = Metrics(os.environ.get(METRICS_NAMESPACE_ENV, DEFAULT_NAMESPACE))
+    return _metrics
+
+
+def reset_metrics():
+    """Drops the process-wide recorder so the environment is read again"""
+    global _metrics
+    _metrics = None
+
+
+def log_payload(payload, sample_rate=None):
+    """Logs the payload for a sample of the invocations
+    :param payload: JSON serializable payload
+    :param sample_rate: fraction of payloads logged, defaults to PAYLOAD_LOG_SAMPLE_RATE
+    :returns: True if the payload was logged
+    """
+    if sample_rate is None:
+        sample_rate = float(os.environ.get(PAYLOAD_LOG_SAMPLE_RATE_ENV, 0))
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return False
+    print(json.dumps(payload, default=str))
+    return True
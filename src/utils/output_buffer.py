@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+from src.utils.aws_utils import (
+    MAX_BATCH_BYTES,
+    MAX_BATCH_ENTRIES,
+    AWSUtils,
+    sqs_message_size,
+)
+from src.utils.metrics import get_metrics
+
+OUTPUT_BUFFER_ENABLED_ENV = "OUTPUT_BUFFER_ENABLED"
+OUTPUT_BUFFER_MAX_ENTRIES_ENV = "OUTPUT_BUFFER_MAX_ENTRIES"
+OUTPUT_BUFFER_MAX_BYTES_ENV = "OUTPUT_BUFFER_MAX_BYTES"
+OUTPUT_BUFFER_MAX_AGE_ENV = "OUTPUT_BUFFER_MAX_AGE"
+DEFAULT_MAX_AGE = 1.0
+
+# Message attribute holding the id of the feed message a result came from
+SOURCE_ATTRIBUTE = "SourceMessageId"
+
+
+class SourceOutput:
+    """View of an OutputBuffer bound to a single source message"""
+
+    def __init__(self, buffer, source_id):
+        self.buffer = buffer
+        self.source_id = source_id
+
+    def add(self, body, attributes, on_sent=None):
+        self.buffer.add(body, attributes, self.source_id, on_sent)
+
+    def close(self, on_done=None):
+        self.buffer.close_source(self.source_id, on_done)
+
+
+class OutputBuffer:
+    """Collects result messages across records and sends them with
+    send_batch_sqs_messages once the entry count, the byte size or the age of
+    the buffer reaches its threshold. The age is checked whenever an entry is
+    added, flush() must be called before the handler returns.
+    :param queue_url: aws address of the target SQS
+    :param max_entries: entries that trigger a flush
+    :param max_bytes: buffered bytes that trigger a flush
+    :param max_age: seconds since the oldest buffered entry that trigger a flush
+    """
+
+    def __init__(
+        self,
+        queue_url,
+        max_entries=MAX_BATCH_ENTRIES,
+        max_bytes=MAX_BATCH_BYTES,
+        max_age=DEFAULT_MAX_AGE,
+        clock=time.monotonic,
+    ):
+        self.queue_url = queue_url
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        self.failed_sources = set()
+        self._entries = []
+        self._size = 0
+        self._oldest = None
+        self._pending = {}
+        self._on_done = {}
+        self._lock = threading.Lock()
+
+    def for_source(self, source_id):
+        return SourceOutput(self, source_id)
+
+    def _take(self):
+        entries = self._entries
+        self._entries = []
+        self._size = 0
+        self._oldest = None
+        return entries
+
+    def add(self, body, attributes, source_id, on_sent=None):
+        """Buffers a result message, flushing if a threshold is reached
+        :param body: body of the message
+        :param attributes: message attributes, the source id is added to them
+        :param source_id: message id of the record the result belongs to
+        :param on_sent: called once the message was accepted by SQS
+        """
+        attributes = {
+            **attributes,
+            SOURCE_ATTRIBUTE: {"DataType": "String", "StringValue": source_id},
+        }
+        size = sqs_message_size(body, attributes)
+        batches = []
+        with self._lock:
+            if self._entries and self._size + size > self.max_bytes:
+                batches.append(self._take())
+            self._entries.append((body, attributes, source_id, on_sent))
+            self._size += size
+            self._pending[source_id] = self._pending.get(source_id, 0) + 1
+            if self._oldest is None:
+                self._oldest = self.clock()
+            if (
+                len(self._entries) >= self.max_entries
+                or self._size >= self.max_bytes
+                or self.clock() - self._oldest >= self.max_age
+            ):
+                batches.append(self._take())
+        for entries in batches:
+            self._send(entries)
+
+    def close_source(self, source_id, on_done=None):
+        """Declares that a source won't add more results
+        :param source_id: message id of the record
+        :param on_done: called once every result of the source was sent
+        """
+        with self._lock:
+            if self._pending.get(source_id, 0):
+                if on_done is not None:
+                    self._on_done[source_id] = on_done
+                return
+            done = source_id not in self.failed_sources
+        if done and on_done is not None:
+            on_done()
+
+    def flush(self):
+        """Sends everything buffered
+        :returns: set with the source ids whose results couldn't be sent
+        """
+        with self._lock:
+            entries = self._take()
+        self._send(entries)
+        return self.failed_sources
+
+    def _send(self, entries):
+        if not entries:
+            return
+        ids = [str(index) for index in range(len(entries))]
+        try:
+            with get_metrics().timer("send", len(entries)):
+                result = AWSUtils.send_batch_sqs_messages(
+                    self.queue_url,
+                    [entry[0] for entry in entries],
+                    [entry[1] for entry in entries],
+                    ids=ids,
+                )
+            failed = set(result.failed_ids)
+        except Exception as e:
+            print(f"Could not send {len(entries)} buffered results: {e}")
+            failed = set(ids)
+
+        callbacks = []
+        with self._lock:
+            for entry_id, (_, _, source_id, on_sent) in zip(ids, entries):
+                if entry_id in failed:
+                    self.failed_sources.add(source_id)
+                elif on_sent is not None:
+                    callbacks.append(on_sent)
+                self._pending[source_id] -= 1
+            for _, _, source_id, _ in entries:
+                if self._pending[source_id] or source_id not in self._on_done:
+                    continue
+                on_done = self._on_done.pop(source_id)
+                if source_id not in self.failed_sources:
+                    callbacks.append(on_done)
+        for callback in callbacks:
+            callback()
+
+
+def create_buffer():
+    """Creates the output buffer of an invocation
+    :returns: OutputBuffer configured through the environment, or None if disabled
+    """
+    if os.environ.get(OUTPUT_BUFFER_ENABLED_ENV, "false").lower() not in ("1", "true"):
+        return None
+    return OutputBuffer(
+        os.environ["SQS_PRIMES_TARGET"],
+        max_entries=int(
+            os.environ.get(OUTPUT_BUFFER_MAX_ENTRIES_ENV, MAX_BATCH_ENTRIES)
+        ),
+        max_bytes=int(os.environ.get(OUTPUT_BUFFER_MAX_BYTES_ENV, MAX_BATCH_BYTES)),
+        max_age=float(os.environ.get(OUTPUT_BUFFER_MAX_AGE_ENV, DEFAULT_MAX_AGE)),
+    )
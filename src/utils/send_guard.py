@@ -0,0 +1,243 @@
+"""Outbound protection of the SQS sends: a token bucket rate limit per queue,
+exponential backoff with full jitter for throttling, 5xx, connection and
+timeout errors, and a circuit breaker that fails fast while a queue keeps
+failing. The SQS clients make a single attempt per call, retries are left to
+the guard so the two don't multiply.
+"""
+
+import os
+import random
+import threading
+import time
+
+from src.utils.metrics import get_metrics
+
+SQS_RATE_LIMIT_ENV = "SQS_RATE_LIMIT"
+SQS_RATE_BURST_ENV = "SQS_RATE_BURST"
+SQS_SEND_MAX_RETRIES_ENV = "SQS_SEND_MAX_RETRIES"
+SQS_SEND_BASE_DELAY_ENV = "SQS_SEND_BASE_DELAY"
+SQS_SEND_MAX_DELAY_ENV = "SQS_SEND_MAX_DELAY"
+SQS_BREAKER_FAILURES_ENV = "SQS_BREAKER_FAILURES"
+SQS_BREAKER_RESET_ENV = "SQS_BREAKER_RESET"
+
+THROTTLING_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "SlowDown",
+    "AWS.SimpleQueueService.RequestThrottled",
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a queue whose circuit breaker is open"""
+
+
+def is_retryable(error):
+    """Tells whether an error is worth retrying: throttling, a 5xx response, or
+    no response at all because of a connection error or a timeout
+    :param error: exception raised by the client, usually a botocore ClientError
+    """
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        from botocore.exceptions import ConnectionError, HTTPClientError
+
+        # EndpointConnectionError and ConnectTimeoutError are ConnectionErrors,
+        # ReadTimeoutError and ConnectionClosedError are HTTPClientErrors
+        return isinstance(error, (ConnectionError, HTTPClientError))
+    if response.get("Error", {}).get("Code") in THROTTLING_CODES:
+        return True
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+    return status >= 500
+
+
+class TokenBucket:
+    """Allows rate tokens per second on average and bursts of up to burst tokens
+    :param rate: tokens added per second, 0 disables the limit
+    :param burst: bucket capacity, defaults to one second worth of tokens
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.clock = clock
+        self.sleep = sleep or time.sleep
+        self.tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Takes tokens, waiting for the bucket to refill if needed
+        :param tokens: tokens needed, capped to the bucket capacity
+        :returns: seconds waited
+        """
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(tokens, self.burst)
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Tokens are taken right away, the debt is paid by waiting for it
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, rejecting calls for
+    reset_timeout seconds, then lets a single trial call through (half open)
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raises CircuitOpenError if the call must not be made"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit breaker is open")
+                self.state = HALF_OPEN
+            elif self.state == HALF_OPEN:
+                # A trial call is in flight already
+                raise CircuitOpenError("Circuit breaker is half open")
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = self.clock()
+
+
+class SendGuard:
+    """Rate limit, retries and circuit breaker of a single queue"""
+
+    def __init__(
+        self,
+        queue_url,
+        rate=0,
+        burst=None,
+        max_retries=3,
+        base_delay=0.05,
+        max_delay=2.0,
+        failure_threshold=5,
+        reset_timeout=30.0,
+        clock=time.monotonic,
+        sleep=None,
+    ):
+        self.queue_url = queue_url
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep or time.sleep
+
+    @classmethod
+    def from_env(cls, queue_url):
+        return cls(
+            queue_url,
+            rate=float(os.environ.get(SQS_RATE_LIMIT_ENV, 0)),
+            burst=float(os.environ.get(SQS_RATE_BURST_ENV, 0)) or None,
+            max_retries=int(os.environ.get(SQS_SEND_MAX_RETRIES_ENV, 3)),
+            base_delay=float(os.environ.get(SQS_SEND_BASE_DELAY_ENV, 0.05)),
+            max_delay=float(os.environ.get(SQS_SEND_MAX_DELAY_ENV, 2.0)),
+            failure_threshold=int(os.environ.get(SQS_BREAKER_FAILURES_ENV, 5)),
+            reset_timeout=float(os.environ.get(SQS_BREAKER_RESET_ENV, 30)),
+        )
+
+    def call(self, function, tokens=1, **kwargs):
+        """Calls the client function through the rate limit, retries and breaker
+        :param function: client method, e.g. send_message
+        :param tokens: messages sent by the call
+        :param kwargs: arguments of the call
+        :returns: response of the call, else raises its last error or CircuitOpenError
+        """
+        metrics = get_metrics()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                metrics.add("circuitopen", 0.0)
+                raise
+            # Only one call gets through while half open, it must settle the state
+            trial = self.breaker.state == HALF_OPEN
+            waited = self.bucket.acquire(tokens)
+            if waited:
+                metrics.add("ratelimit", waited * 1000)
+            try:
+                response = function(**kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    if isinstance(getattr(e, "response", None), dict):
+                        # The queue answered, a rejected request says nothing
+                        # about its health
+                        self.breaker.record_success()
+                    elif trial:
+                        # No answer to tell the queue recovered, else the
+                        # breaker would stay half open and reject every call
+                        self.breaker.record_failure()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries or self.breaker.state == OPEN:
+                    raise
+                delay = random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                print(f"Retrying the call to {self.queue_url} in {delay:.3f}s: {e}")
+                metrics.add("retry", delay * 1000)
+                self.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+    def snapshot(self):
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "tokens": self.bucket.tokens,
+        }
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(queue_url):
+    """Returns the guard of a queue, created once per container"""
+    guard = _guards.get(queue_url)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(queue_url, SendGuard.from_env(queue_url))
+    return guard
+
+
+def reset_guards():
+    """Drops every guard, with its breaker state and tokens"""
+    with _guards_lock:
+        _guards.clear()
@@ -9,6 +9,34 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import pytest
 
+from src.utils import idempotency, send_guard
+from src.utils.aws_utils import AWSUtils
+from src.utils.fake_sqs import FakeSQS
+
+
+@pytest.fixture(autouse=True)
+def reset_sqs_clients():
+    """Make sure cached SQS clients never leak between tests"""
+    AWSUtils.clear_sqs_clients()
+    yield
+    AWSUtils.clear_sqs_clients()
+
+
+@pytest.fixture(autouse=True)
+def reset_idempotency_store():
+    """Make sure processed messages are never remembered between tests"""
+    idempotency.reset_store()
+    yield
+    idempotency.reset_store()
+
+
+@pytest.fixture(autouse=True)
+def reset_send_guards():
+    """Make sure rate limits and circuit breakers never leak between tests"""
+    send_guard.reset_guards()
+    yield
+    send_guard.reset_guards()
+
 
 @pytest.fixture
 def mock_env():
@@ -27,6 +55,30 @@ def mock_env():
         yield
 
 
+@pytest.fixture
+def sqs_environment():
+    """Environment variables set next to the fake_sqs queue urls, override the
+    fixture or parametrize it to change them
+    """
+    return {}
+
+
+@pytest.fixture
+def fake_sqs(sqs_environment):
+    """FakeSQS used as the cached SQS client, its feed and target queue urls are
+    set in SQS_FEED_QUEUE and SQS_PRIMES_TARGET
+    """
+    fake_sqs = FakeSQS()
+    environment = {
+        "SQS_FEED_QUEUE": fake_sqs.create_queue(QueueName="feed")["QueueUrl"],
+        "SQS_PRIMES_TARGET": fake_sqs.create_queue(QueueName="target")["QueueUrl"],
+        **sqs_environment,
+    }
+    AWSUtils.set_sqs_client(fake_sqs)
+    with patch.dict(os.environ, environment):
+        yield fake_sqs
+
+
 @pytest.fixture
 def sample_sqs_event():
     """Sample SQS event for testing"""
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from botocore.exceptions import ClientError
-from src.utils.aws_utils import AWSUtils
+from src.utils.aws_utils import AWSUtils, sqs_message_size
 
 
 class TestAWSUtils:
@@ -44,7 +44,9 @@ class TestAWSUtils:
             )
 
             assert result == 200
-            mock_boto_client.assert_called_with("sqs", region_name="us-west-2")
+            mock_boto_client.assert_called_once()
+            assert mock_boto_client.call_args.args == ("sqs",)
+            assert mock_boto_client.call_args.kwargs["region_name"] == "us-west-2"
 
     def test_send_sqs_message_client_error(self, capfd):
         """Test SQS message sending with ClientError"""
@@ -110,7 +112,8 @@ class TestAWSUtils:
 
             result = AWSUtils.send_batch_sqs_messages(queue_url, bodies, attributes)
 
-            assert result == 200
+            assert len(result.successful) == 3
+            assert result.failed == []
             mock_client.send_message_batch.assert_called_once()
 
     def test_send_batch_sqs_messages_with_custom_region(self):
@@ -130,8 +133,10 @@ class TestAWSUtils:
                 queue_url, bodies, attributes, region="eu-west-1"
             )
 
-            assert result == 200
-            mock_boto_client.assert_called_with("sqs", region_name="eu-west-1")
+            assert len(result.successful) == 1
+            mock_boto_client.assert_called_once()
+            assert mock_boto_client.call_args.args == ("sqs",)
+            assert mock_boto_client.call_args.kwargs["region_name"] == "eu-west-1"
 
     def test_send_batch_sqs_messages_client_error(self, capfd):
         """Test batch SQS message sending with ClientError"""
@@ -208,8 +213,160 @@ class TestAWSUtils:
 
             result = AWSUtils.send_batch_sqs_messages(queue_url, bodies, attributes)
 
+            assert result.successful == []
+            assert result.failed == []
+            # SQS rejects empty batches, so no request should be made
+            mock_client.send_message_batch.assert_not_called()
+
+    def test_sqs_client_is_reused_across_calls(self):
+        """Test that the SQS client is created once and cached"""
+        queue_url = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+
+        with patch("boto3.client") as mock_boto_client:
+            mock_client = MagicMock()
+            mock_client.send_message.return_value = {
+                "ResponseMetadata": {"HTTPStatusCode": 200}
+            }
+            mock_boto_client.return_value = mock_client
+
+            AWSUtils.send_sqs_message(queue_url, "msg1", {})
+            AWSUtils.send_sqs_message(queue_url, "msg2", {})
+
+            mock_boto_client.assert_called_once()
+            assert mock_client.send_message.call_count == 2
+
+    def test_sqs_client_cache_keyed_by_region_and_endpoint(self):
+        """Test that region and endpoint get separate cached clients"""
+        with patch("boto3.client") as mock_boto_client:
+            mock_boto_client.side_effect = lambda *args, **kwargs: MagicMock()
+
+            east = AWSUtils.get_sqs_client("us-east-2")
+            west = AWSUtils.get_sqs_client("us-west-2")
+            local = AWSUtils.get_sqs_client("us-east-2", "http://localhost:4566")
+
+            assert east is AWSUtils.get_sqs_client("us-east-2")
+            assert len({id(east), id(west), id(local)}) == 3
+            assert mock_boto_client.call_count == 3
+            assert (
+                mock_boto_client.call_args.kwargs["endpoint_url"]
+                == "http://localhost:4566"
+            )
+
+    def test_sqs_client_config_from_env(self):
+        """Test that pool size and timeouts are read from the environment"""
+        with patch.dict(
+            "os.environ",
+            {
+                "SQS_MAX_POOL_CONNECTIONS": "25",
+                "SQS_CONNECT_TIMEOUT": "1.5",
+                "SQS_READ_TIMEOUT": "3",
+            },
+        ):
+            config = AWSUtils.sqs_client_config()
+
+        assert config.max_pool_connections == 25
+        assert config.connect_timeout == 1.5
+        assert config.read_timeout == 3.0
+        assert config.tcp_keepalive is True
+        # The send guard retries, botocore makes a single attempt
+        assert config.retries == {"mode": "standard", "max_attempts": 1}
+
+    def test_set_sqs_client_injects_client(self):
+        """Test that an injected client is used instead of creating one"""
+        queue_url = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+        mock_client = MagicMock()
+        mock_client.send_message.return_value = {
+            "ResponseMetadata": {"HTTPStatusCode": 200}
+        }
+        AWSUtils.set_sqs_client(mock_client)
+
+        with patch("boto3.client") as mock_boto_client:
+            result = AWSUtils.send_sqs_message(queue_url, "msg", {})
+
             assert result == 200
-            # Should still call send_message_batch with empty entries
-            call_args = mock_client.send_message_batch.call_args
-            entries = call_args[1]["Entries"]
-            assert len(entries) == 0
+            mock_boto_client.assert_not_called()
+            mock_client.send_message.assert_called_once()
+
+    def test_send_batch_sqs_messages_chunks_by_entry_count(self):
+        """Test that batches are split in chunks of at most 10 entries"""
+        queue_url = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+        bodies = [f"message{i}" for i in range(25)]
+        attributes = [{} for _ in bodies]
+        mock_client = MagicMock()
+        mock_client.send_message_batch.return_value = {"Failed": []}
+        AWSUtils.set_sqs_client(mock_client)
+
+        result = AWSUtils.send_batch_sqs_messages(queue_url, bodies, attributes)
+
+        sizes = sorted(
+            len(call.kwargs["Entries"])
+            for call in mock_client.send_message_batch.call_args_list
+        )
+        assert sizes == [5, 10, 10]
+        assert len(result.successful) == 25
+
+    def test_chunk_batch_entries_respects_byte_limit(self):
+        """Test that chunks never exceed the 256 KB request limit"""
+        body = "x" * (100 * 1024)
+        entries = [
+            {"Id": str(i), "MessageBody": body, "MessageAttributes": {}}
+            for i in range(5)
+        ]
+
+        chunks = AWSUtils.chunk_batch_entries(entries)
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    def test_sqs_message_size_counts_attributes(self):
+        """Test that attribute names, types and values count towards the size"""
+        attributes = {"Count": {"DataType": "Number", "StringValue": "12"}}
+
+        assert sqs_message_size("héllo", attributes) == 6 + 5 + 6 + 2
+
+    def test_send_batch_sqs_messages_retries_failed_entries_only(self):
+        """Test that only entries SQS failed on its side are resent"""
+        queue_url = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+        mock_client = MagicMock()
+        mock_client.send_message_batch.side_effect = [
+            {
+                "Successful": [{"Id": "a"}],
+                "Failed": [
+                    {"Id": "b", "SenderFault": False, "Code": "InternalError"},
+                    {"Id": "c", "SenderFault": True, "Code": "InvalidMessage"},
+                ],
+            },
+            {"Successful": [{"Id": "b"}], "Failed": []},
+        ]
+        AWSUtils.set_sqs_client(mock_client)
+
+        with patch("time.sleep") as mock_sleep:
+            result = AWSUtils.send_batch_sqs_messages(
+                queue_url, ["1", "2", "3"], [{}, {}, {}], ids=["a", "b", "c"]
+            )
+
+        retry_entries = mock_client.send_message_batch.call_args_list[1].kwargs[
+            "Entries"
+        ]
+        assert [entry["Id"] for entry in retry_entries] == ["b"]
+        assert result.successful == ["a", "b"]
+        assert result.failed_ids == ["c"]
+        assert not result
+        mock_sleep.assert_called_once()
+
+    def test_send_batch_sqs_messages_gives_up_after_max_retries(self):
+        """Test that entries still failing after the retries are reported"""
+        queue_url = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+        mock_client = MagicMock()
+        mock_client.send_message_batch.return_value = {
+            "Failed": [{"Id": "a", "SenderFault": False, "Code": "InternalError"}]
+        }
+        AWSUtils.set_sqs_client(mock_client)
+
+        with patch.dict("os.environ", {"SQS_BATCH_MAX_RETRIES": "2"}), patch(
+            "time.sleep"
+        ) as mock_sleep:
+            result = AWSUtils.send_batch_sqs_messages(queue_url, ["1"], [{}], ids=["a"])
+
+        assert mock_client.send_message_batch.call_count == 3
+        assert [call.args[0] for call in mock_sleep.call_args_list] == [0.1, 0.2]
+        assert result.failed_ids == ["a"]
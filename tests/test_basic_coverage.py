@@ -21,7 +21,7 @@ class TestCoverageBasic:
         }
         mock_boto_client.return_value = mock_client
 
-        manager = PrimeNumberManager()
+        manager = PrimeNumberManager(keep_non_primes=True)
         result = manager.get_prime_numbers([2, 3, 4, 5, 6])
 
         assert result == [2, 3, 5]
@@ -31,7 +31,7 @@ class TestCoverageBasic:
 
     def test_prime_number_manager_no_primes(self, mock_env):
         """Test prime number processing with no primes"""
-        manager = PrimeNumberManager()
+        manager = PrimeNumberManager(keep_non_primes=True)
         result = manager.get_prime_numbers([4, 6, 8, 9])
 
         assert result == []
@@ -0,0 +1,66 @@
+import random
+from unittest.mock import patch
+
+import pytest
+
+from src.prime_numbers_processing import batch_classifier
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.prime_numbers_processing.primality import get_engine
+
+pytest.importorskip("numpy")
+
+
+def scalar(numbers):
+    return [get_engine().is_prime(number) for number in numbers]
+
+
+class TestBatchClassifier:
+    """Test suite for the vectorized batch classifier"""
+
+    @pytest.mark.parametrize(
+        "numbers",
+        [
+            list(range(-20, 30000)),
+            [random.Random(1).getrandbits(32) for _ in range(5000)],
+            [random.Random(2).getrandbits(64) for _ in range(2000)],
+            [561, 1105, 1729, 2047, 3215031751, 4759123141, 2**32 - 5, 2**32 + 15],
+            [2**63 - 25, 2**63, 2**64 - 59, 2**64 - 1, 5],
+        ],
+    )
+    def test_matches_scalar_path(self, numbers):
+        """Test that the batch verdicts are identical to the scalar ones"""
+        verdicts = batch_classifier.classify(numbers, get_engine().is_prime)
+
+        assert verdicts == scalar(numbers)
+
+    @pytest.mark.parametrize(
+        "numbers",
+        [[], [2, 3.0], [2, "3"], [True, 3], [2, 2**64], [-1, 2**63]],
+    )
+    def test_non_homogeneous_input_is_rejected(self, numbers):
+        """Test that inputs the batch path can't represent are left to the scalar path"""
+        assert batch_classifier.classify(numbers, get_engine().is_prime) is None
+
+    def test_manager_uses_batch_mode_above_threshold(self, mock_env):
+        """Test that PrimeNumberManager switches to batch mode at the threshold"""
+        numbers = list(range(100))
+
+        with patch.dict("os.environ", {"BATCH_CLASSIFY_THRESHOLD": "100"}), patch(
+            "src.prime_numbers_processing.batch_classifier.classify",
+            wraps=batch_classifier.classify,
+        ) as mock_classify, patch(
+            "src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200
+        ):
+            manager = PrimeNumberManager(keep_non_primes=True)
+            result = manager.get_prime_numbers(numbers)
+            PrimeNumberManager().get_prime_numbers(numbers[:99])
+
+        mock_classify.assert_called_once()
+        assert result == [n for n, prime in zip(numbers, scalar(numbers)) if prime]
+        assert manager.non_prime_numbers == [n for n in numbers if n not in result]
+
+    def test_manager_batch_mode_keeps_validation(self, mock_env):
+        """Test that invalid elements still raise in batch mode"""
+        with patch.dict("os.environ", {"BATCH_CLASSIFY_THRESHOLD": "2"}):
+            with pytest.raises(ValueError, match="is not an integer"):
+                PrimeNumberManager().get_prime_numbers([2, 3, "x"])
@@ -0,0 +1,172 @@
+import json
+import os
+from unittest.mock import patch
+
+from benchmarks import decode, engines, throughput
+
+
+class TestThroughputBenchmark:
+    """Smoke tests of the throughput benchmark driver"""
+
+    def test_synthetic_run(self):
+        """Test that a synthetic run reports throughput and sends"""
+        bodies = throughput.synthetic_bodies(25, 20, "small", seed=1)
+
+        report = throughput.run(bodies, batch_size=10)
+
+        assert report["records"] == 25
+        assert report["invocations"] == 3
+        assert report["failed_records"] == 0
+        assert report["published_messages"] == 25
+        assert report["p99_ms"] >= report["p50_ms"] > 0
+
+    def test_replay_file(self, tmp_path):
+        """Test that events, records and bodies are read from a replay file"""
+        replay = tmp_path / "replay.jsonl"
+        replay.write_text(
+            "\n".join(
+                [
+                    json.dumps({"Records": [{"body": '{"Numbers": [2]}'}]}),
+                    json.dumps({"messageId": "1", "body": '{"Numbers": [3]}'}),
+                    json.dumps({"Numbers": [4]}),
+                    json.dumps({"title": "not a message"}),
+                ]
+            )
+        )
+
+        bodies, skipped = throughput.load_replay(replay)
+
+        assert [json.loads(body)["Numbers"] for body in bodies] == [[2], [3], [4]]
+        assert skipped == 1
+
+    def test_replay_reports_the_lines_it_skips(self, tmp_path, capsys):
+        """Test that backlog-style and malformed lines are reported, not read"""
+        replay = tmp_path / "replay.jsonl"
+        replay.write_text(
+            "\n".join(
+                [
+                    json.dumps({"request_id": "x", "title": "t", "body": "text"}),
+                    json.dumps({"Records": [{"body": '{"Other": 1}'}]}),
+                    "not json",
+                    json.dumps({"Numbers": [5]}),
+                ]
+            )
+        )
+
+        bodies, skipped = throughput.load_replay(replay)
+
+        output = capsys.readouterr().out.splitlines()
+        assert [json.loads(body)["Numbers"] for body in bodies] == [[5]]
+        assert skipped == 3
+        assert [line.split(":")[0] for line in output] == [
+            f"Skipping line {number} of {replay}" for number in (1, 2, 3)
+        ]
+
+
+class TestEngineBenchmark:
+    """Smoke tests of the engine benchmark suite"""
+
+    def test_run_covers_engines_and_classes(self, tmp_path):
+        """Test that every engine is timed on every input class, replay included"""
+        replay = tmp_path / "replay.jsonl"
+        replay.write_text(json.dumps({"Numbers": [7, 8, 2**61 - 1]}))
+
+        report = engines.run(count=20, repeat=1, replay=replay, engines=["builtin"])
+
+        classes = [*engines.INPUT_CLASSES, "replay"]
+        assert set(report["results"]) == {
+            f"{prefix}builtin/{name}" for prefix in ("", "manager/") for name in classes
+        }
+        assert all(r["ns_per_number"] > 0 for r in report["results"].values())
+
+    def test_compare_flags_regressions(self):
+        """Test that only slowdowns beyond the tolerance are reported"""
+        baseline = {
+            "results": {
+                "a/x": {"ns_per_number": 100.0},
+                "a/y": {"ns_per_number": 100.0},
+            }
+        }
+        current = {
+            "results": {
+                "a/x": {"ns_per_number": 109.0},
+                "a/y": {"ns_per_number": 130.0},
+            }
+        }
+
+        regressions = engines.compare(baseline, current, tolerance=0.1)
+
+        assert [key for key, *_ in regressions] == ["a/y"]
+
+    def test_compare_command_exit_status(self, tmp_path, capsys):
+        """Test that the compare command fails when a regression is found"""
+        baseline = tmp_path / "baseline.json"
+        current = tmp_path / "current.json"
+        baseline.write_text(json.dumps({"results": {"a/x": {"ns_per_number": 100.0}}}))
+        current.write_text(json.dumps({"results": {"a/x": {"ns_per_number": 200.0}}}))
+
+        assert engines.main(["compare", str(baseline), str(current)]) == 1
+        assert "REGRESSION a/x" in capsys.readouterr().out
+        assert engines.main(["compare", str(baseline), str(baseline)]) == 0
+
+    def test_engines_are_timed_directly(self):
+        """Test that every number reaches the engine, nothing answers in its place"""
+        checked = []
+
+        class CountingEngine:
+            def is_prime(self, number):
+                checked.append(number)
+                return False
+
+        with patch("benchmarks.engines.get_engine", return_value=CountingEngine()):
+            engines.time_classification("counting", [2, 3, 4] * 3000, repeat=2)
+
+        assert len(checked) == 2 * 9000
+
+    def test_manager_run_reaches_the_engine_every_time(self):
+        """Test that the cache and the bitmap don't answer the repeats of the
+        PrimeNumberManager run
+        """
+        checked = []
+
+        class CountingEngine:
+            name = "counting"
+
+            def is_prime(self, number):
+                checked.append(number)
+                return number in (2, 3)
+
+        with patch("benchmarks.engines.get_engine", return_value=CountingEngine()):
+            engines.time_manager_classification("counting", [2, 3, 4] * 100, repeat=3)
+
+        assert len(checked) == 3 * 300
+
+    def test_committed_baseline_covers_every_class(self):
+        """Test that the committed baseline can be compared against"""
+        path = os.path.join(os.path.dirname(engines.__file__), "baseline.json")
+        with open(path) as baseline:
+            report = json.load(baseline)
+
+        assert {
+            f"{prefix}builtin/{name}"
+            for prefix in ("", "manager/")
+            for name in engines.INPUT_CLASSES
+        } <= set(report["results"])
+        assert report["meta"]["count"] == 2000
+
+
+class TestDecodeBenchmark:
+    """Smoke tests of the decode benchmark"""
+
+    def test_run_covers_decoders_and_distributions(self):
+        """Test that both decoders are measured on bodies of the requested size"""
+        assert abs(len(decode.build_body(4096, "u32")) - 4096) < 32
+
+        results = decode.run(size=4096, repeat=1)
+
+        assert set(results) == {
+            f"{name}/{distribution}"
+            for name in decode.DECODERS
+            for distribution in decode.DISTRIBUTIONS
+        }
+        assert all(r["ms"] >= 0 and r["peak_kb"] > 0 for r in results.values())
@@ -0,0 +1,155 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+import handler
+from src.prime_numbers_processing import result_codec
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.utils import deadline
+
+
+class CountdownContext:
+    """Lambda context with plenty of time for the first calls, then almost none"""
+
+    def __init__(self, calls_with_time):
+        self.calls_with_time = calls_with_time
+
+    def get_remaining_time_in_millis(self):
+        self.calls_with_time -= 1
+        return 20000 if self.calls_with_time >= 0 else 1000
+
+
+@pytest.fixture
+def sqs_environment():
+    return {"PIPELINE_MAX_IN_FLIGHT": "0"}
+
+
+def continuations(fake_sqs):
+    return [
+        json.loads(message["Body"])
+        for message in fake_sqs.messages(os.environ["SQS_FEED_QUEUE"])
+    ]
+
+
+def published_primes(fake_sqs):
+    return sorted(
+        prime
+        for message in fake_sqs.messages(os.environ["SQS_PRIMES_TARGET"])
+        for prime in result_codec.decode_message(message)
+    )
+
+
+class TestDeadline:
+    """Test suite for the invocation deadline"""
+
+    def test_expires_within_the_margin(self):
+        """Test that the deadline counts as reached once under the margin"""
+        assert not deadline.Deadline(CountdownContext(1), margin_ms=5000).expired()
+        assert deadline.Deadline(CountdownContext(0), margin_ms=5000).expired()
+
+    def test_no_deadline_without_a_lambda_context(self):
+        """Test that local calls without a context are never cut short"""
+        assert deadline.from_context(None) is None
+        with patch.dict(os.environ, {"DEADLINE_MARGIN_MS": "2500"}):
+            assert deadline.from_context(CountdownContext(1)).margin_ms == 2500
+
+    def test_blocks_of_big_integers_are_sized_by_cost(self):
+        """Test that the deadline is checked after a few big integers, not 4096"""
+        numbers = [2**1024 + n for n in range(300)]
+        pnm = PrimeNumberManager(
+            deadline=deadline.Deadline(CountdownContext(1), margin_ms=5000)
+        )
+
+        pnm.classify(numbers)
+
+        classified = len(numbers) - len(pnm.remainder["Numbers"])
+        # Two blocks of 16 numbers, the deadline expires on the second check
+        assert classified == 32
+        assert pnm.remainder["Numbers"] == numbers[classified:]
+
+
+class TestHandlerDeadline:
+    """Test suite for the continuation of work cut short by the deadline"""
+
+    def test_records_not_started_are_continued(self, fake_sqs):
+        """Test that records reached after the deadline are re-enqueued whole"""
+        records = [
+            {"messageId": f"msg-{n}", "body": json.dumps({"Numbers": [n]})}
+            for n in (2, 3, 5)
+        ]
+
+        response = handler.prime_number_processing(
+            {"Records": records}, CountdownContext(1)
+        )
+
+        assert response == {"batchItemFailures": []}
+        assert published_primes(fake_sqs) == [2]
+        assert continuations(fake_sqs) == [
+            {"Numbers": [3], "ContinuationOf": "msg-3"},
+            {"Numbers": [5], "ContinuationOf": "msg-5"},
+        ]
+
+    def test_partial_numbers_are_published_and_continued(self, fake_sqs):
+        """Test that the primes found are published and the rest is re-enqueued"""
+        numbers = list(range(10000))
+        record = {"messageId": "msg-1", "body": json.dumps({"Numbers": numbers})}
+
+        response = handler.prime_number_processing(
+            {"Records": [record]}, CountdownContext(2)
+        )
+        [continuation] = continuations(fake_sqs)
+        first_part = published_primes(fake_sqs)
+        handler.prime_number_processing(
+            {"Records": [{"messageId": "msg-2", "body": json.dumps(continuation)}]},
+            None,
+        )
+
+        assert response == {"batchItemFailures": []}
+        assert continuation["ContinuationOf"] == "msg-1"
+        assert continuation["Numbers"] == numbers[-len(continuation["Numbers"]) :]
+        assert first_part and max(first_part) < continuation["Numbers"][0]
+        assert published_primes(fake_sqs) == [n for n in numbers if _is_prime(n)]
+
+    def test_redelivery_cuts_the_numbers_where_the_first_delivery_did(self, fake_sqs):
+        """Test that a redelivery with more time left publishes the same results
+        and still continues the rest, nothing is skipped as already published
+        """
+        numbers = list(range(10000))
+        record = {"messageId": "msg-1", "body": json.dumps({"Numbers": numbers})}
+
+        with patch("handler.continue_record", side_effect=RuntimeError("throttled")):
+            failed = handler.prime_number_processing(
+                {"Records": [record]}, CountdownContext(2)
+            )
+        first_part = published_primes(fake_sqs)
+        redelivered = handler.prime_number_processing({"Records": [record]}, None)
+        [continuation] = continuations(fake_sqs)
+        handler.prime_number_processing(
+            {"Records": [{"messageId": "msg-2", "body": json.dumps(continuation)}]},
+            None,
+        )
+
+        assert failed == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+        assert redelivered == {"batchItemFailures": []}
+        assert 0 < len(first_part) < 1229
+        assert published_primes(fake_sqs) == [n for n in numbers if _is_prime(n)]
+
+    def test_range_is_continued_after_the_last_segment(self, fake_sqs):
+        """Test that a Range cut short between two flushes publishes the primes
+        found and continues after the last sieved segment
+        """
+        record = {"messageId": "msg-1", "body": json.dumps({"Range": [1, 1000]})}
+        environment = {"RANGE_FLUSH_SIZE": "1000", "SIEVE_SEGMENT_SIZE": "8"}
+
+        with patch.dict(os.environ, environment):
+            handler.prime_number_processing({"Records": [record]}, CountdownContext(3))
+
+        [continuation] = continuations(fake_sqs)
+        assert published_primes(fake_sqs) == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31]
+        assert continuation == {"Range": [35, 1000], "ContinuationOf": "msg-1"}
+
+
+def _is_prime(number):
+    return number > 1 and all(number % d for d in range(2, int(number**0.5) + 1))
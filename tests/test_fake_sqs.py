@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.utils.aws_utils import AWSUtils
+from src.utils.fake_sqs import FakeSQS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_sqs(clock):
+    return FakeSQS(clock=clock)
+
+
+class TestFakeSQS:
+    """Test suite for the in-process SQS stand-in"""
+
+    def test_send_receive_delete(self, fake_sqs):
+        """Test the basic message lifecycle"""
+        url = fake_sqs.create_queue(QueueName="feed")["QueueUrl"]
+        fake_sqs.send_message(
+            QueueUrl=url,
+            MessageBody="hello",
+            MessageAttributes={"A": {"DataType": "String", "StringValue": "1"}},
+        )
+
+        [message] = fake_sqs.receive_message(QueueUrl=url)["Messages"]
+        assert message["Body"] == "hello"
+        assert message["MessageAttributes"]["A"]["StringValue"] == "1"
+        assert "Messages" not in fake_sqs.receive_message(QueueUrl=url)
+
+        fake_sqs.delete_message(QueueUrl=url, ReceiptHandle=message["ReceiptHandle"])
+        assert fake_sqs.messages(url) == []
+
+    def test_batch_send_and_delete(self, fake_sqs):
+        """Test the batch operations"""
+        url = fake_sqs.create_queue(QueueName="feed")["QueueUrl"]
+        response = fake_sqs.send_message_batch(
+            QueueUrl=url,
+            Entries=[{"Id": str(i), "MessageBody": f"m{i}"} for i in range(3)],
+        )
+        assert [entry["Id"] for entry in response["Successful"]] == ["0", "1", "2"]
+
+        messages = fake_sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10)[
+            "Messages"
+        ]
+        response = fake_sqs.delete_message_batch(
+            QueueUrl=url,
+            Entries=[
+                {"Id": "a", "ReceiptHandle": messages[0]["ReceiptHandle"]},
+                {"Id": "b", "ReceiptHandle": "bogus"},
+            ],
+        )
+        assert response["Successful"] == [{"Id": "a"}]
+        assert response["Failed"][0]["Id"] == "b"
+        assert len(fake_sqs.messages(url)) == 2
+
+    def test_visibility_timeout_and_delay(self, fake_sqs, clock):
+        """Test that received or delayed messages are hidden for a while"""
+        url = fake_sqs.create_queue(
+            QueueName="feed", Attributes={"VisibilityTimeout": "60"}
+        )["QueueUrl"]
+        fake_sqs.send_message(QueueUrl=url, MessageBody="late", DelaySeconds=10)
+        assert "Messages" not in fake_sqs.receive_message(QueueUrl=url)
+
+        clock.now = 10
+        [message] = fake_sqs.receive_message(QueueUrl=url)["Messages"]
+        clock.now = 69
+        assert "Messages" not in fake_sqs.receive_message(QueueUrl=url)
+
+        fake_sqs.change_message_visibility(
+            QueueUrl=url, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=0
+        )
+        [message] = fake_sqs.receive_message(QueueUrl=url)["Messages"]
+        assert message["Attributes"]["ApproximateReceiveCount"] == "2"
+
+    def test_redrive_to_dlq(self, fake_sqs, clock):
+        """Test that messages received too many times move to the DLQ"""
+        dlq_url = fake_sqs.create_queue(QueueName="dlq")["QueueUrl"]
+        dlq_arn = fake_sqs.get_queue_attributes(QueueUrl=dlq_url)["Attributes"][
+            "QueueArn"
+        ]
+        url = fake_sqs.create_queue(
+            QueueName="feed",
+            Attributes={
+                "VisibilityTimeout": "1",
+                "RedrivePolicy": json.dumps(
+                    {"deadLetterTargetArn": dlq_arn, "maxReceiveCount": 2}
+                ),
+            },
+        )["QueueUrl"]
+        fake_sqs.send_message(QueueUrl=url, MessageBody="poison")
+
+        for second in range(2):
+            clock.now = second * 2
+            assert fake_sqs.receive_message(QueueUrl=url)["Messages"]
+        clock.now = 10
+        assert "Messages" not in fake_sqs.receive_message(QueueUrl=url)
+        assert [m["Body"] for m in fake_sqs.messages(dlq_url)] == ["poison"]
+
+    def test_long_polling_waits_until_the_timeout(self):
+        """Test that WaitTimeSeconds waits when no message arrives"""
+        fake_sqs = FakeSQS()
+        url = fake_sqs.create_queue(QueueName="feed")["QueueUrl"]
+
+        started = time.monotonic()
+        assert "Messages" not in fake_sqs.receive_message(
+            QueueUrl=url, WaitTimeSeconds=0.1
+        )
+        assert time.monotonic() - started >= 0.1
+
+    def test_long_polling_returns_when_a_message_arrives(self):
+        """Test that a message sent during WaitTimeSeconds wakes the receive up"""
+        fake_sqs = FakeSQS()
+        url = fake_sqs.create_queue(QueueName="feed")["QueueUrl"]
+        sender = threading.Timer(
+            0.05, fake_sqs.send_message, kwargs={"QueueUrl": url, "MessageBody": "x"}
+        )
+
+        started = time.monotonic()
+        sender.start()
+        response = fake_sqs.receive_message(QueueUrl=url, WaitTimeSeconds=5)
+        elapsed = time.monotonic() - started
+        sender.join()
+
+        assert [m["Body"] for m in response["Messages"]] == ["x"]
+        assert 0.05 <= elapsed < 1
+
+    def test_latency_injection(self):
+        """Test that every call pays the injected latency"""
+        fake_sqs = FakeSQS(latency=0.02)
+        url = fake_sqs.create_queue(QueueName="feed")["QueueUrl"]
+
+        started = time.monotonic()
+        fake_sqs.send_message(QueueUrl=url, MessageBody="x")
+        assert time.monotonic() - started >= 0.02
+        assert fake_sqs.calls == {"send_message": 1}
+
+    def test_works_as_injected_client(self, fake_sqs):
+        """Test that AWSUtils can publish to the fake"""
+        url = fake_sqs.create_queue(QueueName="target")["QueueUrl"]
+        AWSUtils.set_sqs_client(fake_sqs)
+
+        assert AWSUtils.send_sqs_message(url, "[2, 3]", {}) == 200
+        result = AWSUtils.send_batch_sqs_messages(url, ["a", "b"], [{}, {}])
+        assert len(result.successful) == 2
+        assert len(fake_sqs.messages(url)) == 3
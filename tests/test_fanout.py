@@ -0,0 +1,157 @@
+import json
+import os
+import random
+from unittest.mock import patch
+
+import pytest
+from sympy import isprime
+
+import handler
+from src.prime_numbers_processing import fanout
+from src.utils.aws_utils import AWSUtils
+from worker import to_lambda_record
+
+NUMBERS = list(range(1, 201))
+
+
+@pytest.fixture
+def sqs_environment():
+    return {
+        "PIPELINE_MAX_IN_FLIGHT": "0",
+        # 200 small numbers cost 200 * 64**2, split into 4 shards
+        "FANOUT_MAX_COST": f"{50 * 64**2}",
+    }
+
+
+def drain(fake_sqs, queue_url):
+    messages = []
+    while True:
+        response = fake_sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)
+        if "Messages" not in response:
+            return messages
+        messages.extend(response["Messages"])
+
+
+def event(body, message_id="job-1"):
+    return {"Records": [{"messageId": message_id, "body": json.dumps(body)}]}
+
+
+class TestFanout:
+    """Test suite for the fan-out of oversized messages"""
+
+    def test_shards_are_contiguous_and_balanced(self):
+        """Test that shards keep the input order and split the cost evenly"""
+        numbers = [2**512 + i for i in range(8)] + list(range(100))
+
+        shards = fanout.plan_shards(numbers, max_cost=2 * 512**2, max_shards=10)
+
+        assert [n for shard in shards for n in shard] == numbers
+        assert len(shards) == 5
+        assert fanout.plan_shards(NUMBERS, max_cost=10**9, max_shards=10) is None
+        assert len(fanout.plan_shards(NUMBERS, max_cost=1, max_shards=3)) == 3
+
+    def test_disabled_by_default_and_for_shards(self):
+        """Test that nothing is split without FANOUT_MAX_COST, nor split twice"""
+        assert fanout.split_message({"Numbers": NUMBERS}, "job-1") is None
+        with patch.dict(os.environ, {"FANOUT_MAX_COST": "1"}):
+            shard = fanout.split_message({"Numbers": NUMBERS}, "job-1")[0]
+            assert fanout.split_message(shard, "job-2") is None
+
+    def test_oversized_message_is_fanned_out(self, fake_sqs):
+        """Test that the shards are enqueued to the feed queue with the job id"""
+        response = handler.prime_number_processing(event({"Numbers": NUMBERS}), None)
+
+        shards = [
+            json.loads(message["Body"])
+            for message in fake_sqs.messages(os.environ["SQS_FEED_QUEUE"])
+        ]
+        assert response == {"batchItemFailures": []}
+        assert [shard["ShardIndex"] for shard in shards] == [0, 1, 2, 3]
+        assert {shard["JobId"] for shard in shards} == {"job-1"}
+        assert [n for shard in shards for n in shard["Numbers"]] == NUMBERS
+        assert fake_sqs.messages(os.environ["SQS_PRIMES_TARGET"]) == []
+
+    def test_job_is_reassembled_from_the_shard_results(self, fake_sqs):
+        """Test the round trip: shards processed in any order, duplicates and
+        prime-less shards included, aggregate into the primes of the job
+        """
+        numbers = NUMBERS + [24, 25, 26, 27, 28, 30, 32, 33, 34, 35] * 5
+        handler.prime_number_processing(event({"Numbers": numbers}), None)
+        records = [
+            to_lambda_record(message)
+            for message in drain(fake_sqs, os.environ["SQS_FEED_QUEUE"])
+        ]
+        random.Random(7).shuffle(records)
+        for record in records:
+            handler.prime_number_processing({"Records": [record]}, None)
+
+        results = fake_sqs.messages(os.environ["SQS_PRIMES_TARGET"])
+        aggregator = fanout.JobAggregator()
+        outcomes = [aggregator.add(message) for message in results + results[:1]]
+
+        assert len(results) == 5
+        assert outcomes[:4] == [None] * 4
+        assert outcomes[4] == [n for n in numbers if isprime(n)]
+        assert outcomes[5] is None
+        assert aggregator.jobs == {}
+
+    def test_continued_shards_wait_for_their_last_part(self):
+        """Test that a shard cut by the deadline is complete with its last part"""
+        shard = {"JobId": "job-1", "ShardIndex": 1, "ShardCount": 2, "ShardOffset": 0}
+        aggregator = fanout.JobAggregator()
+        first_shard = {**shard, "ShardIndex": 0}
+
+        assert aggregator.add(result(shard, 3, [11, 13], last=False)) is None
+        assert aggregator.add(result(first_shard, 2, [2, 3], last=True)) is None
+        last_part = result(fanout.next_part(shard, 3), 4, [17], last=True)
+        assert aggregator.add(last_part) == [2, 3, 11, 13, 17]
+
+    def test_redeliveries_cut_at_other_places_are_deduplicated(self):
+        """Test that overlapping parts of a shard processed twice aren't repeated"""
+        shard = {"JobId": "job-1", "ShardIndex": 0, "ShardCount": 1, "ShardOffset": 0}
+        # [2, 3, 4, 5, 6, 7], cut after 2 numbers then after 4 by a redelivery
+        first = result(shard, 2, [2, 3], last=False)
+        first_rest = result(fanout.next_part(shard, 2), 6, [5, 7], last=True)
+        second = result(shard, 4, [2, 3, 5], last=False)
+        second_rest = result(fanout.next_part(shard, 4), 6, [7], last=True)
+
+        aggregator = fanout.JobAggregator()
+        outcomes = [
+            aggregator.add(message)
+            for message in (first, second, second_rest, first_rest)
+        ]
+
+        assert outcomes[:2] == [None, None]
+        assert outcomes[2] == [2, 3, 5, 7]
+        assert outcomes[3] is None
+
+    def test_only_the_shards_not_enqueued_are_sent_again(self, fake_sqs):
+        """Test that a redelivery of a partly fanned out message skips sent shards"""
+        record = event({"Numbers": NUMBERS})["Records"][0]
+        sent_ids = []
+        send_batch = AWSUtils.send_batch_sqs_messages
+
+        def flaky_send_batch(queue_url, bodies, attributes, ids):
+            sent_ids.append(ids)
+            result = send_batch(queue_url, bodies[:2], attributes[:2], ids=ids[:2])
+            result.failed.extend({"Id": entry_id} for entry_id in ids[2:])
+            return result
+
+        with patch(
+            "src.utils.aws_utils.AWSUtils.send_batch_sqs_messages", flaky_send_batch
+        ):
+            failed = handler.prime_number_processing({"Records": [record]}, None)
+        handler.prime_number_processing({"Records": [record]}, None)
+
+        shards = [
+            json.loads(message["Body"])["ShardIndex"]
+            for message in fake_sqs.messages(os.environ["SQS_FEED_QUEUE"])
+        ]
+        assert failed == {"batchItemFailures": [{"itemIdentifier": "job-1"}]}
+        assert sent_ids == [["0", "1", "2", "3"]]
+        assert sorted(shards) == [0, 1, 2, 3]
+
+
+def result(shard, end, primes, last):
+    attributes = fanout.result_attributes(shard, end, last)
+    return {"Body": json.dumps(primes), "MessageAttributes": attributes}
@@ -0,0 +1,78 @@
+import json
+from unittest.mock import patch
+
+import handler
+
+
+def make_record(message_id, body):
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"{message_id}-handle",
+        "body": body if isinstance(body, str) else json.dumps(body),
+    }
+
+
+class TestHandler:
+    """Test suite for the Lambda handler"""
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200)
+    def test_all_records_succeed(self, mock_send, mock_env):
+        """Test that a fully successful batch reports no failures"""
+        event = {
+            "Records": [
+                make_record("msg-1", {"Numbers": [2, 3, 4]}),
+                make_record("msg-2", {"Numbers": [5, 6, 7]}),
+            ]
+        }
+
+        response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": []}
+        assert mock_send.call_count == 2
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200)
+    def test_bad_record_does_not_drop_the_rest(self, mock_send, mock_env, capfd):
+        """Test that only the failing message id is reported back to SQS"""
+        event = {
+            "Records": [
+                make_record("msg-1", {"Numbers": [2, 3]}),
+                make_record("msg-2", "invalid json"),
+                make_record("msg-3", {"Numbers": [11, 12]}),
+            ]
+        }
+
+        response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-2"}]}
+        assert mock_send.call_count == 2
+        captured = capfd.readouterr()
+        assert "General Error: Message Id: msg-2" in captured.out
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message")
+    def test_send_failure_is_reported(self, mock_send, mock_env):
+        """Test that a record whose results can't be published is retried"""
+
+        def send(queue_url, body, attributes):
+            if body == "[3]":
+                raise RuntimeError("boom")
+            return 200
+
+        mock_send.side_effect = send
+        event = {
+            "Records": [
+                make_record("msg-1", {"Numbers": [2]}),
+                make_record("msg-2", {"Numbers": [3]}),
+            ]
+        }
+
+        response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-2"}]}
+
+    def test_empty_numbers_is_not_a_failure(self, mock_env):
+        """Test that a record without numbers is acknowledged"""
+        event = {"Records": [make_record("msg-1", {"Numbers": []})]}
+
+        response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": []}
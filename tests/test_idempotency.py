@@ -0,0 +1,174 @@
+import json
+import os
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+
+import handler
+from src.prime_numbers_processing import result_codec
+from src.utils import idempotency
+from src.utils.idempotency import (
+    FileIdempotencyStore,
+    MemoryIdempotencyStore,
+    MessageProgress,
+    SQLiteIdempotencyStore,
+)
+
+
+def make_record(message_id, body):
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"{message_id}-handle",
+        "body": json.dumps(body),
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite", "file"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryIdempotencyStore()
+    if request.param == "sqlite":
+        return SQLiteIdempotencyStore(str(tmp_path / "idempotency.sqlite3"))
+    return FileIdempotencyStore(str(tmp_path / "idempotency"))
+
+
+class TestIdempotencyStores:
+    """Test suite for the idempotency backends"""
+
+    def test_put_get_delete(self, store):
+        """Test that entries round trip and can be removed"""
+        store.put("key", {"status": "completed", "published": [1]}, 60)
+
+        assert store.get("key") == {"status": "completed", "published": [1]}
+        store.delete("key")
+        assert store.get("key") is None
+
+    def test_entries_expire(self, store):
+        """Test that entries are dropped once their TTL is over"""
+        store.put("key", {"status": "completed", "published": []}, 60)
+
+        with patch("src.utils.idempotency.time.time", return_value=10**12):
+            assert store.get("key") is None
+
+    def test_expired_entries_are_purged_without_being_read(self, store):
+        """Test that entries nobody reads again don't pile up past their TTL"""
+        store.put("old", {"status": "completed", "published": []}, 60)
+
+        with patch("src.utils.idempotency.time.time", return_value=10**12):
+            store.put("new", {"status": "completed", "published": []}, 60)
+
+        if isinstance(store, SQLiteIdempotencyStore):
+            keys = [
+                row[0]
+                for row in store._connection.execute("SELECT key FROM idempotency")
+            ]
+            assert keys == ["new"]
+        elif isinstance(store, FileIdempotencyStore):
+            assert os.listdir(store.directory) == [os.path.basename(store._path("new"))]
+
+    def test_memory_store_evicts_the_least_recently_used(self):
+        """Test that the memory store keeps at most max_entries entries"""
+        store = MemoryIdempotencyStore(max_entries=2)
+        for key in ("a", "b"):
+            store.put(key, {"status": "completed", "published": []}, 60)
+        store.get("a")
+        store.put("c", {"status": "completed", "published": []}, 60)
+
+        assert store.get("b") is None
+        assert store.get("a") is not None and store.get("c") is not None
+
+    def test_sqlite_expiry_is_indexed(self, tmp_path):
+        """Test that the expired entries are found through an index"""
+        store = SQLiteIdempotencyStore(str(tmp_path / "idempotency.sqlite3"))
+
+        plan = store._connection.execute(
+            "EXPLAIN QUERY PLAN DELETE FROM idempotency WHERE expires_at <= 0"
+        ).fetchall()
+        assert "idempotency_expires_at" in str(plan)
+
+    def test_progress_is_shared_through_the_store(self, store):
+        """Test that a later delivery sees the chunks and completion of an earlier one"""
+        first = MessageProgress(store, "key")
+        first.set_offset(4096)
+        first.mark_published(0)
+
+        second = MessageProgress(store, "key")
+        second.set_offset(10000)
+        assert second.offset == 4096
+        assert second.is_published(0)
+        assert not second.is_published(1)
+        assert not second.completed
+
+        second.complete({"NumberOfPrimes": 3})
+        third = MessageProgress(store, "key")
+        assert third.completed
+        assert third.result == {"NumberOfPrimes": 3}
+
+    def test_key_changes_with_the_body(self):
+        """Test that the key covers the message id and the body"""
+        key = idempotency.idempotency_key(make_record("msg-1", {"Numbers": [2]}))
+
+        assert key.startswith("msg-1:")
+        assert key != idempotency.idempotency_key(
+            make_record("msg-1", {"Numbers": [3]})
+        )
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend is rejected"""
+        with patch.dict(os.environ, {"IDEMPOTENCY_BACKEND": "redis"}):
+            with pytest.raises(ValueError, match="Unknown idempotency backend"):
+                idempotency.get_store()
+
+    def test_disabled(self):
+        """Test that records aren't tracked when the backend is none"""
+        with patch.dict(os.environ, {"IDEMPOTENCY_BACKEND": "none"}):
+            assert idempotency.track(make_record("msg-1", {"Numbers": [2]})) is None
+
+
+class TestHandlerIdempotency:
+    """Test suite for redelivered messages in the Lambda handler"""
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200)
+    def test_redelivery_skips_recomputation(self, mock_send, mock_env):
+        """Test that a completed message is acknowledged without being processed again"""
+        event = {"Records": [make_record("msg-1", {"Numbers": [2, 3, 4]})]}
+
+        assert handler.prime_number_processing(event, None) == {"batchItemFailures": []}
+        with patch(
+            "handler.PrimeNumberManager.get_prime_numbers"
+        ) as mock_get_prime_numbers:
+            response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": []}
+        mock_get_prime_numbers.assert_not_called()
+        assert mock_send.call_count == 1
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message")
+    def test_partial_publish_resumes(self, mock_send, mock_env):
+        """Test that only the result messages not sent before are published again"""
+        sent = []
+
+        def send(queue_url, body, attributes):
+            if len(sent) == 1 and mock_send.call_count == 2:
+                raise RuntimeError("throttled")
+            sent.append(attributes["ChunkIndex"]["StringValue"])
+            return 200
+
+        mock_send.side_effect = send
+        event = {"Records": [make_record("msg-1", {"Numbers": [2, 3, 5, 7]})]}
+
+        small_messages = partial(result_codec.encode_messages, max_bytes=8)
+        with patch.dict(os.environ, {"PIPELINE_MAX_IN_FLIGHT": "0"}), patch(
+            "src.prime_numbers_processing.result_codec.encode_messages", small_messages
+        ):
+            first = handler.prime_number_processing(event, None)
+            second = handler.prime_number_processing(event, None)
+            third = handler.prime_number_processing(event, None)
+
+        assert first == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+        assert second == third == {"batchItemFailures": []}
+        assert sorted(sent) == sorted(set(sent))
+        assert len(sent) == int(
+            mock_send.call_args.args[2]["ChunkCount"]["StringValue"]
+        )
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Cold start budget for `import handler`, override with IMPORT_TIME_BUDGET_MS
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 150))
+HEAVY_MODULES = ("boto3", "botocore", "sympy", "numpy", "gmpy2")
+
+
+def import_handler():
+    """Imports the handler in a fresh interpreter with -X importtime
+    :returns: tuple with the cumulative import time in ms and the heavy modules loaded
+    """
+    code = (
+        "import sys, handler; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == "handler":
+            loaded = [name for name in result.stdout.strip().split(",") if name]
+            return int(parts[1]) / 1000, loaded
+    raise AssertionError(f"handler not found in importtime output:\n{result.stderr}")
+
+
+class TestImportTime:
+    """Cold start regression checks for the Lambda entry point"""
+
+    def test_handler_does_not_import_heavy_dependencies(self):
+        """Test that heavy dependencies are only loaded on first use"""
+        _, loaded = import_handler()
+
+        assert loaded == []
+
+    def test_handler_import_time_budget(self):
+        """Test that importing the handler stays within the configured budget"""
+        # Best of three runs, the first one may also be compiling bytecode
+        import_time_ms = min(import_handler()[0] for _ in range(3))
+
+        assert import_time_ms <= IMPORT_TIME_BUDGET_MS, (
+            f"import handler took {import_time_ms:.1f}ms, "
+            f"budget is {IMPORT_TIME_BUDGET_MS:.1f}ms"
+        )
@@ -0,0 +1,101 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+import handler
+from src.utils import metrics
+from src.utils.metrics import Metrics, NullMetrics, get_metrics, log_payload
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset_metrics()
+    yield
+    metrics.reset_metrics()
+
+
+def emf_lines(output):
+    return [json.loads(line) for line in output.splitlines() if '"_aws"' in line]
+
+
+class TestMetrics:
+    """Test suite for the stage metrics and EMF output"""
+
+    def test_stages_are_accumulated(self):
+        """Test that durations and counts add up per stage"""
+        recorder = Metrics()
+        recorder.add("classify", 1.5, 10)
+        recorder.add("classify", 0.5, 5)
+        with recorder.timer("send", 2):
+            pass
+
+        snapshot = recorder.snapshot()
+        assert snapshot["classify"] == (2.0, 15)
+        assert snapshot["send"][1] == 2
+
+    def test_emf_document(self):
+        """Test the Embedded Metric Format structure"""
+        recorder = Metrics("TestNamespace")
+        recorder.add("decode", 1.23456, 3)
+
+        document = recorder.to_emf({"FunctionName": "fn"})
+
+        [directive] = document["_aws"]["CloudWatchMetrics"]
+        assert directive["Namespace"] == "TestNamespace"
+        assert directive["Dimensions"] == [["FunctionName"]]
+        assert {"Name": "DecodeTime", "Unit": "Milliseconds"} in directive["Metrics"]
+        assert {"Name": "DecodeCount", "Unit": "Count"} in directive["Metrics"]
+        assert document["FunctionName"] == "fn"
+        assert document["DecodeTime"] == 1.235
+        assert document["DecodeCount"] == 3
+
+    def test_flush_prints_and_resets(self, capfd):
+        """Test that flush emits a single line and starts over"""
+        recorder = Metrics()
+        recorder.add("send", 1.0)
+        recorder.flush()
+        recorder.flush()
+
+        assert len(emf_lines(capfd.readouterr().out)) == 1
+        assert recorder.snapshot() == {}
+
+    def test_no_op_mode(self, capfd):
+        """Test that METRICS_ENABLED=false records nothing"""
+        with patch.dict("os.environ", {"METRICS_ENABLED": "false"}):
+            recorder = get_metrics()
+
+        assert isinstance(recorder, NullMetrics)
+        with recorder.timer("decode"):
+            pass
+        recorder.flush()
+        assert capfd.readouterr().out == ""
+
+    def test_payload_log_sampling(self, capfd):
+        """Test that payloads are only logged for the sampled fraction"""
+        with patch.dict("os.environ", {"PAYLOAD_LOG_SAMPLE_RATE": "0"}):
+            assert log_payload({"a": 1}) is False
+        assert log_payload({"a": 1}, sample_rate=1) is True
+        with patch("random.random", side_effect=[0.2, 0.7]):
+            assert log_payload({"a": 1}, sample_rate=0.5) is True
+            assert log_payload({"a": 1}, sample_rate=0.5) is False
+
+        assert capfd.readouterr().out.count('{"a": 1}') == 2
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200)
+    def test_handler_emits_stage_metrics(self, mock_send, mock_env, capfd):
+        """Test that an invocation emits decode, classify and send metrics"""
+        event = {
+            "Records": [
+                {"messageId": "1", "body": '{"Numbers": [2, 3, 4]}'},
+                {"messageId": "2", "body": '{"Numbers": [5, 6]}'},
+            ]
+        }
+
+        handler.prime_number_processing(event, None)
+
+        [document] = emf_lines(capfd.readouterr().out)
+        assert document["DecodeCount"] == 2
+        assert document["ClassifyCount"] == 5
+        assert document["SendCount"] == 2
+        assert document["ClassifyTime"] >= 0
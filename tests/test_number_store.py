@@ -0,0 +1,101 @@
+import tracemalloc
+import pytest
+
+from src.prime_numbers_processing import batch_classifier
+from src.prime_numbers_processing.number_store import NumberStore
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+
+# Peak memory allowed to classify a one million element input
+CLASSIFY_MEMORY_BUDGET = 6 * 1024 * 1024
+
+
+class TestNumberStore:
+    """Test suite for the compact number storage"""
+
+    def test_compact_storage(self):
+        """Test that 64-bit values are kept in the typed array"""
+        store = NumberStore([2, 3])
+        store.append(2**64 - 59)
+
+        assert store.is_compact
+        assert store == [2, 3, 2**64 - 59]
+        assert [2, 3, 2**64 - 59] == store
+        assert store[-1] == 2**64 - 59
+        assert len(store) == 3
+
+    def test_promoted_for_values_outside_64_bits(self):
+        """Test that big or negative values are stored without losing order"""
+        store = NumberStore([1, 2])
+        store.extend([3, -4, 5])
+        store.append(2**89 - 1)
+
+        assert not store.is_compact
+        assert store.tolist() == [1, 2, 3, -4, 5, 2**89 - 1]
+
+    def test_equality(self):
+        """Test comparisons against other sequences"""
+        assert NumberStore([1, 2]) == NumberStore([1, 2])
+        assert NumberStore([1, 2]) != [1, 2, 3]
+        assert NumberStore() == []
+        assert NumberStore([1]) != None  # noqa: E711
+
+
+class TestPrimeNumberManagerStorage:
+    """Test suite for the manager storage and streaming API"""
+
+    def test_non_primes_are_not_kept_by_default(self):
+        """Test that non-primes are only retained on request"""
+        manager = PrimeNumberManager()
+        manager.classify([2, 3, 4, 5, 6])
+
+        assert manager.prime_numbers == [2, 3, 5]
+        assert manager.non_prime_numbers == []
+
+        manager = PrimeNumberManager(keep_non_primes=True)
+        manager.classify([2, 3, 4, 5, 6])
+        assert manager.non_prime_numbers == [4, 6]
+
+    def test_manager_uses_slots(self):
+        """Test that no per-instance dict is allocated"""
+        manager = PrimeNumberManager()
+
+        assert not hasattr(manager, "__dict__")
+        with pytest.raises(AttributeError):
+            manager.unknown = 1
+
+    def test_iter_verdicts_streams(self):
+        """Test that verdicts are yielded lazily in input order"""
+        manager = PrimeNumberManager()
+        numbers = iter([7, 8, 2**89 - 1])
+
+        verdicts = manager.iter_verdicts(numbers)
+
+        assert next(verdicts) == (7, True)
+        assert list(verdicts) == [(8, False), (2**89 - 1, True)]
+        assert manager.prime_numbers == []
+
+    def test_iter_verdicts_matches_classify(self):
+        """Test that streaming and classify agree across block boundaries"""
+        numbers = list(range(-5, 70000))
+        manager = PrimeNumberManager()
+
+        streamed = [n for n, prime in manager.iter_verdicts(iter(numbers)) if prime]
+
+        assert manager.classify(numbers) == streamed
+
+    def test_classify_memory_budget(self):
+        """Test the peak memory of classifying one million numbers"""
+        if not batch_classifier._load_numpy():
+            pytest.skip("numpy is needed to classify 1M numbers in reasonable time")
+        numbers = list(range(1_000_000))
+        manager = PrimeNumberManager()
+
+        tracemalloc.start()
+        try:
+            manager.classify(numbers)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert len(manager.prime_numbers) == 78498
+        assert peak < CLASSIFY_MEMORY_BUDGET, f"peak was {peak / 2**20:.1f}MB"
@@ -0,0 +1,147 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import handler
+from src.utils.aws_utils import BatchSendResult
+from src.utils.output_buffer import OutputBuffer, create_buffer
+
+QUEUE_URL = "https://sqs.us-east-2.amazonaws.com/123456789012/test-queue"
+
+
+def batch_result(failed_ids=()):
+    result = BatchSendResult()
+    result.failed = [{"Id": entry_id, "SenderFault": False} for entry_id in failed_ids]
+    return result
+
+
+@pytest.fixture
+def mock_send_batch():
+    with patch(
+        "src.utils.aws_utils.AWSUtils.send_batch_sqs_messages",
+        return_value=batch_result(),
+    ) as mock_send_batch:
+        yield mock_send_batch
+
+
+class TestOutputBuffer:
+    """Test suite for the output aggregation buffer"""
+
+    def test_flushes_on_entry_count(self, mock_send_batch):
+        """Test that reaching max_entries sends a batch"""
+        buffer = OutputBuffer(QUEUE_URL, max_entries=3)
+        for body in ("[2]", "[3]", "[5]", "[7]"):
+            buffer.add(body, {}, "msg-1")
+
+        mock_send_batch.assert_called_once()
+        assert mock_send_batch.call_args.args[1] == ["[2]", "[3]", "[5]"]
+        buffer.flush()
+        assert mock_send_batch.call_args.args[1] == ["[7]"]
+
+    def test_flushes_before_exceeding_max_bytes(self, mock_send_batch):
+        """Test that an entry that wouldn't fit is sent in the next batch"""
+        buffer = OutputBuffer(QUEUE_URL, max_bytes=60)
+        buffer.add("x" * 20, {}, "msg-1")
+        buffer.add("y" * 20, {}, "msg-2")
+
+        assert mock_send_batch.call_args.args[1] == ["x" * 20]
+
+    def test_flushes_on_age(self, mock_send_batch):
+        """Test that an entry older than max_age triggers a flush"""
+        now = [0.0]
+        buffer = OutputBuffer(QUEUE_URL, max_age=1.0, clock=lambda: now[0])
+        buffer.add("[2]", {}, "msg-1")
+        mock_send_batch.assert_not_called()
+
+        now[0] = 1.5
+        buffer.add("[3]", {}, "msg-2")
+        assert mock_send_batch.call_args.args[1] == ["[2]", "[3]"]
+
+    def test_results_keep_their_source(self, mock_send_batch):
+        """Test that the source message id is added to the attributes"""
+        buffer = OutputBuffer(QUEUE_URL)
+        buffer.add("[2]", {"NumberOfPrimes": {"DataType": "Number"}}, "msg-1")
+        buffer.flush()
+
+        attributes = mock_send_batch.call_args.args[2][0]
+        assert attributes["SourceMessageId"] == {
+            "DataType": "String",
+            "StringValue": "msg-1",
+        }
+        assert "NumberOfPrimes" in attributes
+
+    def test_callbacks_and_failed_sources(self, mock_send_batch):
+        """Test that only the sources whose results were all sent are done"""
+        mock_send_batch.return_value = batch_result(failed_ids=["1"])
+        buffer = OutputBuffer(QUEUE_URL)
+        sent = MagicMock()
+        done = MagicMock()
+        buffer.for_source("msg-1").add("[2]", {}, sent)
+        buffer.for_source("msg-2").add("[3]", {})
+        buffer.for_source("msg-1").close(done.first)
+        buffer.for_source("msg-2").close(done.second)
+        buffer.for_source("msg-3").close(done.third)
+
+        assert buffer.flush() == {"msg-2"}
+        sent.assert_called_once_with()
+        done.first.assert_called_once_with()
+        done.second.assert_not_called()
+        done.third.assert_called_once_with()
+
+    def test_send_exception_fails_every_source(self, mock_send_batch, capfd):
+        """Test that a rejected batch reports all of its sources"""
+        mock_send_batch.side_effect = RuntimeError("boom")
+        buffer = OutputBuffer(QUEUE_URL)
+        buffer.add("[2]", {}, "msg-1")
+        buffer.add("[3]", {}, "msg-2")
+
+        assert buffer.flush() == {"msg-1", "msg-2"}
+        assert "Could not send 2 buffered results: boom" in capfd.readouterr().out
+
+    def test_disabled_by_default(self, mock_env):
+        """Test that results are sent one by one unless the buffer is enabled"""
+        assert create_buffer() is None
+        with patch.dict(os.environ, {"OUTPUT_BUFFER_ENABLED": "true"}):
+            assert create_buffer().queue_url == QUEUE_URL
+
+
+class TestHandlerOutputBuffer:
+    """Test suite for buffered results in the Lambda handler"""
+
+    @pytest.fixture
+    def sqs_environment(self):
+        return {"OUTPUT_BUFFER_ENABLED": "true"}
+
+    def test_results_are_batched_across_records(self, fake_sqs):
+        """Test that the results of a whole event go out in a single batch call"""
+        records = [
+            {"messageId": f"msg-{n}", "body": json.dumps({"Numbers": [n, n + 2]})}
+            for n in (3, 5, 11)
+        ]
+
+        response = handler.prime_number_processing({"Records": records}, None)
+
+        assert response == {"batchItemFailures": []}
+        assert fake_sqs.calls == {"send_message_batch": 1}
+        messages = fake_sqs.messages(os.environ["SQS_PRIMES_TARGET"])
+        assert sorted(
+            message["MessageAttributes"]["SourceMessageId"]["StringValue"]
+            for message in messages
+        ) == ["msg-11", "msg-3", "msg-5"]
+
+    def test_failed_flush_is_reported(self, fake_sqs):
+        """Test that records whose buffered results weren't sent are retried"""
+        records = [{"messageId": "msg-1", "body": json.dumps({"Numbers": [2, 3]})}]
+
+        with patch(
+            "src.utils.aws_utils.AWSUtils.send_batch_sqs_messages",
+            return_value=batch_result(failed_ids=["0"]),
+        ):
+            response = handler.prime_number_processing({"Records": records}, None)
+        retried = handler.prime_number_processing({"Records": records}, None)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+        assert retried == {"batchItemFailures": []}
+        assert fake_sqs.calls == {"send_message_batch": 1}
@@ -0,0 +1,146 @@
+import os
+import random
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sympy import isprime
+
+from src.prime_numbers_processing import parallel
+from src.prime_numbers_processing.primality import get_engine
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+
+BIG_NUMBERS = [2**521 - 1, 2**521 + 1, 2**607 - 1, 3, 2**127 - 1, 10**200 + 357, 4]
+
+
+@pytest.fixture
+def pool_env():
+    with patch.dict(os.environ, {"CLASSIFY_PROCESSES": "2", "PARALLEL_MIN_COST": "1"}):
+        yield
+    parallel.shutdown_pool()
+
+
+class TestParallelClassification:
+    """Test suite for the process pool classification"""
+
+    def test_split_by_cost_balances_the_parts(self):
+        """Test that every item is assigned once and the costs are spread"""
+        costs = [100, 1, 1, 50, 50, 1]
+
+        parts = parallel.split_by_cost(costs, 2)
+
+        assert sorted(index for part in parts for index in part) == list(range(6))
+        assert sorted(sum(costs[i] for i in part) for part in parts) == [101, 102]
+
+    def test_skipped_when_it_does_not_pay_off(self):
+        """Test that the pool is only used when enabled and the input is costly"""
+        engine = get_engine("builtin")
+        assert parallel.classify(BIG_NUMBERS, engine) is None
+        with patch.dict(os.environ, {"CLASSIFY_PROCESSES": "2"}):
+            assert parallel.classify([7, 8, 9], engine) is None
+            assert parallel.classify(["7", 2**521 - 1], engine) is None
+            # Only numbers above 64 bits count towards PARALLEL_MIN_COST
+            rng = random.Random(5)
+            words = [rng.getrandbits(64) for _ in range(10000)]
+            assert parallel.classify(words, engine) is None
+
+    def test_verdicts_keep_the_input_order(self, pool_env):
+        """Test that the pooled verdicts match the serial ones, in order"""
+        verdicts = parallel.classify(BIG_NUMBERS, get_engine("builtin"))
+
+        assert verdicts == [isprime(number) for number in BIG_NUMBERS]
+
+    def test_pool_is_reused(self, pool_env):
+        """Test that warm calls don't spawn new processes"""
+        engine = get_engine("builtin")
+        parallel.classify(BIG_NUMBERS, engine)
+        pool = parallel._pool
+        parallel.classify(BIG_NUMBERS, engine)
+
+        assert parallel._pool is pool
+
+    def test_worker_errors_are_raised(self, pool_env):
+        """Test that an exception in a worker reaches the caller"""
+        with pytest.raises(ValueError, match="Unknown primality engine"):
+            parallel.classify(BIG_NUMBERS, SimpleNamespace(name="missing"))
+        assert parallel.classify(BIG_NUMBERS, get_engine("builtin")) is not None
+
+    def test_manager_classifies_on_the_pool(self, pool_env):
+        """Test that PrimeNumberManager goes through the pool for costly inputs"""
+        with patch(
+            "src.prime_numbers_processing.parallel.get_pool",
+            wraps=parallel.get_pool,
+        ) as mock_get_pool:
+            primes = PrimeNumberManager().classify(BIG_NUMBERS)
+
+        mock_get_pool.assert_called_once_with(2)
+        assert primes == [number for number in BIG_NUMBERS if isprime(number)]
+
+    def test_bitmap_and_cache_answer_before_the_pool(self, pool_env):
+        """Test that only the numbers nobody knows are sent to the workers"""
+        pnm = PrimeNumberManager()
+        pnm.cache.clear()
+        pnm.cache.put(2**521 - 1, True)
+
+        with patch(
+            "src.prime_numbers_processing.parallel.classify",
+            wraps=parallel.classify,
+        ) as mock_classify:
+            primes = pnm.classify(BIG_NUMBERS)
+
+        assert mock_classify.call_args.args[0] == [
+            number for number in BIG_NUMBERS if number != 2**521 - 1
+        ]
+        assert primes == [number for number in BIG_NUMBERS if isprime(number)]
+        assert pnm.cache.get(2**607 - 1) is True
+
+    def test_workers_answering_late_are_dropped(self, pool_env):
+        """Test that a call past the deadline shuts the pool down and raises"""
+        expired = SimpleNamespace(remaining_ms=lambda: 5000, margin_ms=5000)
+        numbers = [2**4423 - 1] * 4
+
+        with pytest.raises(TimeoutError, match="No verdicts after 0.0s"):
+            parallel.classify(numbers, get_engine("builtin"), expired)
+        assert parallel._pool is None
+
+    def test_deadline_blocks_reach_the_pool(self):
+        """Test that with a deadline, blocks of big integers are costly enough
+        for the pool at the default PARALLEL_MIN_COST
+        """
+        rng = random.Random(20)
+        numbers = [rng.getrandbits(1024) | 1 for _ in range(64)]
+        deadline = SimpleNamespace(
+            remaining_ms=lambda: 600000, margin_ms=5000, expired=lambda: False
+        )
+
+        with patch.dict(os.environ, {"CLASSIFY_PROCESSES": "2"}), patch(
+            "src.prime_numbers_processing.parallel.get_pool",
+            wraps=parallel.get_pool,
+        ) as mock_get_pool:
+            pnm = PrimeNumberManager(deadline=deadline)
+            pnm.cache.clear()
+            primes = pnm.classify(numbers)
+        parallel.shutdown_pool()
+
+        assert mock_get_pool.call_count == 2
+        assert primes == [number for number in numbers if isprime(number)]
+        assert pnm.remainder is None
+
+    def test_block_expired_on_the_pool_is_left_unclassified(self, pool_env):
+        """Test that a block the workers didn't answer in time goes to the
+        remainder instead of being classified on a single core
+        """
+        numbers = [2**4423 - 1] * 4 + [7]
+        deadline = SimpleNamespace(
+            remaining_ms=lambda: 5000, margin_ms=5000, expired=lambda: True
+        )
+        pnm = PrimeNumberManager(deadline=deadline)
+        pnm.cache.clear()
+
+        with patch.object(pnm.engine, "is_prime") as mock_is_prime:
+            primes = pnm.classify(numbers)
+
+        mock_is_prime.assert_not_called()
+        assert primes == []
+        assert pnm.remainder == {"Numbers": numbers}
+        assert pnm.classified == 0
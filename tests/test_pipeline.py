@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.prime_numbers_processing import pipeline
+
+
+class PublishRecorder:
+    """Publish step that sleeps like a network call and tracks concurrency"""
+
+    def __init__(self, delay=0.05, fail_on=()):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.published = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+            if job in self.fail_on:
+                raise RuntimeError(f"send {job} failed")
+            self.published.append(job)
+
+
+def prepare(record):
+    if record == "bad":
+        raise ValueError("bad record")
+    if record == "empty":
+        return None
+    return record
+
+
+class TestPipeline:
+    """Test suite for the compute/send pipeline"""
+
+    def test_sends_overlap_and_are_drained(self):
+        """Test that sends run concurrently and all finish before returning"""
+        publish = PublishRecorder(delay=0.05)
+        records = list(range(8))
+
+        started = time.perf_counter()
+        errors = pipeline.process_records(records, prepare, publish, limit=8)
+        elapsed = time.perf_counter() - started
+
+        assert errors == []
+        assert sorted(publish.published) == records
+        assert elapsed < 8 * 0.05 / 2
+
+    def test_in_flight_sends_are_bounded(self):
+        """Test the backpressure on concurrent sends"""
+        publish = PublishRecorder(delay=0.02)
+
+        pipeline.process_records(list(range(10)), prepare, publish, limit=3)
+
+        assert publish.max_in_flight <= 3
+        assert len(publish.published) == 10
+
+    @pytest.mark.parametrize("limit", [0, 4])
+    def test_errors_are_reported_in_input_order(self, limit):
+        """Test that prepare and publish failures are both reported"""
+        publish = PublishRecorder(delay=0.01, fail_on=(3,))
+        records = [1, "bad", "empty", 3, 4]
+
+        errors = pipeline.process_records(records, prepare, publish, limit=limit)
+
+        assert [record for record, _ in errors] == ["bad", 3]
+        assert isinstance(errors[0][1], ValueError)
+        assert sorted(publish.published) == [1, 4]
+
+    def test_limit_read_from_env(self, monkeypatch):
+        """Test that PIPELINE_MAX_IN_FLIGHT configures the limit"""
+        monkeypatch.setenv("PIPELINE_MAX_IN_FLIGHT", "0")
+        publish = PublishRecorder(delay=0)
+
+        pipeline.process_records([1, 2], prepare, publish)
+
+        assert pipeline.max_in_flight() == 0
+        assert publish.published == [1, 2]
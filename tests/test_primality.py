@@ -0,0 +1,100 @@
+import random
+from unittest.mock import patch
+
+import pytest
+import sympy
+
+from src.prime_numbers_processing import primality
+from src.prime_numbers_processing.primality import (
+    BuiltinEngine,
+    SympyEngine,
+    available_engines,
+    get_engine,
+)
+
+CARMICHAEL_NUMBERS = [561, 1105, 1729, 2465, 2821, 6601, 8911, 41041, 825265]
+STRONG_PSEUDOPRIMES = [
+    2047,
+    1373653,
+    25326001,
+    3215031751,
+    2152302898747,
+    3474749660383,
+    341550071728321,
+    3825123056546413051,
+    318665857834031151167461,
+]
+
+
+def sample_numbers():
+    rng = random.Random(1234)
+    numbers = list(range(-10, 5000))
+    numbers += CARMICHAEL_NUMBERS + STRONG_PSEUDOPRIMES
+    numbers += [rng.getrandbits(32) for _ in range(500)]
+    numbers += [rng.getrandbits(64) for _ in range(500)]
+    # Around every switch between base sets
+    for limit, _ in primality.MILLER_RABIN_BASE_SETS[:-1]:
+        numbers += range(limit - 40, limit + 41)
+    numbers += [2**61 - 1, 2**64 - 59, 2**64 - 1, 2**64, 2**64 + 13, 2**89 - 1]
+    numbers += [rng.getrandbits(128) | 1 for _ in range(50)]
+    return numbers
+
+
+@pytest.fixture(autouse=True)
+def reset_engines():
+    primality._engines.clear()
+    yield
+    primality._engines.clear()
+
+
+class TestPrimality:
+    """Test suite for the primality engines"""
+
+    @pytest.mark.parametrize("name", available_engines())
+    def test_engine_agrees_with_sympy(self, name):
+        """Test that every available engine matches sympy.isprime"""
+        engine = get_engine(name)
+
+        for number in sample_numbers():
+            assert engine.is_prime(number) == sympy.isprime(number), number
+
+    def test_builtin_uses_the_minimal_bases(self):
+        """Test that each range runs its own deterministic base set"""
+        assert len(primality.miller_rabin_bases(2**31 - 1)) == 3
+        assert len(primality.miller_rabin_bases(2**64 - 59)) == 7
+        with pytest.raises(ValueError):
+            primality.miller_rabin_bases(2**64)
+
+    @pytest.mark.parametrize("name", available_engines())
+    @pytest.mark.parametrize("value", [2.0, "7", True, None, [3]])
+    def test_engine_rejects_non_integers(self, name, value):
+        """Test that invalid values raise the same error as sympy.isprime"""
+        with pytest.raises(ValueError, match="is not an integer"):
+            get_engine(name).is_prime(value)
+
+    def test_builtin_is_the_default_engine(self):
+        """Test that the builtin engine is used when nothing is configured"""
+        with patch.dict("os.environ", {}, clear=True):
+            assert isinstance(get_engine(), BuiltinEngine)
+
+    def test_engine_selected_by_env(self):
+        """Test that PRIMALITY_ENGINE selects the backend"""
+        with patch.dict("os.environ", {"PRIMALITY_ENGINE": "sympy"}):
+            engine = get_engine()
+
+        assert isinstance(engine, SympyEngine)
+        assert get_engine("sympy") is engine
+
+    def test_unknown_engine(self):
+        """Test that an unknown engine name is rejected"""
+        with pytest.raises(ValueError, match="Unknown primality engine"):
+            get_engine("fermat")
+
+    def test_missing_optional_engine_falls_back(self, capfd):
+        """Test that a backend with missing dependencies falls back to builtin"""
+        with patch.dict("sys.modules", {"gmpy2": None}):
+            engine = get_engine("gmpy2")
+
+        assert isinstance(engine, BuiltinEngine)
+        captured = capfd.readouterr()
+        assert "Primality engine gmpy2 unavailable" in captured.out
@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.prime_numbers_processing import primality_cache
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.prime_numbers_processing.primality import get_engine
+from src.prime_numbers_processing.primality_cache import PrimalityCache, get_cache
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    primality_cache.reset_cache()
+    yield
+    primality_cache.reset_cache()
+
+
+class TestPrimalityCache:
+    """Test suite for the primality verdict cache"""
+
+    def test_hits_and_misses(self):
+        """Test that repeated numbers are served from the cache"""
+        cache = PrimalityCache(maxsize=10)
+        engine = MagicMock(side_effect=get_engine().is_prime)
+        is_prime = cache.wrap(engine)
+
+        assert [is_prime(n) for n in (7, 8, 7, 7, 8)] == [
+            True,
+            False,
+            True,
+            True,
+            False,
+        ]
+        assert engine.call_count == 2
+        assert cache.stats() == {"size": 2, "maxsize": 10, "hits": 3, "misses": 2}
+
+    def test_lru_eviction(self):
+        """Test that the least recently used verdict is evicted"""
+        cache = PrimalityCache(maxsize=2)
+        cache.put(2, True)
+        cache.put(4, False)
+        cache.get(2)
+        cache.put(5, True)
+
+        assert len(cache) == 2
+        assert cache.get(4) is None
+        assert cache.get(2) is True
+
+    def test_validation_happens_before_lookup(self):
+        """Test that True/2.0 still raise even if 1/2 are cached"""
+        cache = PrimalityCache()
+        is_prime = cache.wrap(get_engine().is_prime)
+        is_prime(1)
+        is_prime(2)
+
+        for value in (True, 2.0):
+            with pytest.raises(ValueError, match="is not an integer"):
+                is_prime(value)
+
+    def test_cache_can_be_disabled(self):
+        """Test the PRIMALITY_CACHE_ENABLED switch"""
+        with patch.dict("os.environ", {"PRIMALITY_CACHE_ENABLED": "false"}):
+            assert get_cache() is None
+            assert PrimeNumberManager().cache is None
+
+    def test_cache_is_shared_across_managers(self, mock_env):
+        """Test that verdicts survive across records and warm invocations"""
+        with patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200):
+            PrimeNumberManager().get_prime_numbers([2, 3, 4])
+            PrimeNumberManager().get_prime_numbers([2, 3, 4])
+
+        assert get_cache().stats()["hits"] == 3
+
+    def test_pre_warm_from_seed_file(self, tmp_path, capfd):
+        """Test that the cache is pre-warmed from PRIMALITY_CACHE_SEED"""
+        seed = tmp_path / "seed.txt"
+        seed.write_text("# common numbers\n97\n\n100\n")
+
+        with patch.dict(
+            "os.environ",
+            {"PRIMALITY_CACHE_SEED": str(seed), "PRIMALITY_CACHE_SIZE": "8"},
+        ):
+            cache = get_cache(get_engine().is_prime)
+
+        assert cache.maxsize == 8
+        assert cache.get(97) is True
+        assert cache.get(100) is False
+        assert "pre-warmed with 2 numbers" in capfd.readouterr().out
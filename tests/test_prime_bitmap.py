@@ -0,0 +1,134 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sympy import isprime
+
+from src.prime_numbers_processing import prime_bitmap
+from src.prime_numbers_processing.prime_bitmap import HEADER, PrimeBitmap, build
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+
+BOUND = 100_003
+
+
+@pytest.fixture
+def bitmap_path(tmp_path):
+    path = tmp_path / "primes.bitmap"
+    build(path, BOUND, segment_size=1024)
+    prime_bitmap.reset_bitmap()
+    yield path
+    prime_bitmap.reset_bitmap()
+
+
+class TestPrimeBitmap:
+    """Test suite for the memory-mapped prime bitmap"""
+
+    def test_lookups_match_sympy(self, bitmap_path):
+        """Test that every number up to the bound is answered correctly"""
+        bitmap = PrimeBitmap(bitmap_path)
+        is_prime = bitmap.wrap(MagicMock(side_effect=AssertionError))
+
+        assert bitmap.bound == BOUND
+        assert [n for n in range(BOUND + 1) if is_prime(n)] == [
+            n for n in range(BOUND + 1) if isprime(n)
+        ]
+
+    def test_falls_back_above_the_bound(self, bitmap_path):
+        """Test that numbers above the bound and non ints go to the engine"""
+        fallback = MagicMock(return_value=True)
+        is_prime = PrimeBitmap(bitmap_path).wrap(fallback)
+
+        assert is_prime(BOUND + 1) is True
+        assert is_prime(True) is True
+        fallback.assert_any_call(BOUND + 1)
+        assert fallback.call_count == 2
+
+    def test_corruption_is_detected(self, bitmap_path):
+        """Test that a flipped payload byte fails the integrity check"""
+        data = bytearray(bitmap_path.read_bytes())
+        data[HEADER.size + 100] ^= 0xFF
+        bitmap_path.write_bytes(bytes(data))
+
+        with pytest.raises(ValueError, match="checksum mismatch"):
+            PrimeBitmap(bitmap_path, verify=True)
+        assert PrimeBitmap(bitmap_path).bound == BOUND
+        assert prime_bitmap.main(["verify", str(bitmap_path)]) == 1
+
+    def test_cold_start_skips_the_checksum_unless_asked(self, bitmap_path):
+        """Test that loading only hashes the payload when PRIME_BITMAP_VERIFY is set"""
+        with patch.dict(os.environ, {"PRIME_BITMAP_PATH": str(bitmap_path)}), patch(
+            "src.prime_numbers_processing.prime_bitmap.hashlib.sha256"
+        ) as sha256:
+            assert prime_bitmap.get_bitmap().bound == BOUND
+            sha256.assert_not_called()
+
+            prime_bitmap.reset_bitmap()
+            with patch.dict(os.environ, {"PRIME_BITMAP_VERIFY": "true"}):
+                assert prime_bitmap.get_bitmap() is None  # The mock digest differs
+            sha256.assert_called_once()
+
+    def test_truncation_is_detected(self, bitmap_path):
+        """Test that a file cut short is rejected even without the checksum"""
+        bitmap_path.write_bytes(bitmap_path.read_bytes()[:-1])
+
+        with pytest.raises(ValueError, match="truncated"):
+            PrimeBitmap(bitmap_path)
+
+    def test_manager_uses_the_bitmap(self, bitmap_path):
+        """Test that classification is answered by the bitmap below the bound"""
+        engine = MagicMock()
+        engine.is_prime.side_effect = isprime
+        numbers = [2, 4, 97, 100, 99991, BOUND + 4, 2**61 - 1]
+
+        with patch.dict(
+            os.environ,
+            {"PRIME_BITMAP_PATH": str(bitmap_path), "PRIMALITY_CACHE_ENABLED": "false"},
+        ):
+            primes = PrimeNumberManager(engine=engine).classify(numbers)
+
+        assert primes == [2, 97, 99991, 2**61 - 1]
+        assert [c.args[0] for c in engine.is_prime.call_args_list] == [
+            BOUND + 4,
+            2**61 - 1,
+        ]
+
+    def test_batch_path_only_skipped_below_the_bound(self, bitmap_path):
+        """Test that blocks reaching above the bitmap still get the batch
+        classifier, blocks below it are answered by the bitmap
+        """
+        below = list(range(2, 2000))
+        above = list(range(BOUND, BOUND + 2000))
+        environment = {
+            "PRIME_BITMAP_PATH": str(bitmap_path),
+            "PRIMALITY_CACHE_ENABLED": "false",
+        }
+
+        with patch.dict(os.environ, environment), patch(
+            "src.prime_numbers_processing.batch_classifier.classify",
+            return_value=None,
+        ) as mock_classify:
+            PrimeNumberManager().classify(below)
+            mock_classify.assert_not_called()
+            PrimeNumberManager().classify(above)
+
+        mock_classify.assert_called_once()
+        assert mock_classify.call_args.args[0] == above
+
+    def test_invalid_file_falls_back_to_the_engine(self, tmp_path, capfd):
+        """Test that a missing bitmap doesn't break classification"""
+        with patch.dict(os.environ, {"PRIME_BITMAP_PATH": str(tmp_path / "missing")}):
+            assert prime_bitmap.get_bitmap() is None
+            assert PrimeNumberManager().classify([2, 3, 4]) == [2, 3]
+        assert "unusable" in capfd.readouterr().out
+        prime_bitmap.reset_bitmap()
+
+    def test_cli(self, tmp_path, capsys):
+        """Test the build and verify commands"""
+        path = tmp_path / "cli.bitmap"
+
+        assert (
+            prime_bitmap.main(["build", "--bound", "1000", "--output", str(path)]) == 0
+        )
+        assert "covers the numbers up to 1000" in capsys.readouterr().out
+        assert prime_bitmap.main(["verify", str(path)]) == 0
+        assert "covers the numbers up to 1000" in capsys.readouterr().out
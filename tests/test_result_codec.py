@@ -0,0 +1,95 @@
+import random
+from unittest.mock import patch
+
+import pytest
+
+from src.prime_numbers_processing import result_codec
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+
+PRIMES = [2, 3, 5, 7, 11, 13, 2**31 - 1, 2**61 - 1, 2**89 - 1]
+
+
+class TestResultCodec:
+    """Test suite for the result encoders/decoders"""
+
+    @pytest.mark.parametrize("codec", list(result_codec.CODECS))
+    def test_round_trip(self, codec):
+        """Test that every codec decodes what it encoded"""
+        [(body, attributes)] = result_codec.encode_messages(PRIMES, codec)
+
+        assert attributes["ResultCodec"]["StringValue"] == codec
+        assert attributes["NumberOfPrimes"]["StringValue"] == str(len(PRIMES))
+        assert result_codec.decode(body, codec) == PRIMES
+
+    def test_json_matches_legacy_format(self):
+        """Test that the JSON body is the same as the previous python repr"""
+        assert result_codec.get_codec("json").encode([2, 3, 5]) == str([2, 3, 5])
+
+    def test_varint_is_compact(self):
+        """Test that the varint body is smaller than the JSON one"""
+        primes = [p for p in range(10**6, 10**6 + 20000) if pow(2, p - 1, p) == 1]
+        varint = result_codec.get_codec("varint").encode(primes)
+        json_body = result_codec.get_codec("json").encode(primes)
+
+        assert len(varint) * 3 < len(json_body)
+
+    def test_varint_sorts_primes(self):
+        """Test that varint bodies are delta encoded over the sorted primes"""
+        codec = result_codec.get_codec("varint")
+
+        assert codec.decode(codec.encode([13, 2, 7])) == [2, 7, 13]
+
+    @pytest.mark.parametrize("codec", list(result_codec.CODECS))
+    def test_oversized_results_are_split(self, codec):
+        """Test that results over the size limit are split in chunks"""
+        rng = random.Random(5)
+        primes = sorted(rng.getrandbits(40) for _ in range(5000))
+
+        messages = result_codec.encode_messages(primes, codec, max_bytes=4096)
+
+        assert len(messages) > 1
+        decoded = []
+        for index, (body, attributes) in enumerate(messages):
+            assert len(body.encode()) <= 4096
+            assert attributes["ChunkIndex"]["StringValue"] == str(index)
+            assert attributes["ChunkCount"]["StringValue"] == str(len(messages))
+            decoded.extend(result_codec.decode(body, codec))
+        assert decoded == primes
+
+    def test_decode_message_shapes(self):
+        """Test decoding both receive_message and Lambda record shapes"""
+        body = result_codec.get_codec("varint").encode([2, 3])
+
+        assert result_codec.decode_message(
+            {
+                "Body": body,
+                "MessageAttributes": {
+                    "ResultCodec": {"DataType": "String", "StringValue": "varint"}
+                },
+            }
+        ) == [2, 3]
+        assert result_codec.decode_message(
+            {
+                "body": body,
+                "messageAttributes": {
+                    "ResultCodec": {"dataType": "String", "stringValue": "varint"}
+                },
+            }
+        ) == [2, 3]
+        # Legacy messages without the attribute
+        assert result_codec.decode_message({"Body": "[2, 3]"}) == [2, 3]
+
+    def test_unknown_codec(self):
+        """Test that an unknown codec is rejected"""
+        with pytest.raises(ValueError, match="Unknown result codec"):
+            result_codec.get_codec("xml")
+
+    @patch("src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200)
+    def test_manager_uses_configured_codec(self, mock_send, mock_env):
+        """Test that PrimeNumberManager publishes with the RESULT_CODEC codec"""
+        with patch.dict("os.environ", {"RESULT_CODEC": "varint"}):
+            PrimeNumberManager().get_prime_numbers([7, 4, 2, 3])
+
+        _, body, attributes = mock_send.call_args.args
+        assert attributes["ResultCodec"]["StringValue"] == "varint"
+        assert result_codec.decode(body, "varint") == [2, 3, 7]
@@ -0,0 +1,226 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import (
+    ClientError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ParamValidationError,
+    ReadTimeoutError,
+)
+
+from src.utils import metrics
+from src.utils.aws_utils import AWSUtils
+from src.utils.send_guard import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    SendGuard,
+    TokenBucket,
+    get_guard,
+    is_retryable,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def client_error(code, status):
+    return ClientError(
+        {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "SendMessage",
+    )
+
+
+@pytest.fixture
+def mock_sleep():
+    with patch("src.utils.send_guard.time.sleep") as mock_sleep:
+        yield mock_sleep
+
+
+class TestSendGuard:
+    """Test suite for the outbound rate limit, retries and circuit breaker"""
+
+    def test_only_throttling_and_server_errors_are_retryable(self):
+        """Test the error classification"""
+        assert is_retryable(client_error("ThrottlingException", 400))
+        assert is_retryable(client_error("InternalError", 500))
+        assert is_retryable(client_error("ServiceUnavailable", 503))
+        assert not is_retryable(client_error("AccessDenied", 403))
+        assert not is_retryable(client_error("InvalidParameterValue", 400))
+        assert not is_retryable(ValueError("boom"))
+        assert is_retryable(EndpointConnectionError(endpoint_url="https://sqs"))
+        assert is_retryable(ConnectTimeoutError(endpoint_url="https://sqs"))
+        assert is_retryable(ReadTimeoutError(endpoint_url="https://sqs"))
+        assert not is_retryable(ParamValidationError(report="missing QueueUrl"))
+
+    def test_token_bucket_spaces_out_calls(self):
+        """Test that the burst goes through and the rest waits for refills"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(4)]
+
+        assert waits[:2] == [0.0, 0.0]
+        assert waits[2:] == pytest.approx([0.1, 0.1])
+        assert clock.now == pytest.approx(0.2)
+
+    def test_circuit_breaker_lifecycle(self):
+        """Test closed -> open -> half open -> closed / open transitions"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+        clock.now = 10
+        breaker.allow()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+        clock.now = 20
+        breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+    def test_throttled_send_is_retried_with_jitter(self, fake_sqs, mock_sleep):
+        """Test that a throttled send succeeds once the fault clears"""
+        client, queue_url = fake_sqs, os.environ["SQS_PRIMES_TARGET"]
+        client.inject_fault("send_message", times=2)
+
+        with patch("src.utils.send_guard.random.uniform", side_effect=lambda a, b: b):
+            status = AWSUtils.send_sqs_message(queue_url, "[2]", {})
+
+        assert status == 200
+        assert client.calls["send_message"] == 3
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [0.05, 0.1]
+        assert client.messages(queue_url)[0]["Body"] == "[2]"
+
+    def test_client_errors_are_not_retried(self, fake_sqs, mock_sleep):
+        """Test that a rejected request is raised without retries"""
+        client, queue_url = fake_sqs, os.environ["SQS_PRIMES_TARGET"]
+        client.inject_fault("send_message", code="AccessDenied", status=403)
+
+        with pytest.raises(ClientError):
+            AWSUtils.send_sqs_message(queue_url, "[2]", {})
+
+        assert client.calls["send_message"] == 1
+        mock_sleep.assert_not_called()
+        assert get_guard(queue_url).breaker.failures == 0
+
+    def test_connection_errors_are_retried_and_open_the_circuit(self):
+        """Test that calls without a response count as failures of the queue"""
+        clock = FakeClock()
+        guard = SendGuard(
+            "queue", max_retries=5, failure_threshold=3, sleep=clock.sleep
+        )
+        send = MagicMock(side_effect=ReadTimeoutError(endpoint_url="https://sqs"))
+
+        with pytest.raises(ReadTimeoutError):
+            guard.call(send)
+
+        assert send.call_count == 3
+        assert guard.breaker.state == OPEN
+
+    def test_only_responses_reset_the_circuit(self):
+        """Test that an error raised before any response leaves the count alone"""
+        guard = SendGuard("queue", failure_threshold=3)
+        guard.breaker.record_failure()
+        guard.breaker.record_failure()
+
+        with pytest.raises(ParamValidationError):
+            guard.call(MagicMock(side_effect=ParamValidationError(report="bad")))
+        assert guard.breaker.failures == 2
+        with pytest.raises(ClientError):
+            guard.call(MagicMock(side_effect=client_error("AccessDenied", 403)))
+        assert guard.breaker.failures == 0
+
+    def test_trial_call_always_settles_the_circuit(self):
+        """Test that a half open trial failing before any response reopens the
+        circuit instead of leaving it half open
+        """
+        clock = FakeClock()
+        guard = SendGuard("queue", failure_threshold=1, reset_timeout=10, clock=clock)
+        guard.breaker.record_failure()
+        clock.now = 10
+
+        with pytest.raises(ParamValidationError):
+            guard.call(MagicMock(side_effect=ParamValidationError(report="bad")))
+        assert guard.breaker.state == OPEN
+
+        clock.now = 20
+        assert guard.call(MagicMock(return_value="ok")) == "ok"
+        assert guard.breaker.state == CLOSED
+
+    def test_batch_send_goes_through_the_guard(self, fake_sqs, mock_sleep):
+        """Test that a 5xx batch request is retried and its entries delivered"""
+        client, queue_url = fake_sqs, os.environ["SQS_PRIMES_TARGET"]
+        client.inject_fault("send_message_batch", code="InternalError", status=500)
+
+        result = AWSUtils.send_batch_sqs_messages(queue_url, ["[2]", "[3]"], [{}, {}])
+
+        assert result
+        assert client.calls["send_message_batch"] == 2
+        assert len(client.messages(queue_url)) == 2
+
+    def test_circuit_opens_and_fails_fast(self, fake_sqs, mock_sleep):
+        """Test that a failing queue stops being called until the reset timeout"""
+        client, queue_url = fake_sqs, os.environ["SQS_PRIMES_TARGET"]
+        client.inject_fault(
+            "send_message", code="ServiceUnavailable", status=503, times=10
+        )
+        with patch.dict(
+            os.environ, {"SQS_BREAKER_FAILURES": "3", "SQS_SEND_MAX_RETRIES": "5"}
+        ):
+            with pytest.raises(ClientError):
+                AWSUtils.send_sqs_message(queue_url, "[2]", {})
+            with pytest.raises(CircuitOpenError):
+                AWSUtils.send_sqs_message(queue_url, "[3]", {})
+
+        assert client.calls["send_message"] == 3
+        assert get_guard(queue_url).snapshot()["circuit"] == OPEN
+
+    def test_state_is_recorded_as_metrics(self):
+        """Test that waits, retries and fast fails are reported"""
+        clock = FakeClock()
+        guard = SendGuard(
+            "queue",
+            rate=1,
+            failure_threshold=2,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+        send = MagicMock(side_effect=[client_error("Throttling", 400), {}, {}])
+
+        with patch.dict(os.environ, {"METRICS_ENABLED": "true"}):
+            metrics.reset_metrics()
+            guard.call(send)
+            guard.call(send)
+            guard.breaker.state = OPEN
+            guard.breaker._opened_at = clock.now
+            with pytest.raises(CircuitOpenError):
+                guard.call(send)
+            recorded = metrics.get_metrics().snapshot()
+        metrics.reset_metrics()
+
+        assert recorded["retry"][1] == 1
+        assert recorded["ratelimit"][1] >= 1
+        assert recorded["circuitopen"][1] == 1
@@ -0,0 +1,135 @@
+import json
+import math
+import os
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+import sympy
+
+import handler
+from src.prime_numbers_processing import result_codec
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.prime_numbers_processing.sieve import (
+    DEFAULT_RANGE_MAX_END,
+    base_primes,
+    parse_range,
+    segment_size_for,
+    segmented_sieve,
+    sieve_segments,
+)
+
+
+def discard_send(queue_url, body, attributes):
+    return 200
+
+
+class TestSieve:
+    """Test suite for Range messages and the segmented sieve"""
+
+    @pytest.mark.parametrize(
+        "start, end, segment_size",
+        [
+            (0, 5000, 7),
+            (2, 2, 16),
+            (4, 4, 16),
+            (90, 110, 3),
+            (10**12, 10**12 + 5000, 4096),
+        ],
+    )
+    def test_matches_sympy(self, start, end, segment_size):
+        """Test that the sieve finds exactly the primes in the range"""
+        assert list(segmented_sieve(start, end, segment_size)) == list(
+            sympy.primerange(start, end + 1)
+        )
+
+    @pytest.mark.parametrize(
+        "value, message",
+        [
+            (5, "must be a"),
+            ([1, 2, 3], "must be a"),
+            ([10, 1], "greater than its end"),
+            ([1, "x"], "is not an integer"),
+            ([0, 10**15], "over the maximum"),
+        ],
+    )
+    def test_invalid_ranges(self, value, message):
+        """Test the Range validation"""
+        with pytest.raises(ValueError, match=message):
+            parse_range(value)
+
+    def test_primes_are_flushed_in_chunks(self, mock_env):
+        """Test that range results are published every RANGE_FLUSH_SIZE primes"""
+        with patch.dict("os.environ", {"RANGE_FLUSH_SIZE": "100"}), patch(
+            "src.utils.aws_utils.AWSUtils.send_sqs_message", return_value=200
+        ) as mock_send:
+            found = PrimeNumberManager().get_primes_in_range(0, 10000)
+
+        assert found == 1229
+        assert mock_send.call_count == 13
+        primes = []
+        for call in mock_send.call_args_list:
+            _, body, attributes = call.args
+            assert attributes["RangeEnd"]["StringValue"] == "10000"
+            primes.extend(result_codec.decode(body))
+        assert primes == list(sympy.primerange(0, 10001))
+
+    def test_memory_does_not_depend_on_range_width(self, mock_env):
+        """Test that a 10x wider range doesn't need more memory"""
+
+        def peak(width):
+            tracemalloc.start()
+            PrimeNumberManager().get_primes_in_range(10**6, 10**6 + width)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak_bytes
+
+        with patch.dict("os.environ", {"RANGE_FLUSH_SIZE": "1000"}), patch(
+            "src.utils.aws_utils.AWSUtils.send_sqs_message", new=discard_send
+        ):
+            narrow = peak(100_000)
+            wide = peak(1_000_000)
+
+        assert wide < narrow * 1.5
+
+    def test_segments_grow_with_the_square_root_of_the_end(self):
+        """Test that far ranges are sieved in few segments, each one loops over
+        every base prime
+        """
+        segments = list(sieve_segments(10**12 - 10**7, 10**12))
+
+        assert segment_size_for(10**6) == 32768
+        assert segment_size_for(10**12) == 10**6
+        assert segment_size_for(DEFAULT_RANGE_MAX_END) == 1 << 22
+        assert len(segments) == 5
+        assert segments[-1][0] == 10**12
+        assert sum(len(primes) for _, primes in segments) == 362479
+
+    def test_base_primes_of_the_largest_range_are_compact(self):
+        """Test that the base primes of the maximum range end fit in a few MB"""
+        limit = math.isqrt(DEFAULT_RANGE_MAX_END)
+
+        tracemalloc.start()
+        primes = base_primes(limit)
+        current, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert len(primes) == 664579 - 1
+        assert list(primes[:5]) == [3, 5, 7, 11, 13] and primes[-1] == 9999991
+        assert current < 3 * 2**20
+        assert peak_bytes < 10 * 2**20
+
+    def test_handler_range_message(self, fake_sqs):
+        """Test a Range message end to end"""
+        event = {
+            "Records": [
+                {"messageId": "1", "body": json.dumps({"Range": [10, 50]})},
+                {"messageId": "2", "body": json.dumps({"Range": [50, 10]})},
+            ]
+        }
+
+        response = handler.prime_number_processing(event, None)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+        [message] = fake_sqs.messages(os.environ["SQS_PRIMES_TARGET"])
+        assert result_codec.decode_message(message) == list(sympy.primerange(10, 51))
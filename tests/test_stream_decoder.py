@@ -0,0 +1,137 @@
+import json
+import os
+import random
+from unittest.mock import patch
+
+import pytest
+
+import handler
+from src.prime_numbers_processing.prime_numbers_manager import PrimeNumberManager
+from src.prime_numbers_processing.stream_decoder import NumbersStream, decode
+from src.utils.deadline import Deadline
+
+NUMBERS = [random.Random(3).getrandbits(64) for _ in range(5000)]
+
+
+@pytest.fixture
+def stream_everything():
+    with patch.dict(os.environ, {"STREAM_DECODE_MIN_BYTES": "0"}):
+        yield
+
+
+class ExpiringContext:
+    def __init__(self, calls_with_time):
+        self.calls_with_time = calls_with_time
+
+    def get_remaining_time_in_millis(self):
+        self.calls_with_time -= 1
+        return 20000 if self.calls_with_time >= 0 else 0
+
+
+class TestStreamDecoder:
+    """Test suite for the incremental decoding of message bodies"""
+
+    def test_streams_the_numbers_and_keeps_the_other_members(self):
+        """Test that large bodies yield the same elements as json.loads"""
+        body = json.dumps({"Numbers": NUMBERS, "JobId": "job-1", "ShardIndex": 2})
+
+        event_data = decode(body)
+
+        assert isinstance(event_data["Numbers"], NumbersStream)
+        assert event_data["JobId"] == "job-1"
+        assert list(event_data["Numbers"]) == NUMBERS
+
+    def test_small_and_other_layouts_use_json_loads(self, stream_everything):
+        """Test that other layouts and small bodies decode like json.loads"""
+        assert decode('{"Range": [1, 10], "Numbers": [2]}')["Numbers"] == [2]
+        # Like json.loads, the last duplicated key wins
+        assert list(decode('{"Numbers": [2], "Numbers": [3]}')["Numbers"]) == [3]
+        assert decode('{"Numbers": [2]}', stream=False)["Numbers"] == [2]
+        assert not decode('{"Numbers": [ ]}')["Numbers"]
+        with patch.dict(os.environ, {"STREAM_DECODE_MIN_BYTES": "65536"}):
+            assert decode('{"Numbers": [2]}')["Numbers"] == [2]
+
+    @pytest.mark.parametrize(
+        "numbers",
+        [
+            ["a,b", [1, [2, 3]], {"x": "],"}, 7, 2.5, None, True],
+            list(range(200)) + ["x" * 50 + "," * 50] + list(range(200)),
+        ],
+    )
+    def test_unusual_elements_match_json_loads(self, stream_everything, numbers):
+        """Test that strings and nested values, which a comma may not separate,
+        are decoded by json.loads with every member
+        """
+        body = json.dumps({"Numbers": numbers, "ContinuationOf": "a]b"})
+
+        assert decode(body) == json.loads(body)
+
+    def test_array_members_after_the_numbers_are_kept(self):
+        """Test that the closing bracket of a Range member after the Numbers
+        isn't taken for the end of the array
+        """
+        body = json.dumps({"Numbers": list(range(20000)), "Range": [1, 50]})
+
+        event_data = decode(body)
+
+        assert isinstance(event_data["Numbers"], NumbersStream)
+        assert event_data["Range"] == [1, 50]
+        assert event_data["Numbers"].rest() == list(range(20000))
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            '{"Numbers": [1, 2, 3',
+            '{"Numbers": [1, 2,, 3]}',
+            '{"Numbers": [1, 2, 3,]}',
+            '{"Numbers": [1, 2 3]}',
+            '{"Numbers": [1, 2, 3]} trailing',
+            '{"Numbers": [1, 02, 3]}',
+        ],
+    )
+    def test_malformed_bodies_raise_the_json_loads_error(self, stream_everything, body):
+        """Test that errors carry the same message and position as json.loads"""
+        with pytest.raises(json.JSONDecodeError) as expected:
+            json.loads(body)
+
+        with pytest.raises(json.JSONDecodeError) as streamed:
+            list(decode(body).get("Numbers", []))
+
+        assert str(streamed.value) == str(expected.value)
+
+    def test_handler_reports_invalid_elements_the_same_way(self, capfd):
+        """Test that a malformed element fails the record with the same error"""
+        body = json.dumps({"Numbers": [2, 3, "abc", 5]})
+        event = {"Records": [{"messageId": "msg-1", "body": body}]}
+
+        outputs = []
+        for min_bytes in ("65536", "0"):
+            with patch.dict(os.environ, {"STREAM_DECODE_MIN_BYTES": min_bytes}):
+                response = handler.prime_number_processing(event, None)
+            assert response == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+            outputs.append(
+                [
+                    line
+                    for line in capfd.readouterr().out.splitlines()
+                    if "Error" in line
+                ]
+            )
+
+        assert (
+            outputs[0]
+            == outputs[1]
+            == ["General Error: Message Id: msg-1 failed with abc is not an integer"]
+        )
+
+    def test_deadline_remainder_of_a_stream(self, stream_everything):
+        """Test that the numbers left when the deadline expires are recovered"""
+        numbers = list(range(10000))
+        stream = decode(json.dumps({"Numbers": numbers}))["Numbers"]
+        deadline = Deadline(ExpiringContext(1), margin_ms=5000)
+
+        pnm = PrimeNumberManager(deadline=deadline)
+        pnm.classify(stream)
+
+        classified = 10000 - len(pnm.remainder["Numbers"])
+        assert 0 < classified < 10000
+        assert pnm.remainder["Numbers"] == numbers[classified:]
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from unittest.mock import patch
+
+import pytest
+
+import worker
+from src.utils.fake_sqs import FakeSQS
+from worker import Worker
+
+
+@pytest.fixture
+def shared_sqs(fake_sqs):
+    """FakeSQS living in a manager process, the client children of the process
+    pool create once they dropped the one inherited from the parent
+    """
+    manager = BaseManager()
+    manager.register("FakeSQS", FakeSQS)
+    manager.start()
+    try:
+        shared = manager.FakeSQS()
+        shared.create_queue(QueueName="target")
+        with patch("boto3.client", return_value=shared):
+            yield shared
+    finally:
+        manager.shutdown()
+
+
+def feed(fake_sqs, *bodies):
+    feed_url = os.environ["SQS_FEED_QUEUE"]
+    for body in bodies:
+        fake_sqs.send_message(QueueUrl=feed_url, MessageBody=json.dumps(body))
+    return feed_url
+
+
+class TestWorker:
+    """Test suite for the long-polling worker"""
+
+    def test_processes_and_deletes_in_batches(self, fake_sqs):
+        """Test that processed messages are published and deleted with batch calls"""
+        feed_url = feed(fake_sqs, *({"Numbers": [n, n + 1]} for n in range(12)))
+
+        processed = Worker(feed_url, client=fake_sqs, wait_time=0).run(max_polls=3)
+
+        assert processed == 12
+        assert fake_sqs.messages(feed_url) == []
+        assert fake_sqs.calls["delete_message_batch"] == 2
+        assert "delete_message" not in fake_sqs.calls
+        target_url = os.environ["SQS_PRIMES_TARGET"]
+        assert (
+            len(fake_sqs.messages(target_url)) == 9
+        )  # [0, 1], [8, 9] and [9, 10] have no primes
+
+    def test_failed_messages_are_not_deleted(self, fake_sqs, capfd):
+        """Test that a failing message stays in the queue to be retried"""
+        feed_url = feed(fake_sqs, {"Numbers": [2, 3]}, {"Numbers": ["x"]})
+        with patch.dict(os.environ, {"IDEMPOTENCY_BACKEND": "none"}):
+            subject = Worker(feed_url, client=fake_sqs, wait_time=0)
+            subject.run(max_polls=1)
+
+        assert (subject.processed, subject.failed) == (1, 1)
+        assert [message["Body"] for message in fake_sqs.messages(feed_url)] == [
+            json.dumps({"Numbers": ["x"]})
+        ]
+        assert "General Error: Message Id:" in capfd.readouterr().out
+
+    def test_visibility_is_extended_for_long_jobs(self, fake_sqs):
+        """Test that the visibility of running messages keeps being extended"""
+        feed_url = feed(fake_sqs, {"Numbers": [2]})
+
+        def slow_process_record(record):
+            time.sleep(0.1)
+
+        with patch("worker.process_record", slow_process_record):
+            Worker(feed_url, client=fake_sqs, wait_time=0, heartbeat=0.02).run(
+                max_polls=1
+            )
+
+        assert fake_sqs.calls["change_message_visibility"] >= 2
+        assert fake_sqs.messages(feed_url) == []
+
+    def test_stop_is_graceful(self, fake_sqs):
+        """Test that stop() ends the polling loop once the current poll returns"""
+        feed_url = feed(fake_sqs)
+        subject = Worker(feed_url, client=fake_sqs, wait_time=0)
+        runner = threading.Thread(target=subject.run)
+        runner.start()
+
+        subject.stop()
+        runner.join(timeout=5)
+
+        assert not runner.is_alive()
+        assert subject._executor is None
+
+    def test_process_mode(self, fake_sqs, shared_sqs, capfd):
+        """Test that records run on a process pool, which flushes its own metrics"""
+        feed_url = feed(fake_sqs, {"Numbers": [2, 3]}, {"Numbers": ["x"]})
+        with patch.dict(os.environ, {"IDEMPOTENCY_BACKEND": "none"}):
+            subject = Worker(
+                feed_url, client=fake_sqs, mode="process", concurrency=2, wait_time=0
+            )
+            subject.run(max_polls=1)
+
+        assert (subject.processed, subject.failed) == (1, 1)
+        assert [message["Body"] for message in fake_sqs.messages(feed_url)] == [
+            json.dumps({"Numbers": ["x"]})
+        ]
+        emf_lines = [
+            json.loads(line)
+            for line in capfd.readouterr().out.splitlines()
+            if line.startswith('{"_aws"')
+        ]
+        assert any("ClassifyCount" in document for document in emf_lines)
+
+    def test_process_mode_children_use_their_own_client(self, fake_sqs, shared_sqs):
+        """Test that children don't reuse the client inherited from the parent
+        and that their results reach the target queue
+        """
+        feed_url = feed(fake_sqs, {"Numbers": [2, 3, 4, 5]})
+        with patch.dict(os.environ, {"IDEMPOTENCY_BACKEND": "none"}):
+            subject = Worker(
+                feed_url, client=fake_sqs, mode="process", concurrency=2, wait_time=0
+            )
+            subject.run(max_polls=1)
+
+        target_url = os.environ["SQS_PRIMES_TARGET"]
+        assert subject.processed == 1
+        assert [json.loads(m["Body"]) for m in shared_sqs.messages(target_url)] == [
+            [2, 3, 5]
+        ]
+        assert fake_sqs.messages(target_url) == []
+
+    def test_sqs_errors_are_logged_and_backed_off(self, fake_sqs, capfd):
+        """Test that failed receive and delete calls don't stop the worker"""
+        feed_url = feed(fake_sqs, {"Numbers": [2]})
+        fake_sqs.inject_fault("receive_message", times=2)
+        fake_sqs.inject_fault("delete_message_batch", times=1)
+        subject = Worker(feed_url, client=fake_sqs, wait_time=0, error_backoff=0.01)
+        waits = []
+        subject._stopping.wait = waits.append
+
+        subject.run(max_polls=4)
+
+        assert waits == [0.01, 0.02]
+        assert subject.errors == 0
+        assert subject.processed == 1
+        assert len(fake_sqs.messages(feed_url)) == 1  # Not deleted, redelivered later
+        output = capfd.readouterr().out
+        assert output.count("Could not receive from") == 2
+        assert "Could not delete 1 messages" in output
+
+    def test_from_env(self, fake_sqs):
+        """Test that the worker is configured through the environment"""
+        environment = {
+            "SQS_FEED_QUEUE": "https://sqs.example/feed",
+            "WORKER_MODE": "process",
+            "WORKER_CONCURRENCY": "2",
+            "WORKER_VISIBILITY_TIMEOUT": "120",
+        }
+        with patch.dict(os.environ, environment):
+            subject = Worker.from_env(client=fake_sqs)
+
+        assert subject.queue_url == "https://sqs.example/feed"
+        assert (subject.mode, subject.concurrency) == ("process", 2)
+        assert (subject.visibility_timeout, subject.heartbeat) == (120, 60)
+
+    def test_unknown_mode(self, fake_sqs):
+        """Test that an unknown pool kind is rejected"""
+        with pytest.raises(ValueError, match="Unknown worker mode"):
+            Worker("https://sqs.example/feed", client=fake_sqs, mode="fiber")
+
+    def test_process_record_runs_the_handler_steps(self, fake_sqs):
+        """Test that a record goes through the same steps as in the Lambda"""
+        message = {"MessageId": "msg-1", "ReceiptHandle": "r", "Body": "{}"}
+
+        with patch("handler.prepare_record", return_value="job") as prepare, patch(
+            "handler.publish_record"
+        ) as publish:
+            worker.process_record(worker.to_lambda_record(message))
+
+        assert prepare.call_args.args[0]["messageId"] == "msg-1"
+        publish.assert_called_once_with("job")
@@ -0,0 +1,277 @@
+"""Long-polling worker running the Lambda processing logic on always-on hosts.
+
+It receives batches from the feed queue, runs every record through the same
+prepare/publish steps as handler.prime_number_processing on a thread or process
+pool, deletes the processed messages in batches and keeps extending the
+visibility of the ones still running:
+
+    SQS_FEED_QUEUE=https://sqs... SQS_PRIMES_TARGET=https://sqs... python worker.py
+
+SIGTERM and SIGINT stop the polling, the batch in progress is finished first.
+Failed messages aren't deleted, they become visible again and are retried or
+redriven to the dead letter queue like in the Lambda. Failed receive and
+delete calls are logged, receive errors back off exponentially up to
+WORKER_MAX_ERROR_BACKOFF seconds before the next poll.
+"""
+
+import os
+import signal
+import threading
+import time
+
+import handler
+from src.utils.aws_utils import DEFAULT_REGION, MAX_BATCH_ENTRIES, AWSUtils
+from src.utils.metrics import get_metrics
+
+FEED_QUEUE_ENV = "SQS_FEED_QUEUE"
+WORKER_MODE_ENV = "WORKER_MODE"
+WORKER_CONCURRENCY_ENV = "WORKER_CONCURRENCY"
+WORKER_WAIT_TIME_ENV = "WORKER_WAIT_TIME"
+WORKER_VISIBILITY_TIMEOUT_ENV = "WORKER_VISIBILITY_TIMEOUT"
+WORKER_MAX_ERROR_BACKOFF_ENV = "WORKER_MAX_ERROR_BACKOFF"
+MODES = ("thread", "process")
+
+
+def to_lambda_record(message):
+    """Converts a receive_message entry into the record shape the handler expects"""
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message["Body"],
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": message.get("MessageAttributes", {}),
+    }
+
+
+def process_record(record):
+    """Decodes, classifies and publishes a single record, raising on any failure"""
+    job = handler.prepare_record(record)
+    if job is not None:
+        handler.publish_record(job)
+
+
+def process_record_in_child(record):
+    """process_record for the process pool: the metrics recorded in a child
+    process never reach the parent, so they are flushed from the child
+    """
+    try:
+        process_record(record)
+    finally:
+        get_metrics().flush()
+
+
+class Worker:
+    """Polls the feed queue until stop() is called
+    :param queue_url: url of the feed queue
+    :param client: SQS client, defaults to the cached AWSUtils client
+    :param mode: thread or process, the kind of pool records are processed on
+    :param concurrency: amount of pool workers
+    :param wait_time: long polling wait of every receive_message, in seconds
+    :param visibility_timeout: visibility requested on receive and on every extension
+    :param heartbeat: seconds between visibility extensions, defaults to half the timeout
+    :param error_backoff: seconds waited after a first failed receive, doubled
+        on every consecutive failure
+    :param max_error_backoff: upper bound of the wait after failed receives
+    """
+
+    def __init__(
+        self,
+        queue_url,
+        client=None,
+        mode="thread",
+        concurrency=4,
+        wait_time=20,
+        visibility_timeout=60,
+        heartbeat=None,
+        error_backoff=1,
+        max_error_backoff=30,
+    ):
+        if mode not in MODES:
+            raise ValueError(
+                f"Unknown worker mode: {mode}. Available: {', '.join(MODES)}"
+            )
+        self.queue_url = queue_url
+        self.client = client or AWSUtils.get_sqs_client(
+            os.environ.get("AWS_REGION", DEFAULT_REGION)
+        )
+        self.mode = mode
+        self.concurrency = concurrency
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat = heartbeat or visibility_timeout / 2
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self.processed = 0
+        self.failed = 0
+        self.errors = 0
+        self._stopping = threading.Event()
+        self._executor = None
+
+    @classmethod
+    def from_env(cls, client=None):
+        """Builds a worker configured through the environment"""
+        return cls(
+            os.environ[FEED_QUEUE_ENV],
+            client=client,
+            mode=os.environ.get(WORKER_MODE_ENV, "thread"),
+            concurrency=int(os.environ.get(WORKER_CONCURRENCY_ENV, 4)),
+            wait_time=int(os.environ.get(WORKER_WAIT_TIME_ENV, 20)),
+            visibility_timeout=int(os.environ.get(WORKER_VISIBILITY_TIMEOUT_ENV, 60)),
+            max_error_backoff=float(os.environ.get(WORKER_MAX_ERROR_BACKOFF_ENV, 30)),
+        )
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            if self.mode == "process":
+                # Forked children would share the connections of the cached
+                # SQS clients with the parent, they create their own
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.concurrency,
+                    initializer=AWSUtils.clear_sqs_clients,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="worker"
+                )
+        return self._executor
+
+    def stop(self):
+        """Asks the worker to stop once the batch in progress is done"""
+        self._stopping.set()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def poll(self):
+        """Receives and processes a single batch of messages
+        :returns: amount of messages received
+        """
+        try:
+            response = self.client.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=MAX_BATCH_ENTRIES,
+                WaitTimeSeconds=self.wait_time,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=["All"],
+                MessageAttributeNames=["All"],
+            )
+        except Exception as e:
+            self._back_off(e)
+            return 0
+        self.errors = 0
+        messages = response.get("Messages", [])
+        if not messages:
+            return 0
+
+        from concurrent.futures import wait
+
+        executor = self._get_executor()
+        target = process_record_in_child if self.mode == "process" else process_record
+        pending = {
+            executor.submit(target, to_lambda_record(message)): message
+            for message in messages
+        }
+        done_messages = []
+        while pending:
+            done, _ = wait(pending, timeout=self.heartbeat)
+            for future in done:
+                message = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    done_messages.append(message)
+                    continue
+                self.failed += 1
+                print(
+                    f"General Error: Message Id: {message['MessageId']} failed with {error}"
+                )
+            self._extend_visibility(pending.values())
+
+        self.processed += len(done_messages)
+        self._delete(done_messages)
+        get_metrics().flush()
+        return len(messages)
+
+    def _back_off(self, error):
+        """Logs a failed receive and waits before the next one, stop() ends the wait"""
+        self.errors += 1
+        delay = min(self.max_error_backoff, self.error_backoff * 2 ** (self.errors - 1))
+        print(f"Could not receive from {self.queue_url}: {error}, retrying in {delay}s")
+        self._stopping.wait(delay)
+
+    def _extend_visibility(self, messages):
+        for message in messages:
+            try:
+                self.client.change_message_visibility(
+                    QueueUrl=self.queue_url,
+                    ReceiptHandle=message["ReceiptHandle"],
+                    VisibilityTimeout=self.visibility_timeout,
+                )
+            except Exception as e:
+                print(
+                    f"Could not extend the visibility of Message Id: "
+                    f"{message['MessageId']}: {e}"
+                )
+
+    def _delete(self, messages):
+        for offset in range(0, len(messages), MAX_BATCH_ENTRIES):
+            chunk = messages[offset : offset + MAX_BATCH_ENTRIES]
+            try:
+                response = self.client.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]}
+                        for index, message in enumerate(chunk)
+                    ],
+                )
+            except Exception as e:
+                # The messages become visible again, their idempotency entries
+                # make the redelivery cheap
+                print(f"Could not delete {len(chunk)} messages: {e}")
+                continue
+            for failure in response.get("Failed", []):
+                message = chunk[int(failure["Id"])]
+                print(
+                    f"Could not delete Message Id: {message['MessageId']}: "
+                    f"{failure.get('Code')}"
+                )
+
+    def run(self, max_polls=None):
+        """Polls until stop() is called or max_polls receive calls were made
+        :param max_polls: optional limit of receive_message calls
+        :returns: amount of messages processed successfully
+        """
+        polls = 0
+        try:
+            while not self.stopping and (max_polls is None or polls < max_polls):
+                self.poll()
+                polls += 1
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        return self.processed
+
+
+def main():
+    worker = Worker.from_env()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, stopping after the current batch...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    print(f"Polling {worker.queue_url} with {worker.concurrency} {worker.mode}s")
+    started = time.monotonic()
+    processed = worker.run()
+    print(
+        f"Worker stopped: {processed} messages processed, {worker.failed} failed "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()